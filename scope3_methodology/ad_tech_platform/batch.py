@@ -0,0 +1,84 @@
+""" Batch engine modeling many ad tech platform products at once with NumPy """
+from typing import Any
+
+import numpy
+
+from scope3_methodology.ad_tech_platform.formulas import (
+    AD_TECH_PLATFORM_FORMULAS,
+    CORPORATE_EMISSIONS_PER_BID_REQUEST_FORMULAS,
+)
+from scope3_methodology.ad_tech_platform.model import (
+    AdTechPlatform,
+    ModeledAdTechPlatform,
+)
+from scope3_methodology.utils.batch import evaluate_batch, row_count, to_values
+from scope3_methodology.utils.custom_base_model import get_field_metadata
+from scope3_methodology.utils.modeled_records import ModeledRecords
+
+# Columns of a batch that are not inputs of AdTechPlatform: the name and identifier of each
+# product, and the corporate emissions arguments of model_product
+PRODUCT_COLUMNS = (
+    "name",
+    "identifier",
+    "corporate_emissions_g",
+    "corporate_emissions_g_per_bid_request",
+)
+
+# Results of model_product that are never None
+REQUIRED_OUTPUTS = (
+    "primary_bid_request_emissions_g_co2e",
+    "primary_cookie_sync_emissions_g_co2e",
+    "atp_block_rate",
+    "publisher_block_rate",
+)
+
+
+def model_products(
+    defaults: AdTechPlatform, columns: dict[str, Any]
+) -> ModeledRecords[ModeledAdTechPlatform]:
+    """
+    Model products of one template as model_product does without distribution partners, for
+    columns holding a sequence or array of values per AdTechPlatform input or PRODUCT_COLUMNS,
+    one value per product. Inputs not provided or None take their value from the defaults, or
+    from the default of their field for inputs not eligible for default. Results are float64,
+    within the error of the float64 numeric backend, and None for products model_product
+    would fail to model.
+    """
+    unknown = set(columns) - set(get_field_metadata(AdTechPlatform).input_fields)
+    unknown -= set(PRODUCT_COLUMNS)
+    if unknown:
+        raise Exception(f"unknown ad tech platform columns: {', '.join(sorted(unknown))}")
+    rows = row_count(columns)
+
+    # model_product replaces the corporate emissions per bid request of the product
+    corporate_emissions = evaluate_batch(
+        CORPORATE_EMISSIONS_PER_BID_REQUEST_FORMULAS,
+        defaults,
+        columns,
+        columns.get("corporate_emissions_g"),
+        columns.get("corporate_emissions_g_per_bid_request"),
+        defaults.corporate_emissions_g_co2e_per_bid_request,
+    )["corporate_emissions_g_co2e_per_bid_request"]
+    results = evaluate_batch(
+        AD_TECH_PLATFORM_FORMULAS,
+        defaults,
+        {**columns, "corporate_emissions_g_co2e_per_bid_request": corporate_emissions},
+    )
+    # model_product fails without corporate emissions per bid request, dividing by zero, or
+    # missing an input of a result that is never None
+    failed = ~numpy.isfinite(corporate_emissions) | (corporate_emissions == 0)
+    for name in REQUIRED_OUTPUTS:
+        failed |= numpy.isnan(results[name])
+    outputs = {
+        name: to_values(numpy.where(failed, numpy.nan, result)) for name, result in results.items()
+    }
+    return ModeledRecords.from_columns(
+        ModeledAdTechPlatform,
+        {
+            "name": columns.get("name", [""] * rows),
+            "identifier": columns.get("identifier", [""] * rows),
+            **outputs,
+            "secondary_bid_request_emissions_g_co2e": [None] * rows,
+            "secondary_cookie_sync_emissions_g_co2e": [None] * rows,
+        },
+    )
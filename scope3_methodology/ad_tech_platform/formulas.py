@@ -0,0 +1,234 @@
+""" Formulas of the ad tech platform model, evaluated by its methods and its batch engine """
+from scope3_methodology.utils.constants import (
+    BILLION,
+    BYTES_PER_GB,
+    G_PER_MT,
+    ONE_HUNDRED,
+)
+from scope3_methodology.utils.formula import (
+    Formula,
+    Formulas,
+    after,
+    if_not_none,
+    if_truthy,
+    logged,
+    model_input,
+    parameter,
+    required,
+)
+
+bid_requests_processed_billion_per_month = model_input("bid_requests_processed_billion_per_month")
+depreciation_dollars_per_month = model_input("depreciation_dollars_per_month")
+data_transfer_emissions_mt_co2e_per_month = model_input("data_transfer_emissions_mt_co2e_per_month")
+cookie_syncs_processed_billion_per_month = model_input("cookie_syncs_processed_billion_per_month")
+
+# get_bid_requests_processed_per_month
+bid_requests_processed_per_month = required(bid_requests_processed_billion_per_month) * BILLION
+# get_server_emissions_g_co2e_per_month
+server_emissions_g_co2e_per_month = if_truthy(
+    depreciation_dollars_per_month,
+    required(model_input("server_emissions_mt_per_dollar_of_depreciation"))
+    * depreciation_dollars_per_month
+    * G_PER_MT,
+    required(model_input("server_emissions_mt_co2e_per_month")) * G_PER_MT,
+)
+# get_cookie_syncs_processed_per_month
+cookie_syncs_processed_per_month_provided = if_not_none(
+    cookie_syncs_processed_billion_per_month,
+    cookie_syncs_processed_billion_per_month * BILLION,
+    None,
+)
+# get_servers_processing_bid_requests_rate
+servers_processing_bid_requests_rate = (
+    required(model_input("servers_processing_bid_requests_pct")) / ONE_HUNDRED
+)
+# get_servers_processing_cookie_syncs_rate
+servers_processing_cookie_syncs_rate = (
+    required(model_input("servers_processing_cookie_syncs_pct")) / ONE_HUNDRED
+)
+# get_allocation_of_corporate_emissions_rate
+allocation_of_corporate_emissions_rate = (
+    required(model_input("allocation_of_corporate_emissions_pct")) / ONE_HUNDRED
+)
+# get_bid_requests_processed_from_ad_tech_platforms_rate
+bid_requests_processed_from_ad_tech_platforms_rate = (
+    required(model_input("bid_requests_processed_from_ad_tech_platforms_pct")) / ONE_HUNDRED
+)
+# get_bid_requests_processed_from_publishers_rate
+bid_requests_processed_from_publishers_rate = (
+    required(model_input("bid_requests_processed_from_publishers_pct")) / ONE_HUNDRED
+)
+# get_data_transfer_emissions_g_co2e_per_month
+data_transfer_emissions_g_co2e_per_month = if_not_none(
+    data_transfer_emissions_mt_co2e_per_month,
+    data_transfer_emissions_mt_co2e_per_month * G_PER_MT,
+    None,
+)
+# get_allocation_of_company_servers_rate
+allocation_of_company_servers_rate = (
+    required(model_input("allocation_of_company_servers_pct")) / ONE_HUNDRED
+)
+# get_allocated_server_emissions_g_co2e_per_month
+allocated_server_emissions_g_co2e_per_month = (
+    allocation_of_company_servers_rate * server_emissions_g_co2e_per_month
+)
+# get_atp_block_rate
+atp_block_rate = 1 - bid_requests_processed_from_ad_tech_platforms_rate
+# get_publisher_block_rate
+publisher_block_rate = 1 - bid_requests_processed_from_publishers_rate
+# comp_bid_request_size_gb
+bid_request_size_gb = required(model_input("bid_request_size_in_bytes")) / BYTES_PER_GB
+
+# comp_corporate_emissions_g_co2e_per_bid_request, from the corporate emissions arguments of
+# model_product, otherwise the corporate emissions per bid request of the defaults
+corporate_emissions_g = parameter("corporate_emissions_g")
+corporate_emissions_g_per_bid_request = parameter("corporate_emissions_g_per_bid_request")
+corporate_emissions_g_co2e_per_bid_request = if_truthy(
+    corporate_emissions_g,
+    logged(
+        allocation_of_corporate_emissions_rate
+        * corporate_emissions_g
+        / bid_requests_processed_per_month,
+        "corporate emissions g co2e per bid request",
+        1,
+        ".8f",
+    ),
+    if_truthy(
+        corporate_emissions_g_per_bid_request,
+        corporate_emissions_g_per_bid_request,
+        parameter("default_corporate_emissions_g_co2e_per_bid_request"),
+    ),
+)
+
+
+def data_transfer_emissions_g_co2e_per_bid_request(depth: int) -> Formula:
+    """comp_data_transfer_emissions_g_co2e_per_bid_request"""
+    from_size = logged(
+        bid_request_size_gb * required(model_input("server_to_server_emissions_g_co2e_per_gb")),
+        "data transfer emissions g co2e per bid request",
+        depth,
+        ".8f",
+    )
+    return after(
+        bid_requests_processed_per_month,
+        if_truthy(
+            data_transfer_emissions_g_co2e_per_month,
+            if_truthy(
+                bid_requests_processed_per_month,
+                data_transfer_emissions_g_co2e_per_month / bid_requests_processed_per_month,
+                from_size,
+            ),
+            from_size,
+        ),
+    )
+
+
+def server_emissions_g_co2e_per_bid_request(depth: int) -> Formula:
+    """comp_server_emissions_g_co2e_per_bid_request"""
+    return after(
+        logged(
+            server_emissions_g_co2e_per_month, "server emissions g co2e per month", depth - 1, ".6f"
+        ),
+        logged(
+            if_truthy(
+                bid_requests_processed_per_month,
+                (allocated_server_emissions_g_co2e_per_month * servers_processing_bid_requests_rate)
+                / bid_requests_processed_per_month,
+                0,
+            ),
+            "server emissions g co2e per bid request",
+            depth,
+            ".6f",
+        ),
+    )
+
+
+def primary_emissions_g_co2e_per_bid_request(depth: int) -> Formula:
+    """comp_primary_emissions_g_co2e_per_bid_request"""
+    return logged(
+        required(model_input("corporate_emissions_g_co2e_per_bid_request"))
+        + required(data_transfer_emissions_g_co2e_per_bid_request(depth - 1))
+        + server_emissions_g_co2e_per_bid_request(depth - 1),
+        "primary emissions g co2e per bid request",
+        depth,
+        ".6f",
+    )
+
+
+def cookie_syncs_processed_per_month(depth: int) -> Formula:
+    """comp_cookie_syncs_processed_per_month"""
+    return if_not_none(
+        cookie_syncs_processed_per_month_provided,
+        cookie_syncs_processed_per_month_provided,
+        logged(
+            bid_requests_processed_per_month
+            * required(model_input("cookie_syncs_processed_per_bid_request")),
+            "cookie syncs processed per month",
+            depth,
+        ),
+    )
+
+
+def water_usage_to_emissions_ratio_h2o_m_3_per_g_co2e(depth: int) -> Formula:
+    """comp_water_usage_to_emissions_ratio_h2o_m_3_per_g_co2e"""
+    return logged(
+        required(model_input("datacenter_water_intensity_h2o_m_3_per_mwh"))
+        / required(model_input("server_emissions_g_co2e_per_kwh"))
+        / 1000,
+        "h2o m^3 per g co2e emissions",
+        depth,
+    )
+
+
+def primary_emissions_g_co2e_per_cookie_sync(depth: int) -> Formula:
+    """comp_primary_emissions_g_co2e_per_cookie_sync"""
+    syncs_processed_per_month = cookie_syncs_processed_per_month(depth)
+    return logged(
+        if_truthy(
+            syncs_processed_per_month,
+            (allocated_server_emissions_g_co2e_per_month * servers_processing_cookie_syncs_rate)
+            / syncs_processed_per_month,
+            0,
+        ),
+        "primary emissions g per cookie sync",
+        depth,
+    )
+
+
+def water_usage_per_cookie_sync(depth: int) -> Formula:
+    """comp_water_usage_per_cookie_sync"""
+    water_usage_to_emissions_ratio = water_usage_to_emissions_ratio_h2o_m_3_per_g_co2e(depth - 1)
+    return after(
+        water_usage_to_emissions_ratio,
+        logged(
+            primary_emissions_g_co2e_per_cookie_sync(depth) * water_usage_to_emissions_ratio,
+            "primary water usage m^3 per cookie sync",
+            depth,
+        ),
+    )
+
+
+# The primary results of model_product, without distribution partners, logged at the depth
+# the evaluator is called with
+AD_TECH_PLATFORM_FORMULAS = Formulas(
+    {
+        "primary_bid_request_emissions_g_co2e": primary_emissions_g_co2e_per_bid_request(0),
+        "primary_cookie_sync_emissions_g_co2e": primary_emissions_g_co2e_per_cookie_sync(0),
+        "corporate_emissions_g_co2e_per_bid_request": model_input(
+            "corporate_emissions_g_co2e_per_bid_request"
+        ),
+        "cookie_sync_distribution_ratio": model_input("cookie_sync_distribution_ratio"),
+        "atp_block_rate": atp_block_rate,
+        "publisher_block_rate": publisher_block_rate,
+    }
+)
+
+# The corporate emissions per bid request model_product computes before its primary results
+CORPORATE_EMISSIONS_PER_BID_REQUEST_FORMULAS = Formulas(
+    {"corporate_emissions_g_co2e_per_bid_request": corporate_emissions_g_co2e_per_bid_request},
+    parameters=(
+        "corporate_emissions_g",
+        "corporate_emissions_g_per_bid_request",
+        "default_corporate_emissions_g_co2e_per_bid_request",
+    ),
+)
@@ -1,19 +1,101 @@
 """ Model for computing emissions for an ad tech platform"""
 from dataclasses import dataclass, field
 from decimal import Decimal
-from typing import Optional
+from typing import Callable, Iterable, Optional
 
-from scope3_methodology.utils.constants import (
-    BILLION,
-    BYTES_PER_GB,
-    G_PER_MT,
-    ONE_HUNDRED,
+from scope3_methodology.ad_tech_platform import formulas
+from scope3_methodology.utils.custom_base_model import (
+    CustomBaseModel,
+    memoized,
+    resolve_inputs,
 )
-from scope3_methodology.utils.custom_base_model import CustomBaseModel
-from scope3_methodology.utils.utils import log_result, not_none
+from scope3_methodology.utils.derivation import trace_model
+from scope3_methodology.utils.formula import scalar_function
+from scope3_methodology.utils.modeled_records import modeled_record
+from scope3_methodology.utils.numeric import to_number
+from scope3_methodology.utils.utils import (
+    derivation_logging_enabled,
+    log_result,
+    not_none,
+)
+
+# The methods of AdTechPlatform, compiled from its formulas
+evaluate_bid_requests_processed_per_month = scalar_function(
+    formulas.bid_requests_processed_per_month
+)
+evaluate_server_emissions_g_co2e_per_month = scalar_function(
+    formulas.server_emissions_g_co2e_per_month
+)
+evaluate_cookie_syncs_processed_per_month_provided = scalar_function(
+    formulas.cookie_syncs_processed_per_month_provided
+)
+evaluate_servers_processing_bid_requests_rate = scalar_function(
+    formulas.servers_processing_bid_requests_rate
+)
+evaluate_servers_processing_cookie_syncs_rate = scalar_function(
+    formulas.servers_processing_cookie_syncs_rate
+)
+evaluate_allocation_of_corporate_emissions_rate = scalar_function(
+    formulas.allocation_of_corporate_emissions_rate
+)
+evaluate_bid_requests_processed_from_ad_tech_platforms_rate = scalar_function(
+    formulas.bid_requests_processed_from_ad_tech_platforms_rate
+)
+evaluate_bid_requests_processed_from_publishers_rate = scalar_function(
+    formulas.bid_requests_processed_from_publishers_rate
+)
+evaluate_data_transfer_emissions_g_co2e_per_month = scalar_function(
+    formulas.data_transfer_emissions_g_co2e_per_month
+)
+evaluate_allocation_of_company_servers_rate = scalar_function(
+    formulas.allocation_of_company_servers_rate
+)
+evaluate_allocated_server_emissions_g_co2e_per_month = scalar_function(
+    formulas.allocated_server_emissions_g_co2e_per_month
+)
+evaluate_atp_block_rate = scalar_function(formulas.atp_block_rate)
+evaluate_publisher_block_rate = scalar_function(formulas.publisher_block_rate)
+evaluate_bid_request_size_gb = scalar_function(formulas.bid_request_size_gb)
+evaluate_data_transfer_emissions_g_co2e_per_bid_request = scalar_function(
+    formulas.data_transfer_emissions_g_co2e_per_bid_request(0)
+)
+evaluate_server_emissions_g_co2e_per_bid_request = scalar_function(
+    formulas.server_emissions_g_co2e_per_bid_request(0)
+)
+evaluate_primary_emissions_g_co2e_per_bid_request = scalar_function(
+    formulas.primary_emissions_g_co2e_per_bid_request(0)
+)
+evaluate_cookie_syncs_processed_per_month = scalar_function(
+    formulas.cookie_syncs_processed_per_month(0)
+)
+evaluate_water_usage_to_emissions_ratio_h2o_m_3_per_g_co2e = scalar_function(
+    formulas.water_usage_to_emissions_ratio_h2o_m_3_per_g_co2e(0)
+)
+evaluate_primary_emissions_g_co2e_per_cookie_sync = scalar_function(
+    formulas.primary_emissions_g_co2e_per_cookie_sync(0)
+)
+evaluate_water_usage_per_cookie_sync = scalar_function(formulas.water_usage_per_cookie_sync(0))
+evaluate_corporate_emissions_g_co2e_per_bid_request = (
+    formulas.CORPORATE_EMISSIONS_PER_BID_REQUEST_FORMULAS.scalar()
+)
+evaluate_product = formulas.AD_TECH_PLATFORM_FORMULAS.scalar()
 
 
-@dataclass
+def specialise_product(defaults: "AdTechPlatform", fixed: Iterable[str]) -> Callable[..., tuple]:
+    """
+    Return evaluate_product with the inputs named in fixed folded to the values a platform
+    without them resolves with defaults, for platforms never given these inputs, see
+    Formulas.specialise
+    """
+    platform = AdTechPlatform()
+    platform.set_defaults(defaults)
+    resolved = resolve_inputs(platform)
+    return formulas.AD_TECH_PLATFORM_FORMULAS.specialise(
+        {name: getattr(resolved, name) for name in fixed}
+    ).scalar()
+
+
+@modeled_record(frozen=True)
 class ModeledAdTechPlatform:
     """This represents a modeled node in our graph"""
 
@@ -42,10 +124,10 @@ class AdTechPlatform(CustomBaseModel):
     """Raw emissions information about an ATP and methodology of how to calculate emissions"""
 
     allocation_of_company_servers_pct: Optional[Decimal] = field(
-        default=ONE_HUNDRED, metadata={"default_eligible": False}
+        default=Decimal("100.0"), metadata={"default_eligible": False}
     )
     allocation_of_corporate_emissions_pct: Optional[Decimal] = field(
-        default=ONE_HUNDRED, metadata={"default_eligible": False}
+        default=Decimal("100.0"), metadata={"default_eligible": False}
     )
     corporate_emissions_g_co2e_per_bid_request: Optional[Decimal] = field(
         default=None, metadata={"default_eligible": True}
@@ -104,144 +186,87 @@ class AdTechPlatform(CustomBaseModel):
         """Set defaults to be used as fallback in computations"""
         self.defaults = defaults
 
+    @memoized
     def get_bid_requests_processed_per_month(self) -> Decimal:
         """Returns bid requests total processed per month"""
-        return not_none(self.bid_requests_processed_billion_per_month) * BILLION
+        return evaluate_bid_requests_processed_per_month(resolve_inputs(self))
 
+    @memoized
     def get_server_emissions_g_co2e_per_month(self) -> Decimal:
         """Returns server emissions per month in grams"""
-        if self.depreciation_dollars_per_month:
-            return (
-                not_none(self.server_emissions_mt_per_dollar_of_depreciation)
-                * self.depreciation_dollars_per_month
-                * G_PER_MT
-            )
-        return not_none(self.server_emissions_mt_co2e_per_month) * G_PER_MT
+        return evaluate_server_emissions_g_co2e_per_month(resolve_inputs(self))
 
     def get_cookie_syncs_processed_per_month(self) -> Decimal | None:
         """Returns cookies syncs processed per month"""
-        if self.cookie_syncs_processed_billion_per_month is not None:
-            return self.cookie_syncs_processed_billion_per_month * BILLION
-        return None
+        return evaluate_cookie_syncs_processed_per_month_provided(resolve_inputs(self))
 
     def get_servers_processing_bid_requests_rate(self) -> Decimal:
         """Returns servers processing bid requests rate (decimal fraction)"""
-        return not_none(self.servers_processing_bid_requests_pct) / ONE_HUNDRED
+        return evaluate_servers_processing_bid_requests_rate(resolve_inputs(self))
 
     def get_servers_processing_cookie_syncs_rate(self) -> Decimal:
         """Returns servers processing cookie syncs rate (decimal fraction)"""
-        return not_none(self.servers_processing_cookie_syncs_pct) / ONE_HUNDRED
+        return evaluate_servers_processing_cookie_syncs_rate(resolve_inputs(self))
 
     def get_allocation_of_corporate_emissions_rate(self) -> Decimal:
         """Returns allocation of corporate emissions rate (decimal fraction)"""
-        return not_none(self.allocation_of_corporate_emissions_pct) / ONE_HUNDRED
+        return evaluate_allocation_of_corporate_emissions_rate(resolve_inputs(self))
 
     def get_bid_requests_processed_from_ad_tech_platforms_rate(self) -> Decimal:
         """Returns bid requests processed from incoming ATPs rate (decimal fraction)"""
-
-        return not_none(self.bid_requests_processed_from_ad_tech_platforms_pct) / ONE_HUNDRED
+        return evaluate_bid_requests_processed_from_ad_tech_platforms_rate(resolve_inputs(self))
 
     def get_bid_requests_processed_from_publishers_rate(self) -> Decimal:
         """Returns bid requests processed from incoming Publishers rate (decimal fraction)"""
-        return not_none(self.bid_requests_processed_from_publishers_pct) / ONE_HUNDRED
+        return evaluate_bid_requests_processed_from_publishers_rate(resolve_inputs(self))
 
     def get_data_transfer_emissions_g_co2e_per_month(self) -> Decimal | None:
         """Returns data transfere emissions per month in grams"""
-        if self.data_transfer_emissions_mt_co2e_per_month is not None:
-            return self.data_transfer_emissions_mt_co2e_per_month * G_PER_MT
-        return None
+        return evaluate_data_transfer_emissions_g_co2e_per_month(resolve_inputs(self))
 
     def get_allocation_of_company_servers_rate(self) -> Decimal:
         """Returns allocation of company servers rate (decimal fraction)"""
-        return not_none(self.allocation_of_company_servers_pct) / ONE_HUNDRED
+        return evaluate_allocation_of_company_servers_rate(resolve_inputs(self))
+
+    @memoized
+    def get_allocated_server_emissions_g_co2e_per_month(self) -> Decimal:
+        """
+        Returns the server emissions per month in grams allocated to the product, shared
+        by the bid request and cookie sync computations
+        """
+        return evaluate_allocated_server_emissions_g_co2e_per_month(resolve_inputs(self))
 
     def get_atp_block_rate(self) -> Decimal:
         """
         Returns the computed block rate, or requests blocked from incoming bid requests
         from adtech platforms
         """
-        return 1 - self.get_bid_requests_processed_from_ad_tech_platforms_rate()
+        return evaluate_atp_block_rate(resolve_inputs(self))
 
     def get_publisher_block_rate(self) -> Decimal:
         """
         Returns the computed block rate, or requests blocked from incoming direct bid
         requests from publishers
         """
-        return 1 - self.get_bid_requests_processed_from_publishers_rate()
+        return evaluate_publisher_block_rate(resolve_inputs(self))
 
     def comp_bid_request_size_gb(self) -> Decimal:
         """Compute the bid requests size in GB"""
-        return not_none(self.bid_request_size_in_bytes) / BYTES_PER_GB
+        return evaluate_bid_request_size_gb(resolve_inputs(self))
 
     def comp_data_transfer_emissions_g_co2e_per_bid_request(self, depth: int) -> Decimal:
         """Compute the data transfer emissions per bid request in grams CO2e"""
-        data_transfer_emissions_g_co2e_per_month = (
-            self.get_data_transfer_emissions_g_co2e_per_month()
-        )
-        requests_processed_per_month = self.get_bid_requests_processed_per_month()
-        if data_transfer_emissions_g_co2e_per_month and requests_processed_per_month:
-            return data_transfer_emissions_g_co2e_per_month / requests_processed_per_month
-
-        data_transfer_emissions_g_co2e_per_bid_request = self.comp_bid_request_size_gb() * not_none(
-            self.server_to_server_emissions_g_co2e_per_gb
+        return evaluate_data_transfer_emissions_g_co2e_per_bid_request(
+            resolve_inputs(self), depth=depth
         )
-        log_result(
-            "data transfer emissions g co2e per bid request",
-            f"{data_transfer_emissions_g_co2e_per_bid_request:.8f}",
-            depth,
-        )
-        return data_transfer_emissions_g_co2e_per_bid_request
 
-    def comp_server_emissions_g_co2e_per_bid_request(
-        self,
-        depth: int,
-    ) -> Decimal:
+    def comp_server_emissions_g_co2e_per_bid_request(self, depth: int) -> Decimal:
         """Compute the server emissions per bid request in grams CO2e"""
-        server_emissions_g = self.get_server_emissions_g_co2e_per_month()
-        log_result(
-            "server emissions g co2e per month",
-            f"{server_emissions_g:.6f}",
-            depth - 1,
-        )
-        requests_processed_per_month = self.get_bid_requests_processed_per_month()
-        server_emissions_g_co2e_per_bid_request = 0
-        if requests_processed_per_month:
-            server_emissions_g_co2e_per_bid_request = (
-                self.get_allocation_of_company_servers_rate()
-                * server_emissions_g
-                * self.get_servers_processing_bid_requests_rate()
-            ) / requests_processed_per_month
-
-        log_result(
-            "server emissions g co2e per bid request",
-            f"{server_emissions_g_co2e_per_bid_request:.6f}",
-            depth,
-        )
-        return server_emissions_g_co2e_per_bid_request
+        return evaluate_server_emissions_g_co2e_per_bid_request(resolve_inputs(self), depth=depth)
 
-    def comp_primary_emissions_g_co2e_per_bid_request(
-        self,
-        depth: int,
-    ) -> Decimal:
+    def comp_primary_emissions_g_co2e_per_bid_request(self, depth: int) -> Decimal:
         """Compute the primary emissions per bid request in grams CO2e"""
-        data_transfer_emissions_g_co2e_per_bid_request = (
-            self.comp_data_transfer_emissions_g_co2e_per_bid_request(depth - 1)
-        )
-
-        server_emissions_g_co2e_per_bid_request = self.comp_server_emissions_g_co2e_per_bid_request(
-            depth - 1
-        )
-        primary_emissions_g_co2e_per_bid_request = (
-            not_none(self.corporate_emissions_g_co2e_per_bid_request)
-            + not_none(data_transfer_emissions_g_co2e_per_bid_request)
-            + server_emissions_g_co2e_per_bid_request
-        )
-        log_result(
-            "primary emissions g co2e per bid request",
-            f"{primary_emissions_g_co2e_per_bid_request:.6f}",
-            depth,
-        )
-        return primary_emissions_g_co2e_per_bid_request
+        return evaluate_primary_emissions_g_co2e_per_bid_request(resolve_inputs(self), depth=depth)
 
     def comp_secondary_emissions_g_co2e_per_bid_request(
         self, distribution_partners: list[DistributionPartner], depth: int
@@ -250,76 +275,40 @@ class AdTechPlatform(CustomBaseModel):
         Compute the secondary emissions from distribution partners per bid request
         in grams CO2e.
         """
-        secondary_emissions_per_bid_request = Decimal("0.0")
+        secondary_emissions_per_bid_request = to_number(Decimal("0.0"))
         if distribution_partners:
             for edge in distribution_partners:
-                dp_emissions = (
-                    1 - edge.partner.atp_block_rate
-                ) * edge.partner.primary_bid_request_emissions_g_co2e
+                dp_emissions = (1 - to_number(edge.partner.atp_block_rate)) * to_number(
+                    edge.partner.primary_bid_request_emissions_g_co2e
+                )
                 secondary_emissions_per_bid_request += (
-                    edge.bid_request_distribution_rate * dp_emissions
+                    to_number(edge.bid_request_distribution_rate) * dp_emissions
+                )
+            if derivation_logging_enabled():
+                log_result(
+                    "secondary emissions g co2e per bid request",
+                    secondary_emissions_per_bid_request,
+                    depth,
                 )
-            log_result(
-                "secondary emissions g co2e per bid request",
-                secondary_emissions_per_bid_request,
-                depth,
-            )
         return secondary_emissions_per_bid_request
 
     def comp_cookie_syncs_processed_per_month(self, depth: int) -> Decimal:
         """Compute the total number of cookies syncs processed per month"""
-        cookie_syncs_processed_per_month = self.get_cookie_syncs_processed_per_month()
-        if cookie_syncs_processed_per_month is not None:
-            return cookie_syncs_processed_per_month
-
-        cookie_syncs_processed = self.get_bid_requests_processed_per_month() * not_none(
-            self.cookie_syncs_processed_per_bid_request
-        )
-        log_result("cookie syncs processed per month", cookie_syncs_processed, depth)
-        return cookie_syncs_processed
+        return evaluate_cookie_syncs_processed_per_month(resolve_inputs(self), depth=depth)
 
     def comp_water_usage_to_emissions_ratio_h2o_m_3_per_g_co2e(self, depth: int) -> Decimal:
         """Compute the water usage to emissions rate (H2O m^3 per gCO2e)"""
-        water_m3_per_emissions = (
-            not_none(self.datacenter_water_intensity_h2o_m_3_per_mwh)
-            / not_none(self.server_emissions_g_co2e_per_kwh)
-            / Decimal("1000.0")
+        return evaluate_water_usage_to_emissions_ratio_h2o_m_3_per_g_co2e(
+            resolve_inputs(self), depth=depth
         )
-        log_result("h2o m^3 per g co2e emissions", water_m3_per_emissions, depth)
-        return water_m3_per_emissions
 
-    def comp_primary_emissions_g_co2e_per_cookie_sync(
-        self,
-        depth: int,
-    ) -> Decimal:
+    def comp_primary_emissions_g_co2e_per_cookie_sync(self, depth: int) -> Decimal:
         """Compute the primary emissions per cookie sync in grams CO2e"""
-        syncs_processed_per_month = self.comp_cookie_syncs_processed_per_month(depth)
-
-        primary_emissions_per_cookie_sync = 0
-        if syncs_processed_per_month:
-            primary_emissions_per_cookie_sync = (
-                self.get_allocation_of_company_servers_rate()
-                * self.get_server_emissions_g_co2e_per_month()
-                * self.get_servers_processing_cookie_syncs_rate()
-            ) / syncs_processed_per_month
+        return evaluate_primary_emissions_g_co2e_per_cookie_sync(resolve_inputs(self), depth=depth)
 
-        log_result("primary emissions g per cookie sync", primary_emissions_per_cookie_sync, depth)
-        return primary_emissions_per_cookie_sync
-
-    def comp_water_usage_per_cookie_sync(
-        self,
-        depth: int,
-    ) -> Decimal:
+    def comp_water_usage_per_cookie_sync(self, depth: int) -> Decimal:
         """Compute the water usuage per cookie sync"""
-        water_usage_to_emissions_ratio = (
-            self.comp_water_usage_to_emissions_ratio_h2o_m_3_per_g_co2e(depth - 1)
-        )
-        primary_water_usage = (
-            self.comp_primary_emissions_g_co2e_per_cookie_sync(depth)
-            * water_usage_to_emissions_ratio
-        )
-        log_result("primary water usage m^3 per cookie sync", primary_water_usage, depth)
-        return primary_water_usage
+        return evaluate_water_usage_per_cookie_sync(resolve_inputs(self), depth=depth)
 
     def comp_secondary_emissions_g_co2e_per_cookie_sync(
         self, distribution_partners: list[DistributionPartner], depth: int
@@ -328,18 +317,21 @@ class AdTechPlatform(CustomBaseModel):
         Compute the secondary emissions from distribution partners per cookie sync
         in grams CO2e.
         """
-        secondary_emissions_per_cookie_sync = Decimal("0.0")
+        inputs = resolve_inputs(self)
+        secondary_emissions_per_cookie_sync = to_number(Decimal("0.0"))
         if distribution_partners:
             for edge in distribution_partners:
-                secondary_emissions_per_cookie_sync += (
+                secondary_emissions_per_cookie_sync += to_number(
                     edge.partner.primary_cookie_sync_emissions_g_co2e
                 )
-            secondary_emissions_per_cookie_sync *= not_none(self.cookie_sync_distribution_ratio)
-            log_result(
-                "secondary emissions g per cookie sync",
-                f"{secondary_emissions_per_cookie_sync:.6f}",
-                depth,
-            )
+            secondary_emissions_per_cookie_sync *= not_none(inputs.cookie_sync_distribution_ratio)
+            if derivation_logging_enabled():
+                log_result(
+                    "secondary emissions g per cookie sync",
+                    secondary_emissions_per_cookie_sync,
+                    depth,
+                    ".6f",
+                )
         return secondary_emissions_per_cookie_sync
 
     def comp_corporate_emissions_g_co2e_per_bid_request(
@@ -350,22 +342,13 @@ class AdTechPlatform(CustomBaseModel):
     ) -> Decimal:
         """Compute the corporate emissions per bid request in grams CO2e"""
         corporate_emissions_g_co2e_per_bid_request = (
-            defaults.corporate_emissions_g_co2e_per_bid_request
+            evaluate_corporate_emissions_g_co2e_per_bid_request(
+                resolve_inputs(self),
+                to_number(corporate_emissions_g),
+                corporate_emissions_g_per_bid_request,
+                defaults.corporate_emissions_g_co2e_per_bid_request,
+            )[0]
         )
-        if corporate_emissions_g_per_bid_request or corporate_emissions_g:
-            corporate_emissions_g_co2e_per_bid_request = corporate_emissions_g_per_bid_request
-            if corporate_emissions_g:
-                corporate_emissions_g_co2e_per_bid_request = (
-                    self.get_allocation_of_corporate_emissions_rate()
-                    * corporate_emissions_g
-                    / self.get_bid_requests_processed_per_month()
-                )
-                log_result(
-                    "corporate emissions g co2e per bid request",
-                    f"{corporate_emissions_g_co2e_per_bid_request}:.8f",
-                    1,
-                )
-
         if not corporate_emissions_g_co2e_per_bid_request:
             raise Exception("failed to compute corporate emissions per bid request")
         self.corporate_emissions_g_co2e_per_bid_request = corporate_emissions_g_co2e_per_bid_request
@@ -380,9 +363,11 @@ class AdTechPlatform(CustomBaseModel):
         corporate_emissions_g: Decimal | None = None,
         corporate_emissions_g_per_bid_request: Decimal | None = None,
         depth: int = 1,
+        evaluate: Callable[..., tuple] = evaluate_product,
     ) -> ModeledAdTechPlatform:
         """
         Model a product adtech platform) based on raw emissions data and constants.
+        :param evaluate: evaluator of the primary results, see specialise_product
         :return: ModeledAdTechPlatform
         """
         # Set defaults for all functions to use for fallback during comp
@@ -394,12 +379,14 @@ class AdTechPlatform(CustomBaseModel):
         )
 
         # Compute emissions
-        primary_emissions_per_bid_request = self.comp_primary_emissions_g_co2e_per_bid_request(
-            depth
-        )
-        primary_emissions_per_cookie_sync = self.comp_primary_emissions_g_co2e_per_cookie_sync(
-            depth
-        )
+        (
+            primary_emissions_per_bid_request,
+            primary_emissions_per_cookie_sync,
+            corporate_emissions_g_co2e_per_bid_request,
+            cookie_sync_distribution_ratio,
+            atp_block_rate,
+            publisher_block_rate,
+        ) = evaluate(resolve_inputs(self), depth=depth)
 
         secondary_emissions_per_bid_request = None
         secondary_emissions_per_cookie_sync = None
@@ -411,15 +398,16 @@ class AdTechPlatform(CustomBaseModel):
                 self.comp_secondary_emissions_g_co2e_per_cookie_sync(distribution_partners, depth)
             )
 
+        trace_model(name, self)
         return ModeledAdTechPlatform(
             name,
             identifier,
             primary_emissions_per_bid_request,
             primary_emissions_per_cookie_sync,
-            self.corporate_emissions_g_co2e_per_bid_request,
-            self.cookie_sync_distribution_ratio,
-            self.get_atp_block_rate(),
-            self.get_publisher_block_rate(),
+            corporate_emissions_g_co2e_per_bid_request,
+            cookie_sync_distribution_ratio,
+            atp_block_rate,
+            publisher_block_rate,
             secondary_emissions_per_bid_request,
             secondary_emissions_per_cookie_sync,
         )
@@ -1,23 +1,33 @@
 # flake8: noqa
 
 """ Expose a simple API for calculating emissions and pulling in computed defaults """
+import hmac
 import os
+import threading
 from decimal import Decimal
-from typing import Any
+from functools import lru_cache
+from typing import Any, Callable
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.openapi.docs import get_redoc_html
+from fastapi.responses import JSONResponse
 
+from scope3_methodology.ad_tech_platform.batch import PRODUCT_COLUMNS, model_products
 from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.api.defaults import (
+    POWER_MODEL_CHANNELS,
+    ApiDefaults,
+    DefaultsFiles,
+    DefaultsReloader,
+)
 from scope3_methodology.api.input_models import (
     ATPInput,
     ATPSecondaryEmissionsInput,
     ATPTemplate,
     CorporateInput,
     EndUserDevices,
-    NetworkingConnectionType,
-    OrganizationType,
     PropertyChannel,
     StreamingResolution,
 )
@@ -26,14 +36,15 @@ from scope3_methodology.api.response_models import (
     PropertyDefaultsResponse,
 )
 from scope3_methodology.corporate.model import CorporateEmissions
-from scope3_methodology.end_user_device.model import EndUserDevice
-from scope3_methodology.networking.model import NetworkingConnection
-from scope3_methodology.networking.transmission_rate_model import TransmissionRate
-from scope3_methodology.publisher.model import Property
+from scope3_methodology.utils.custom_base_model import get_field_metadata
+from scope3_methodology.utils.derivation import derivation_trace
+from scope3_methodology.utils.file_cache import FileCache
 from scope3_methodology.utils.public_yaml_files import (
+    DEFAULT_MANIFEST_FILE,
     PublicYamlInformation,
     get_all_public_yaml_files,
 )
+from scope3_methodology.utils.sensitivity import compute_sensitivity
 from scope3_methodology.utils.utils import get_facts
 from scope3_methodology.utils.yaml_helpers import yaml_load
 
@@ -47,19 +58,27 @@ async def get_redoc_documentation():
     return get_redoc_html(openapi_url="/openapi.json", title="docs")
 
 
-public_yaml_files: dict[str, PublicYamlInformation] = get_all_public_yaml_files()
-organization_defaults: dict[OrganizationType, CorporateEmissions] = {}
-adtech_platform_defaults: dict[ATPTemplate, AdTechPlatform] = {}
-property_defaults: dict[PropertyChannel, Property] = {}
-end_user_device_defaults: dict[EndUserDevices, EndUserDevice] = {}
-networking_connection_defaults: dict[NetworkingConnectionType, NetworkingConnection] = {}
-transmission_rate_defaults: dict[PropertyChannel, dict[StreamingResolution, TransmissionRate]] = {}
-docs_defaults: dict[str, Any] = {}
-power_model_channels = [
-    PropertyChannel.STREAMING_VIDEO,
-    PropertyChannel.DIGITAL_AUDIO,
-    PropertyChannel.CTV_BVOD,
-]
+public_yaml_files_lock = threading.Lock()
+corporate_file_cache: FileCache[bytes] = FileCache(
+    int(os.environ.get("PUBLIC_YAML_CACHE_SIZE", 128))
+)
+defaults_reloader = DefaultsReloader()
+
+
+@lru_cache(maxsize=None)
+def load_public_yaml_files() -> dict[str, PublicYamlInformation]:
+    """Scan the public yaml files, once, even when there are none"""
+    manifest_file = os.environ.get("PUBLIC_YAML_MANIFEST_FILE", DEFAULT_MANIFEST_FILE)
+    return get_all_public_yaml_files(manifest_file=manifest_file)
+
+
+def get_public_yaml_file_info() -> dict[str, PublicYamlInformation]:
+    """
+    Scan the public yaml files on first use instead of when the API module is imported.
+    Requests arriving together before the first scan wait for it rather than scanning too.
+    """
+    with public_yaml_files_lock:
+        return load_public_yaml_files()
 
 
 def load_default_files(
@@ -70,47 +89,48 @@ def load_default_files(
     networking_file_path: str,
     transmission_rates_file_path,
     docs_defaults_file_path: str,
-):
-    """Load all default files into memory"""
-    for atp_template in ATPTemplate:
-        adtech_platform_defaults[atp_template] = AdTechPlatform.load_default_yaml(
-            atp_template.value, adtech_platform_defaults_file
-        )
-    for org_type in OrganizationType:
-        organization_defaults[org_type] = CorporateEmissions.load_default_yaml(
-            org_type.value, organization_defaults_file_path
-        )
-    for channel in PropertyChannel:
-        property_defaults[channel] = Property.load_default_yaml(
-            "generic", property_defaults_file_path, channel.value
+) -> ApiDefaults:
+    """Load all default files into a new snapshot and swap it in as the served defaults"""
+    return defaults_reloader.load(
+        DefaultsFiles(
+            adtech_platform=adtech_platform_defaults_file,
+            organization=organization_defaults_file_path,
+            property=property_defaults_file_path,
+            end_user_device=end_user_device_file_path,
+            networking=networking_file_path,
+            transmission_rate=transmission_rates_file_path,
+            docs=docs_defaults_file_path,
         )
+    )
 
-    for device in EndUserDevices:
-        end_user_device_defaults[device] = EndUserDevice.load_default_yaml(
-            device.value, end_user_device_file_path
-        )
 
-    for connection_type in NetworkingConnectionType:
-        networking_connection_defaults[connection_type] = NetworkingConnection.load_default_yaml(
-            connection_type.value, networking_file_path
-        )
+def get_defaults() -> ApiDefaults:
+    """
+    Return the current defaults snapshot. Endpoints read it once per request so a
+    reload in between never mixes old and new defaults in a single response.
+    """
+    return defaults_reloader.get()
 
-    for channel in power_model_channels:
-        resolution_defaults: dict[StreamingResolution, TransmissionRate] = {}
-        for resolution in StreamingResolution:
-            if channel == PropertyChannel.DIGITAL_AUDIO and resolution == StreamingResolution.ULTRA:
-                continue
 
-            resolution_defaults[resolution] = TransmissionRate.load_default_yaml(
-                resolution.value, transmission_rates_file_path, channel.value
-            )
-        transmission_rate_defaults[channel] = resolution_defaults
+def calculate(explain: bool, compute: Callable[..., Any], **kwargs) -> Any:
+    """
+    Return the result of a model method called with kwargs. In explain mode, return the
+    result with the inputs of the model and the tree of steps it was derived from.
+    """
+    if not explain:
+        return compute(**kwargs)
+    with derivation_trace() as trace:
+        result = compute(**kwargs)
+    return {"result": result, "explain": trace.to_dict()}
 
-    with open(docs_defaults_file_path, "r", encoding="UTF-8") as defaults_stream:
-        defaults_document = yaml_load(defaults_stream)
-        dd = defaults_document["defaults"]
-        for k in dd:
-            docs_defaults[k] = dd[k]
+
+def sensitivity_response(model: Any, compute: Callable[..., Any], **kwargs) -> dict[str, Any]:
+    """
+    Return the result of a method modeling a model called with kwargs, with the sensitivity
+    of each of its numbers to the inputs of the model, see compute_sensitivity
+    """
+    result, sensitivity = compute_sensitivity(model, compute, **kwargs)
+    return {"result": result, "sensitivity": sensitivity}
 
 
 @app.on_event("startup")
@@ -120,41 +140,42 @@ async def startup_event():
 
     It will load:
     - all defatults for usage in calculating emissions
-    - all public yaml files
-    """
-
-    atp_defaults_file_path = os.environ.get("ATP_DEFAULTS_FILE")
-    organization_defaults_file_path = os.environ.get("ORGANIZATION_DEFAULTS_FILE")
-    property_defaults_file_path = os.environ.get("PROPERTY_DEFAULTS_FILE")
-    end_user_device_file_path = os.environ.get("END_USER_DEVICE_DEFAULTS_FILE")
-    networking_file_path = os.environ.get("NETWORKING_DEFAULTS_FILE")
-    transmission_rates_file_path = os.environ.get("TRANSMISSION_RATE_FILE")
-    docs_defaults_file_path = os.environ.get("DOCS_DEFAULTS_FILE")
-
-    if atp_defaults_file_path is None:
-        raise UnboundLocalError("Must provide environment variable: ATP_DEFAULTS_FILE")
-    if organization_defaults_file_path is None:
-        raise UnboundLocalError("Must provide environment variable: ORGANIZATION_DEFAULTS_FILE")
-    if property_defaults_file_path is None:
-        raise UnboundLocalError("Must provide environment variable: PROPERTY_DEFAULTS_FILE")
-    if end_user_device_file_path is None:
-        raise UnboundLocalError("Must provide environment variable: END_USER_DEVICE_DEFAULTS_FILE")
-    if networking_file_path is None:
-        raise UnboundLocalError("Must provide environment variable: NETWORKING_DEFAULTS_FILE")
-    if transmission_rates_file_path is None:
-        raise UnboundLocalError("Must provide environment variable: TRANSMISSION_RATE_FILE")
-    if docs_defaults_file_path is None:
-        raise UnboundLocalError("Must provide environment variable: DOCS_DEFAULTS_FILE")
-
-    load_default_files(
-        atp_defaults_file_path,
-        organization_defaults_file_path,
-        property_defaults_file_path,
-        end_user_device_file_path,
-        networking_file_path,
-        transmission_rates_file_path,
-        docs_defaults_file_path,
-    )
+
+    Public yaml files are scanned lazily on first use, see get_public_yaml_file_info
+
+    If DEFAULTS_POLL_INTERVAL_S is set, the defaults files are checked for changes at
+    that interval and reloaded in the background.
+    """
+    defaults_reloader.load(DefaultsFiles.from_environment())
+    poll_interval_s = float(os.environ.get("DEFAULTS_POLL_INTERVAL_S", 0))
+    if poll_interval_s > 0:
+        defaults_reloader.start_polling(poll_interval_s)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop polling the defaults files"""
+    defaults_reloader.stop_polling()
+
+
+@app.post("/admin/reload_defaults")
+def reload_defaults(request: Request, force: bool = False):
+    """
+    Reload the defaults files if any of them changed, or always if forced.
+    The X-Admin-Token header must match ADMIN_TOKEN, reloading is disabled without it.
+    """
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Reloading defaults is disabled")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    try:
+        reloaded = defaults_reloader.reload(force)
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500, detail="Failed to reload defaults, keeping the current defaults"
+        ) from exc
+    return {"reloaded": reloaded, "version": get_defaults().version}
 
 
 @app.get("/healthz")
@@ -163,10 +184,9 @@ def healthz():
     return "200 OK"
 
 
-@app.post("/calculate/corporate")
-def calculate_corporate_emissions(data: CorporateInput):
-    """Returns computed corporate emissions for an organization in g co2e"""
-    unmodeled = CorporateEmissions(
+def corporate_from_input(data: CorporateInput) -> CorporateEmissions:
+    """Return the corporate emissions model of a request"""
+    return CorporateEmissions(
         office_emissions_mt_co2e_per_employee_per_month=data.office_emissions_mt_co2e_per_employee_per_month,
         datacenter_emissions_mt_co2e_per_employee_per_month=data.datacenter_emissions_mt_co2e_per_employee_per_month,
         travel_emissions_mt_co2e_per_employee_per_month=data.travel_emissions_mt_co2e_per_employee_per_month,
@@ -177,12 +197,39 @@ def calculate_corporate_emissions(data: CorporateInput):
         number_of_employees=data.number_of_employees,
     )
 
-    return unmodeled.comp_emissions_g_co2e_per_month(organization_defaults[data.org_type], 1)
 
+@app.post("/calculate/corporate")
+def calculate_corporate_emissions(data: CorporateInput, explain: bool = False):
+    """
+    Returns computed corporate emissions for an organization in g co2e
+    With explain=true, also returns how the emissions were derived
+    """
+    unmodeled = corporate_from_input(data)
+    return calculate(
+        explain,
+        unmodeled.comp_emissions_g_co2e_per_month,
+        defaults=get_defaults().organization[data.org_type],
+        depth=1,
+    )
+
+
+@app.post("/calculate/corporate/sensitivity")
+def calculate_corporate_emissions_sensitivity(data: CorporateInput):
+    """
+    Returns computed corporate emissions for an organization in g co2e, with the partial
+    derivatives of each result with respect to every input eligible for default
+    """
+    unmodeled = corporate_from_input(data)
+    return sensitivity_response(
+        unmodeled,
+        unmodeled.comp_emissions_g_co2e_per_month,
+        defaults=get_defaults().organization[data.org_type],
+        depth=1,
+    )
 
-@app.post("/calculate/atp_primary_emissions")
-def calculate_atp_emissions(data: ATPInput):
-    """Returns computed primary emissions for an ad tech platform in g co2e"""
+
+def atp_from_input(data: ATPInput) -> AdTechPlatform:
+    """Return the ad tech platform model of a request"""
     company_servers_pct = (
         data.allocation_of_company_servers_pct
         if data.allocation_of_company_servers_pct
@@ -193,7 +240,7 @@ def calculate_atp_emissions(data: ATPInput):
         if data.allocation_of_corporate_emissions_pct
         else Decimal("100.0")
     )
-    unmodeled = AdTechPlatform(
+    return AdTechPlatform(
         allocation_of_company_servers_pct=company_servers_pct,
         allocation_of_corporate_emissions_pct=corporate_emissions_pct,
         corporate_emissions_g_co2e_per_bid_request=data.corporate_emissions_g_co2e_per_bid_request,
@@ -213,22 +260,91 @@ def calculate_atp_emissions(data: ATPInput):
         data_transfer_emissions_mt_co2e_per_month=data.data_transfer_emissions_mt_co2e_per_month,
     )
 
-    return unmodeled.model_product(
+
+@app.post("/calculate/atp_primary_emissions")
+def calculate_atp_emissions(data: ATPInput, explain: bool = False):
+    """
+    Returns computed primary emissions for an ad tech platform in g co2e
+    With explain=true, also returns how the emissions were derived
+    """
+    unmodeled = atp_from_input(data)
+    defaults = get_defaults()
+    return calculate(
+        explain,
+        unmodeled.model_product,
         name=data.name,
         identifier=data.identifier,
-        defaults=adtech_platform_defaults[data.atp_template],
+        defaults=defaults.adtech_platform[data.atp_template],
         distribution_partners=[],
         corporate_emissions_g=data.corporate_emissions_g_co2e,
+        evaluate=defaults.adtech_platform_evaluator[data.atp_template],
     )
 
 
+@app.post("/calculate/atp_primary_emissions/sensitivity")
+def calculate_atp_emissions_sensitivity(data: ATPInput):
+    """
+    Returns computed primary emissions for an ad tech platform in g co2e, with the partial
+    derivatives of each result with respect to every input eligible for default
+    """
+    unmodeled = atp_from_input(data)
+    return sensitivity_response(
+        unmodeled,
+        unmodeled.model_product,
+        name=data.name,
+        identifier=data.identifier,
+        defaults=get_defaults().adtech_platform[data.atp_template],
+        distribution_partners=[],
+        corporate_emissions_g=data.corporate_emissions_g_co2e,
+    )
+
+
+@app.post("/calculate/atp_primary_emissions/batch")
+def calculate_atp_emissions_batch(data: list[ATPInput]):
+    """
+    Returns computed primary emissions for many ad tech platforms in g co2e, in the order of
+    the request, modeling the platforms of each template at once in float64 with the batch
+    engine. Results are null for platforms that cannot be modeled.
+    """
+    input_fields = get_field_metadata(AdTechPlatform).input_fields
+    # Key: template
+    # Value: the index of each platform of the template and its columns
+    templates: dict[ATPTemplate, tuple[list[int], dict[str, list[Any]]]] = {}
+    for index, atp_input in enumerate(data):
+        indexes, columns = templates.setdefault(
+            atp_input.atp_template,
+            ([], {name: [] for name in (*input_fields, *PRODUCT_COLUMNS)}),
+        )
+        unmodeled = atp_from_input(atp_input)
+        for name in input_fields:
+            columns[name].append(getattr(unmodeled, name))
+        columns["name"].append(atp_input.name)
+        columns["identifier"].append(atp_input.identifier)
+        columns["corporate_emissions_g"].append(atp_input.corporate_emissions_g_co2e)
+        columns["corporate_emissions_g_per_bid_request"].append(None)
+        indexes.append(index)
+
+    results: list[Any] = [None] * len(data)
+    for template, (indexes, columns) in templates.items():
+        modeled = model_products(get_defaults().adtech_platform[template], columns)
+        for index, result in zip(indexes, modeled):
+            results[index] = result
+    return results
+
+
 @app.post("/calculate/atp_secondary_bid_request_emissions")
-def calculate_atp_secondary_bid_request_emissions(data: ATPSecondaryEmissionsInput):
+def calculate_atp_secondary_bid_request_emissions(
+    data: ATPSecondaryEmissionsInput, explain: bool = False
+):
     """
     Returns computed secondary emissions for an ad tech platforms distribution partners in g co2e
+    With explain=true, also returns how the emissions were derived
     """
-    return AdTechPlatform().comp_secondary_emissions_g_co2e_per_bid_request(
-        distribution_partners=data.partners, depth=1
+    return calculate(
+        explain,
+        AdTechPlatform().comp_secondary_emissions_g_co2e_per_bid_request,
+        distribution_partners=data.partners,
+        depth=1,
     )
 
 
@@ -241,7 +357,7 @@ def get_all_atp_template_defaults():
         - publisher_block_rate
     """
     response = []
-    for template, defaults in adtech_platform_defaults.items():
+    for template, defaults in get_defaults().adtech_platform.items():
         corporate_emissions = defaults.corporate_emissions_g_co2e_per_bid_request
         response.append(
             ATPDefaultsResponse(
@@ -263,7 +379,7 @@ def get_atp_template_defaults(template: ATPTemplate):
         - atp_block_rate
         - publisher_block_rate
     """
-    defaults = adtech_platform_defaults[template]
+    defaults = get_defaults().adtech_platform[template]
     corporate_emissions = defaults.corporate_emissions_g_co2e_per_bid_request
     return ATPDefaultsResponse(
         template=template.value,
@@ -279,7 +395,7 @@ def get_all_property_template_defaults():
     Returns corporate_emissions_g_co2e_per_impression default for all property channels
     """
     response = []
-    for channel, defaults in property_defaults.items():
+    for channel, defaults in get_defaults().property.items():
         corporate_emissions = defaults.corporate_emissions_g_co2e_per_impression
         imps_per_second = defaults.quality_impressions_per_duration_s
         response.append(
@@ -301,7 +417,7 @@ def get_property_template_defaults(channel: PropertyChannel):
         - right now there is only a single generic template for each channel
         - corporate_emissions_g_co2e_per_impressions
     """
-    defaults = property_defaults[channel]
+    defaults = get_defaults().property[channel]
     corporate_emissions = defaults.corporate_emissions_g_co2e_per_impression
     imps_per_second = defaults.quality_impressions_per_duration_s
     return PropertyDefaultsResponse(
@@ -318,59 +434,75 @@ def get_public_yaml_files(file_type: str):
     Returns a list of all <file_type> yaml files
     """
     files = []
-    for file_info in public_yaml_files.values():
+    for file_info in get_public_yaml_file_info().values():
         if file_info.file_type == file_type:
             files.append(file_info)
     return files
 
 
+def render_corporate_file(file_info: PublicYamlInformation, content: bytes) -> bytes:
+    """Parse a corporate yaml file and render the json response body"""
+    document = yaml_load(content.decode("UTF-8"))
+    if "name" not in document:
+        raise LookupError("No 'name' field found in company file")
+    facts = get_facts(document["facts"]) if "facts" in document else {}
+    return bytes(JSONResponse(jsonable_encoder({"file_info": file_info, "facts": facts})).body)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Return whether an If-None-Match header matches an ETag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
 @app.get("/public_yaml_files/parse/corporate/{identifier}")
-def parse_corporate_public_yaml_file(identifier: str):
+def parse_corporate_public_yaml_file(identifier: str, request: Request):
     """
     Returns a parsed corporate yaml file factual information
+
+    Responses are cached per file until the file changes and carry an ETag,
+    a matching If-None-Match header returns 304 Not Modified
     """
     try:
-        file_info = public_yaml_files[f"{identifier}corporate"]
+        file_info = get_public_yaml_file_info()[f"{identifier}corporate"]
     except Exception as exc:
         raise HTTPException(
             status_code=500, detail=f"Unable to locate corporate file with '{identifier}'"
         ) from exc
 
     try:
-        with open(file_info.file_path, "r", encoding="UTF-8") as stream:
-            document = yaml_load(stream)
-            if "name" not in document:
-                raise LookupError("No 'name' field found in company file")
-            facts = get_facts(document["facts"]) if "facts" in document else {}
-            return {
-                "file_info": file_info,
-                "facts": facts,
-            }
+        cached = corporate_file_cache.get(
+            file_info.file_path, lambda content: render_corporate_file(file_info, content)
+        )
     except Exception as exc:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to open and parse corporate file '{file_info.file_path}'",
         ) from exc
 
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers={"ETag": cached.etag})
+    return Response(
+        content=cached.value, media_type="application/json", headers={"ETag": cached.etag}
+    )
+
+
+@app.get("/public_yaml_files/cache")
+def get_public_yaml_file_cache_stats():
+    """
+    Returns the hit, miss and eviction counters of the parsed corporate file cache
+    """
+    return corporate_file_cache.stats()
+
 
 @app.get("/defaults/end_user_device")
 def get_all_end_user_device_defaults():
     """
     Returns all end user device defaults
     """
-    response = []
-    for device, device_defaults in end_user_device_defaults.items():
-        for channel, channel_defaults in property_defaults.items():
-            if channel_defaults.quality_impressions_per_duration_s:
-                modeled_end_user_device = device_defaults.model_end_user_device(
-                    device.value,
-                    channel.value,
-                    "generic",
-                    channel_defaults.quality_impressions_per_duration_s,
-                )
-                if modeled_end_user_device is not None:
-                    response.append(modeled_end_user_device)
-    return response
+    return list(get_defaults().end_user_device_matrix.records("generic"))
 
 
 @app.get("/defaults/networking")
@@ -378,16 +510,17 @@ def get_all_networking_connection_device_defaults():
     """
     Returns all networking connection device defaults
     """
+    api_defaults = get_defaults()
     response = []
-    for connection_type, defaults in networking_connection_defaults.items():
+    for connection_type, defaults in api_defaults.networking_connection.items():
         for device in EndUserDevices:
             modeled_device_networking = defaults.model_device_conventional_model(
                 device.value, connection_type
             )
             response.append(modeled_device_networking)
 
-        for channel in power_model_channels:
-            channel_rate_defaults = transmission_rate_defaults[channel]
+        for channel in POWER_MODEL_CHANNELS:
+            channel_rate_defaults = api_defaults.transmission_rate[channel]
             if defaults.transmission_rate_quality_per_channel_per_device:
                 channel_resolution_defaults = (
                     defaults.transmission_rate_quality_per_channel_per_device[channel.value]
@@ -410,7 +543,7 @@ def get_all_docs_defaults():
     Returns all docs defaults
     """
 
-    return docs_defaults
+    return get_defaults().docs
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+""" Immutable snapshot of the defaults served by the API and its hot reloading """
+import logging
+import os
+import threading
+from dataclasses import dataclass, fields
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Optional
+
+from scope3_methodology.ad_tech_platform.formulas import AD_TECH_PLATFORM_FORMULAS
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform, specialise_product
+from scope3_methodology.api.input_models import (
+    ATPInput,
+    ATPTemplate,
+    EndUserDevices,
+    NetworkingConnectionType,
+    OrganizationType,
+    PropertyChannel,
+    StreamingResolution,
+)
+from scope3_methodology.corporate.model import CorporateEmissions
+from scope3_methodology.end_user_device.batch import (
+    EndUserDeviceMatrix,
+    model_end_user_devices,
+)
+from scope3_methodology.end_user_device.model import EndUserDevice
+from scope3_methodology.networking.model import NetworkingConnection
+from scope3_methodology.networking.transmission_rate_model import TransmissionRate
+from scope3_methodology.publisher.model import Property
+from scope3_methodology.utils.defaults_registry import defaults_registry
+
+POWER_MODEL_CHANNELS = (
+    PropertyChannel.STREAMING_VIDEO,
+    PropertyChannel.DIGITAL_AUDIO,
+    PropertyChannel.CTV_BVOD,
+)
+
+# The inputs of the ad tech platform formulas a request cannot set, always resolved from the
+# template defaults
+ATP_TEMPLATE_INPUTS = tuple(
+    name for name in AD_TECH_PLATFORM_FORMULAS.input_names() if name not in ATPInput.model_fields
+)
+
+
+@dataclass(frozen=True)
+class DefaultsFiles:
+    """Paths of the defaults files served by the API"""
+
+    adtech_platform: str
+    organization: str
+    property: str
+    end_user_device: str
+    networking: str
+    transmission_rate: str
+    docs: str
+
+    @classmethod
+    def from_environment(cls) -> "DefaultsFiles":
+        """Read the defaults file paths from their environment variables"""
+        paths = {}
+        for field, variable in [
+            ("adtech_platform", "ATP_DEFAULTS_FILE"),
+            ("organization", "ORGANIZATION_DEFAULTS_FILE"),
+            ("property", "PROPERTY_DEFAULTS_FILE"),
+            ("end_user_device", "END_USER_DEVICE_DEFAULTS_FILE"),
+            ("networking", "NETWORKING_DEFAULTS_FILE"),
+            ("transmission_rate", "TRANSMISSION_RATE_FILE"),
+            ("docs", "DOCS_DEFAULTS_FILE"),
+        ]:
+            path = os.environ.get(variable)
+            if path is None:
+                raise UnboundLocalError(f"Must provide environment variable: {variable}")
+            paths[field] = path
+        return cls(**paths)
+
+    def signature(self) -> tuple[tuple[int, int], ...]:
+        """Return the modification time and size of every file, used to detect changes"""
+        signature = []
+        for field in fields(self):
+            stat = os.stat(getattr(self, field.name))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+
+@dataclass(frozen=True)
+class ApiDefaults:
+    """
+    A complete, read only set of defaults. A snapshot is never modified once built,
+    reloading builds a new one, so a request holding a snapshot has a consistent view.
+    """
+
+    version: int
+    files: DefaultsFiles
+    organization: Mapping[OrganizationType, CorporateEmissions]
+    adtech_platform: Mapping[ATPTemplate, AdTechPlatform]
+    property: Mapping[PropertyChannel, Property]
+    end_user_device: Mapping[EndUserDevices, EndUserDevice]
+    networking_connection: Mapping[NetworkingConnectionType, NetworkingConnection]
+    transmission_rate: Mapping[PropertyChannel, Mapping[StreamingResolution, TransmissionRate]]
+    docs: Mapping[str, Any]
+    # every end user device modeled for every property channel, see model_end_user_devices
+    end_user_device_matrix: EndUserDeviceMatrix
+    # the primary results of model_product specialised to each template, see specialise_product
+    adtech_platform_evaluator: Mapping[ATPTemplate, Callable[..., tuple]]
+
+
+def build_api_defaults(files: DefaultsFiles, version: int = 1) -> ApiDefaults:
+    """Load all default files into a new snapshot, parsing each file once"""
+    transmission_rate: dict[PropertyChannel, Mapping[StreamingResolution, TransmissionRate]] = {}
+    for channel in POWER_MODEL_CHANNELS:
+        resolution_defaults: dict[StreamingResolution, TransmissionRate] = {}
+        for resolution in StreamingResolution:
+            if channel == PropertyChannel.DIGITAL_AUDIO and resolution == StreamingResolution.ULTRA:
+                continue
+
+            resolution_defaults[resolution] = defaults_registry.get_model(
+                TransmissionRate, resolution.value, files.transmission_rate, channel.value
+            )
+        transmission_rate[channel] = MappingProxyType(resolution_defaults)
+
+    property_defaults = {
+        channel: defaults_registry.get_model(Property, "generic", files.property, channel.value)
+        for channel in PropertyChannel
+    }
+    end_user_device = {
+        device: defaults_registry.get_model(EndUserDevice, device.value, files.end_user_device)
+        for device in EndUserDevices
+    }
+    adtech_platform = {
+        atp_template: defaults_registry.get_model(
+            AdTechPlatform, atp_template.value, files.adtech_platform
+        )
+        for atp_template in ATPTemplate
+    }
+
+    return ApiDefaults(
+        version=version,
+        files=files,
+        organization=MappingProxyType(
+            {
+                org_type: defaults_registry.get_model(
+                    CorporateEmissions, org_type.value, files.organization
+                )
+                for org_type in OrganizationType
+            }
+        ),
+        adtech_platform=MappingProxyType(adtech_platform),
+        property=MappingProxyType(property_defaults),
+        end_user_device=MappingProxyType(end_user_device),
+        networking_connection=MappingProxyType(
+            {
+                connection_type: defaults_registry.get_model(
+                    NetworkingConnection, connection_type.value, files.networking
+                )
+                for connection_type in NetworkingConnectionType
+            }
+        ),
+        transmission_rate=MappingProxyType(transmission_rate),
+        docs=MappingProxyType(dict(defaults_registry.get_document(files.docs)["defaults"])),
+        end_user_device_matrix=model_end_user_devices(
+            {device.value: defaults for device, defaults in end_user_device.items()},
+            {
+                channel.value: defaults.quality_impressions_per_duration_s
+                for channel, defaults in property_defaults.items()
+            },
+        ),
+        adtech_platform_evaluator=MappingProxyType(
+            {
+                atp_template: specialise_product(defaults, ATP_TEMPLATE_INPUTS)
+                for atp_template, defaults in adtech_platform.items()
+            }
+        ),
+    )
+
+
+class DefaultsReloader:
+    """
+    Holds the current defaults snapshot and replaces it when the defaults files change.
+
+    A new snapshot is built completely before it is swapped in with a single reference
+    assignment, so readers never block and never see a partially loaded set of defaults.
+    Reloads are serialised, and a reload that fails keeps the current snapshot.
+    """
+
+    def __init__(self) -> None:
+        self._current: Optional[ApiDefaults] = None
+        self._signature: Optional[tuple[tuple[int, int], ...]] = None
+        self._reload_lock = threading.Lock()
+        self._stop_polling = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    def get(self) -> ApiDefaults:
+        """Return the current defaults snapshot"""
+        current = self._current
+        if current is None:
+            raise Exception("Defaults have not been loaded")
+        return current
+
+    def load(self, files: DefaultsFiles) -> ApiDefaults:
+        """Build a new snapshot from files and swap it in"""
+        with self._reload_lock:
+            signature = files.signature()
+            version = self._current.version + 1 if self._current else 1
+            snapshot = build_api_defaults(files, version)
+            self._signature = signature
+            self._current = snapshot
+            return snapshot
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Reload the current defaults files if any of them changed, or always if forced.
+        :return: whether a new snapshot was swapped in
+        """
+        files = self.get().files
+        if not force and files.signature() == self._signature:
+            return False
+        self.load(files)
+        return True
+
+    def start_polling(self, interval_s: float) -> None:
+        """Check the defaults files for changes every interval_s seconds in a daemon thread"""
+        if self._poller is not None:
+            return
+        self._stop_polling.clear()
+        self._poller = threading.Thread(
+            target=self._poll, args=(interval_s,), name="defaults-reloader", daemon=True
+        )
+        self._poller.start()
+
+    def stop_polling(self) -> None:
+        """Stop the polling thread"""
+        if self._poller is None:
+            return
+        self._stop_polling.set()
+        self._poller.join()
+        self._poller = None
+
+    def _poll(self, interval_s: float) -> None:
+        while not self._stop_polling.wait(interval_s):
+            try:
+                if self.reload():
+                    logging.info("Reloaded defaults, version %d", self.get().version)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Failed to reload defaults, keeping the current defaults")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+""" Microbenchmark of the ad tech platform and property models """
+import argparse
+import logging
+import timeit
+from decimal import Decimal
+from typing import Callable
+
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.publisher.model import Property
+from scope3_methodology.utils.numeric import NUMERIC_BACKENDS, numeric_backend
+
+
+def parse_args():
+    """Parse the command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Measure the throughput of model_product and model_property"
+    )
+    parser.add_argument(
+        "--atpDefaultsFile",
+        default="defaults/atp-defaults.yaml",
+        help="Set the ad tech platform defaults file to use",
+    )
+    parser.add_argument(
+        "--propertyDefaultsFile",
+        default="defaults/property-defaults.yaml",
+        help="Set the property defaults file to use",
+    )
+    parser.add_argument("--atpTemplate", default="dsp", help="Ad tech platform template")
+    parser.add_argument("--channel", default="display-web", help="Property channel")
+    parser.add_argument(
+        "-n", "--number", default=2000, type=int, help="Number of calls per measurement"
+    )
+    parser.add_argument("-r", "--repeat", default=5, type=int, help="Number of measurements")
+    parser.add_argument(
+        "--backend",
+        default="decimal",
+        choices=list(NUMERIC_BACKENDS),
+        help="Numeric backend the models compute in",
+    )
+    parser.add_argument(
+        "--derivationLogging",
+        action="store_true",
+        help="Enable the derivation logging (discarded) to measure its cost",
+    )
+    return parser.parse_args()
+
+
+def measure(name: str, function: Callable[[], object], number: int, repeat: int) -> None:
+    """Print the best throughput of function over repeat measurements of number calls"""
+    best_s = min(timeit.repeat(function, number=number, repeat=repeat)) / number
+    print(f"{name}: {1 / best_s:,.0f} calls/s ({best_s * 1e6:.1f} us per call)")
+
+
+def main():
+    """Benchmark the models with the derivation logging disabled, or discarded"""
+    args = parse_args()
+    if args.derivationLogging:
+        logging.root.addHandler(logging.NullHandler())
+        logging.root.setLevel(logging.INFO)
+
+    atp_defaults = AdTechPlatform.load_default_yaml(args.atpTemplate, args.atpDefaultsFile)
+    property_defaults = Property.load_default_yaml(
+        "generic", args.propertyDefaultsFile, args.channel
+    )
+
+    def model_product():
+        AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("10")).model_product(
+            name="benchmark",
+            identifier="benchmark",
+            defaults=atp_defaults,
+            distribution_partners=[],
+            corporate_emissions_g=None,
+        )
+
+    def model_property():
+        Property(
+            visits_per_month=Decimal("1000"),
+            average_visit_duration_s=Decimal("60"),
+            pages_per_visit=Decimal("3"),
+            load_time_s=Decimal("2"),
+            page_size_mb=Decimal("3"),
+        ).model_property("benchmark", property_defaults, 1)
+
+    with numeric_backend(args.backend):
+        measure("model_product", model_product, args.number, args.repeat)
+        measure("model_property", model_property, args.number, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
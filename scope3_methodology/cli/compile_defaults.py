@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+""" Compile all defaults files into a binary snapshot for fast loading """
+import argparse
+
+from scope3_methodology.utils.defaults_snapshot import compile_snapshot
+
+
+def main():
+    """Compile the defaults directory into a snapshot keyed by the yaml content hash"""
+    parser = argparse.ArgumentParser(description="Compile defaults into a binary snapshot")
+    parser.add_argument(
+        "-d",
+        "--defaults_directory",
+        default="defaults",
+        help="Set the defaults file directory to compile",
+    )
+    args = parser.parse_args()
+
+    print(f"Wrote {compile_snapshot(args.defaults_directory)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 #!/usr/bin/env python
 """ Compute defaults for all templates types """
 import argparse
+import os
 from dataclasses import dataclass
 from decimal import Decimal
 from glob import glob
-from typing import Optional
+from typing import Collection, Iterable, Mapping, Optional
 
 from scope3_methodology.ad_tech_platform.model import AdTechPlatform
 from scope3_methodology.corporate.model import CorporateEmissions
@@ -12,7 +13,9 @@ from scope3_methodology.end_user_device.model import EndUserDevice
 from scope3_methodology.networking.model import NetworkingConnection
 from scope3_methodology.networking.transmission_rate_model import TransmissionRate
 from scope3_methodology.publisher.model import Property
-from scope3_methodology.utils.utils import Fact, get_all_facts
+from scope3_methodology.utils.fact_index import DEFAULT_FACT_INDEX_FILE
+from scope3_methodology.utils.fact_store import FactStore, FactView, get_fact_store
+from scope3_methodology.utils.utils import Fact
 from scope3_methodology.utils.yaml_helpers import yaml_dump, yaml_load
 
 
@@ -21,57 +24,85 @@ class FactAverages:
     """Fact averages returned by build_fact_averages"""
 
     all_average_defaults: dict[str, Decimal]
-    all_average_defaults_source_list: dict[str, list[Fact]]
+    all_average_defaults_source_list: dict[str, list[Fact | FactView]]
     template_average_defaults: dict[str, Decimal]
-    template_average_defaults_source_list: dict[str, list[Fact]]
+    template_average_defaults_source_list: dict[str, list[Fact | FactView]]
+
+
+def iter_model_facts(
+    facts: FactStore | Mapping[str, list[Fact]] | Iterable[Fact],
+    model_inputs: Collection[str],
+) -> Iterable[Fact | FactView]:
+    """
+    Stream the facts of a FactStore, the dictionary from get_all_facts or a stream of facts.
+    A FactStore only creates fact views for the facts of the model inputs.
+    """
+    if isinstance(facts, FactStore):
+        store = facts
+        return (
+            FactView(store, row)
+            for rows in store.group_by_key(model_inputs).values()
+            for row in rows
+        )
+    if isinstance(facts, Mapping):
+        return (fact for key_facts in facts.values() for fact in key_facts)
+    return facts
 
 
 def build_fact_averages(
     template: str,
     channel: Optional[str],
-    facts: dict[str, list[Fact]],
-    model_inputs: set[str],
+    facts: FactStore | Mapping[str, list[Fact]] | Iterable[Fact],
+    model_inputs: Collection[str],
 ):
     """
     Build a view of average across all templates within the model
     (i.e. model: atp templates: ssp, dsp, network) AND build a view specific to the template
     we are looking at (i.e. average of only DSP facts) If a channel is provided, the an average
     of the channel-template view is built (i.e. average of only display channel facts)
+    Facts can be a FactStore, the dictionary from get_all_facts or a stream of facts,
+    e.g. from iter_facts, and are summed in a single pass.
     :return: FactAverages
     """
     all_average_defaults: dict[str, Decimal] = {}
-    all_average_defaults_source_list: dict[str, list[Fact]] = {}
+    all_average_defaults_source_list: dict[str, list[Fact | FactView]] = {}
     template_average_defaults: dict[str, Decimal] = {}
-    template_average_defaults_source_list: dict[str, list[Fact]] = {}
-
+    template_average_defaults_source_list: dict[str, list[Fact | FactView]] = {}
+
+    fact_counts: dict[str, int] = {}
+    all_fact_sums: dict[str, Decimal] = {}
+    template_specific_sums: dict[str, Decimal] = {}
+    template_specific_source_lists: dict[str, list[Fact | FactView]] = {}
+    # These keys are not f-strings, so channel facts never match a template. This is the
+    # methodology the published defaults were computed with and is deliberately kept.
     template_key = "{channel}-{template}" if channel else template
-    for key in facts:
-        all_fact_source_list: list[Fact] = []
-        template_specific_source_list: list[Fact] = []
-        if key in model_inputs:
-            all_fact_sum = Decimal(0)
-            template_specific_sum = Decimal(0)
-            template_fact_count = 0
-            for fact in facts[key]:
-                # If the fact is only for a specific channel do not include in all defaults
-                if fact.channel is not None:
-                    if fact.channel != channel:
-                        continue
-                all_fact_source_list.append(fact)
-                fact_key = "{fact.channel}-{fact.template}" if fact.channel else fact.template
-                if fact_key == template_key:
-                    template_specific_source_list.append(fact)
-                    template_specific_sum += fact.value
-                    template_fact_count += 1
-                all_fact_sum += fact.value
-
-            all_average_defaults[key] = all_fact_sum / Decimal(len(facts[key]))
-            all_average_defaults_source_list[key] = all_fact_source_list
-            if template_fact_count > 0:
-                template_average_defaults[key] = template_specific_sum / Decimal(
-                    template_fact_count
-                )
-                template_average_defaults_source_list[key] = template_specific_source_list
+    for fact in iter_model_facts(facts, model_inputs):
+        key = fact.key
+        if key not in model_inputs:
+            continue
+        if key not in fact_counts:
+            fact_counts[key] = 0
+            all_fact_sums[key] = Decimal(0)
+            all_average_defaults_source_list[key] = []
+        fact_counts[key] += 1
+        # If the fact is only for a specific channel do not include in all defaults
+        if fact.channel is not None and fact.channel != channel:
+            continue
+        all_average_defaults_source_list[key].append(fact)
+        fact_key = "{fact.channel}-{fact.template}" if fact.channel else fact.template
+        if fact_key == template_key:
+            template_specific_sums[key] = template_specific_sums.get(key, Decimal(0)) + fact.value
+            template_specific_source_lists.setdefault(key, []).append(fact)
+        all_fact_sums[key] += fact.value
+
+    # Keys are ordered by their first fact, whether facts arrive grouped by key or streamed
+    for key, fact_count in fact_counts.items():
+        all_average_defaults[key] = all_fact_sums[key] / Decimal(fact_count)
+        if key in template_specific_sums:
+            template_average_defaults[key] = template_specific_sums[key] / Decimal(
+                len(template_specific_source_lists[key])
+            )
+            template_average_defaults_source_list[key] = template_specific_source_lists[key]
 
     return FactAverages(
         all_average_defaults=all_average_defaults,
@@ -92,7 +123,7 @@ class BuiltDefaults:
 def build_defaults_and_source_list(
     channel_name: str | None,
     template_name: str,
-    facts: dict[str, list[Fact]],
+    facts: FactStore | dict[str, list[Fact]],
     model_inputs: set[str],
     template_info: dict[str, Decimal],
 ):
@@ -137,7 +168,7 @@ def build_defaults_and_source_list(
 def compute_defaults(
     model: str,
     templates: dict[str, dict[str, Decimal]],
-    facts: dict[str, list[Fact]],
+    facts: FactStore | dict[str, list[Fact]],
     model_defaults_file: str,
     model_inputs: set[str],
     dry_run: bool,
@@ -195,6 +226,23 @@ def main():
         default="defaults",
         help="Set the defaults file directory to use",
     )
+    parser.add_argument(
+        "--fact-index",
+        default=DEFAULT_FACT_INDEX_FILE,
+        help="Set the fact index file used to skip parsing unchanged data files",
+    )
+    parser.add_argument(
+        "--no-fact-index",
+        action="store_true",
+        help="Parse every data file without reading or writing the fact index",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        default=os.cpu_count() or 1,
+        type=int,
+        help="Number of processes used to parse data files (small trees are parsed serially)",
+    )
     args = parser.parse_args()
 
     model_keys = {}
@@ -210,9 +258,10 @@ def main():
     snippet_files = glob("docs/snippets/defaults_*.mdx")
     snippet_lines = ""
     for file in snippet_files:
-      with open(file, "r", encoding="UTF-8") as stream:
-        for line in stream:
-          if '```' not in line: snippet_lines += line
+        with open(file, "r", encoding="UTF-8") as stream:
+            for line in stream:
+                if "```" not in line:
+                    snippet_lines += line
     docs_defaults = yaml_load(snippet_lines)
     output = "# AUTO_GENERATED from docs/snippets\n"
     output += yaml_dump({"defaults": docs_defaults})
@@ -225,7 +274,7 @@ def main():
             write_stream.close()
 
     # get a list of all facts from our sources
-    facts = get_all_facts()
+    facts = get_fact_store(None if args.no_fact_index else args.fact_index, args.workers)
 
     templates = {}
     template_files = glob("templates/*/*.yaml")
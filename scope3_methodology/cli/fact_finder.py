@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 """ Fact finder extracts all facts from data yaml files"""
 import argparse
+import os
 
-from scope3_methodology.utils.utils import get_all_facts
+from scope3_methodology.utils.fact_index import DEFAULT_FACT_INDEX_FILE
+from scope3_methodology.utils.utils import get_all_facts, iter_facts
 
 
 def main():
@@ -13,14 +15,45 @@ def main():
     """
     parser = argparse.ArgumentParser(description="Find sources for a fact")
     parser.add_argument("fact", nargs="?", type=str, const=1, help="the fact to find")
+    parser.add_argument(
+        "--fact-index",
+        help=f"""
+            Set the fact index file used to skip parsing unchanged data files
+            (default: {DEFAULT_FACT_INDEX_FILE})
+            """,
+    )
+    parser.add_argument(
+        "--no-fact-index",
+        action="store_true",
+        help="Parse every data file without reading or writing the fact index",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="""
+            Number of processes used to parse data files, by default the number of CPUs
+            (small trees are parsed serially)
+            """,
+    )
     args = parser.parse_args()
 
-    facts = get_all_facts()
+    if args.fact:
+        if args.fact_index or args.no_fact_index or args.workers is not None:
+            parser.error(
+                "--fact-index, --no-fact-index and --workers only apply when finding all facts"
+            )
+        # Stream a single key so only the files that can contain it are parsed
+        key_facts = list(iter_facts(keys={args.fact}))
+        if key_facts:
+            print(f"{args.fact}: {key_facts}")
+        return
 
+    facts = get_all_facts(
+        None if args.no_fact_index else args.fact_index or DEFAULT_FACT_INDEX_FILE,
+        (os.cpu_count() or 1) if args.workers is None else args.workers,
+    )
     for fact in facts:
-        if args.fact:
-            if fact != args.fact:
-                continue
         print(f"{fact}: {facts[fact]}")
 
 
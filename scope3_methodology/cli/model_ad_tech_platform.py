@@ -2,16 +2,25 @@
 """ Compute emissions model for an ad tech company """
 import argparse
 import logging
+import sys
 from decimal import Decimal
+from typing import Any
 
+from scope3_methodology.ad_tech_platform.batch import model_products
 from scope3_methodology.ad_tech_platform.helpers import get_product_info
 from scope3_methodology.ad_tech_platform.model import (
     AdTechPlatform,
     DistributionPartner,
     ModeledAdTechPlatform,
 )
+from scope3_methodology.utils.derivation import start_derivation_trace
+from scope3_methodology.utils.modeled_records import OUTPUT_FORMATS, ModeledRecords
+from scope3_methodology.utils.sensitivity import (
+    compute_sensitivity,
+    write_sensitivity_json,
+)
 from scope3_methodology.utils.utils import get_facts
-from scope3_methodology.utils.yaml_helpers import yaml_dump, yaml_load
+from scope3_methodology.utils.yaml_helpers import yaml_load
 
 
 def parse_args():
@@ -25,6 +34,30 @@ def parse_args():
         help="Set the defaults file to use (overrides atp-defaults.yaml)",
     )
     parser.add_argument("-v", "--verbose", action="store_true", help="Show derivation of output")
+    parser.add_argument(
+        "--explain-json",
+        metavar="FILE",
+        help="Write how the output was derived, as a tree of steps, to FILE in JSON",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="""
+            Model all products at once with the NumPy batch engine, in float64 and without
+            derivation, distribution partners or sensitivity
+            """,
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default=OUTPUT_FORMATS[0],
+        help="Write the modeled results to stdout in this format",
+    )
+    parser.add_argument(
+        "--sensitivity-json",
+        metavar="FILE",
+        help="Write the partial derivatives of the output with respect to each input to FILE",
+    )
     parser.add_argument(
         "-p",
         "--partners",
@@ -55,21 +88,17 @@ def parse_args():
             """,
     )
     parser.add_argument("companyFile", nargs=1, help="The company file to parse in YAML format")
-    return parser.parse_args()
 
+    args = parser.parse_args()
+    if args.batch and (args.verbose or args.explain_json or args.sensitivity_json or args.partners):
+        parser.error(
+            "-v, --explain-json, --sensitivity-json and --partners are not available with --batch"
+        )
+    return args
 
-def process_product(
-    product: dict[str, str],
-    defaults_file: str,
-    depth: int,
-    distribution_partners: list[DistributionPartner],
-    corporate_emissions_g: Decimal | None = None,
-    corporate_emissions_g_per_bid_request: Decimal | None = None,
-) -> ModeledAdTechPlatform:
-    """
-    Model the product (atp)
-    :return: ModeledAdTechPlatform
-    """
+
+def product_inputs(product: dict[str, str]) -> tuple[str, str, str, dict[str, Any]]:
+    """Return the name, identifier, template and inputs of a product of a company file"""
     # Validate product
     if "name" not in product:
         raise Exception("No 'name' field found in a product")
@@ -86,26 +115,88 @@ def process_product(
     facts["allocation_of_corporate_emissions_pct"] = get_product_info(
         "allocation_of_corporate_emissions_pct", Decimal("100.0"), product, 0
     )
-    atp = AdTechPlatform(**facts)  # type: ignore
-    defaults = AdTechPlatform.load_default_yaml(str(template), defaults_file)
-    modeled_product = atp.model_product(
-        name=str(name),
-        identifier=str(identifier),
-        defaults=defaults,
-        distribution_partners=distribution_partners,
-        corporate_emissions_g=corporate_emissions_g,
-        corporate_emissions_g_per_bid_request=corporate_emissions_g_per_bid_request,
-        depth=depth,
-    )
+    return str(name), str(identifier), str(template), facts
+
+
+def process_product(
+    product: dict[str, str],
+    defaults_file: str,
+    depth: int,
+    distribution_partners: list[DistributionPartner],
+    corporate_emissions_g: Decimal | None = None,
+    corporate_emissions_g_per_bid_request: Decimal | None = None,
+    sensitivity_reports: list[dict[str, Any]] | None = None,
+) -> ModeledAdTechPlatform:
+    """
+    Model the product (atp), adding its sensitivity to sensitivity_reports if given
+    :return: ModeledAdTechPlatform
+    """
+    name, identifier, template, facts = product_inputs(product)
+    atp = AdTechPlatform(**facts)
+    defaults = AdTechPlatform.load_default_yaml(template, defaults_file)
+    arguments = {
+        "name": name,
+        "identifier": identifier,
+        "defaults": defaults,
+        "distribution_partners": distribution_partners,
+        "corporate_emissions_g": corporate_emissions_g,
+        "corporate_emissions_g_per_bid_request": corporate_emissions_g_per_bid_request,
+        "depth": depth,
+    }
+    if sensitivity_reports is None:
+        return atp.model_product(**arguments)
+    modeled_product, sensitivity = compute_sensitivity(atp, atp.model_product, **arguments)
+    sensitivity_reports.append({"name": name, "sensitivity": sensitivity})
     return modeled_product
 
 
+def process_products_in_batch(
+    products: list[dict[str, str]],
+    defaults_file: str,
+    corporate_emissions_g: Decimal | None = None,
+    corporate_emissions_g_per_bid_request: Decimal | None = None,
+) -> list[ModeledAdTechPlatform]:
+    """
+    Model the products (atps) with the batch engine, as columns of the products of each
+    template, without distribution partners
+    :return: list[ModeledAdTechPlatform]
+    """
+    # Key: template
+    # Value: the index of each product of the template and its columns
+    templates: dict[str, tuple[list[int], dict[str, list[Any]]]] = {}
+    for index, product in enumerate(products):
+        name, identifier, template, facts = product_inputs(product)
+        indexes, columns = templates.setdefault(template, ([], {}))
+        inputs = {
+            **facts,
+            "name": name,
+            "identifier": identifier,
+            "corporate_emissions_g": corporate_emissions_g,
+            "corporate_emissions_g_per_bid_request": corporate_emissions_g_per_bid_request,
+        }
+        for input_name in inputs.keys() - columns.keys():
+            columns[input_name] = [None] * len(indexes)
+        for input_name, values in columns.items():
+            values.append(inputs.get(input_name))
+        indexes.append(index)
+
+    modeled_products: list[Any] = [None] * len(products)
+    for template, (indexes, columns) in templates.items():
+        defaults = AdTechPlatform.load_default_yaml(template, defaults_file)
+        for index, modeled_product in zip(indexes, model_products(defaults, columns)):
+            modeled_products[index] = modeled_product
+    return modeled_products
+
+
 def main():
     """Model the emissions for a ad tech platform"""
     args = parse_args()
     if args.verbose:
         logging.basicConfig(level=logging.INFO)
 
+    trace = start_derivation_trace() if args.explain_json else None
+    sensitivity_reports: list[dict[str, Any]] | None = [] if args.sensitivity_json else None
+
     # Load facts about the company
     with open(args.companyFile[0], "r", encoding="UTF-8") as stream:
         document = yaml_load(stream)
@@ -129,20 +220,38 @@ def main():
                 )
                 distribution_partners.append(DistributionPartner(partner, Decimal("1.0")))
 
-        depth = 4 if args.verbose else 0
-        product_models = []
-        for product in document["products"]:
-            modeled_product = process_product(
-                product=product,
-                defaults_file=args.defaultsFile,
-                corporate_emissions_g=corporate_emissions_g,
-                corporate_emissions_g_per_bid_request=corporate_emissions_g_per_bid_request,
-                depth=depth,
-                distribution_partners=distribution_partners,
+        depth = 4 if args.verbose or args.explain_json else 0
+        if args.batch:
+            product_models = process_products_in_batch(
+                document["products"],
+                args.defaultsFile,
+                corporate_emissions_g,
+                corporate_emissions_g_per_bid_request,
             )
-            product_models.append(modeled_product)
+        else:
+            product_models = [
+                process_product(
+                    product=product,
+                    defaults_file=args.defaultsFile,
+                    corporate_emissions_g=corporate_emissions_g,
+                    corporate_emissions_g_per_bid_request=corporate_emissions_g_per_bid_request,
+                    depth=depth,
+                    distribution_partners=distribution_partners,
+                    sensitivity_reports=sensitivity_reports,
+                )
+                for product in document["products"]
+            ]
 
-    print(yaml_dump({"products": product_models}))
+    ModeledRecords(ModeledAdTechPlatform, product_models).write(
+        sys.stdout, args.output_format, "products"
+    )
+    if args.output_format == "yaml":
+        # followed by a blank line, as the yaml was printed
+        print()
+    if trace is not None:
+        trace.write_json(args.explain_json)
+    if sensitivity_reports is not None:
+        write_sensitivity_json(args.sensitivity_json, sensitivity_reports)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,11 @@ import argparse
 import logging
 
 from scope3_methodology.corporate.model import CorporateEmissions
+from scope3_methodology.utils.derivation import start_derivation_trace
+from scope3_methodology.utils.sensitivity import (
+    compute_sensitivity,
+    write_sensitivity_json,
+)
 from scope3_methodology.utils.utils import get_facts
 from scope3_methodology.utils.yaml_helpers import yaml_dump, yaml_load
 
@@ -22,6 +27,16 @@ def main():
         help="Set the defaults file to use (overrides organization-defaults.yaml)",
     )
     parser.add_argument("-v", "--verbose", action="store_true", help="Show derivation of output")
+    parser.add_argument(
+        "--explain-json",
+        metavar="FILE",
+        help="Write how the output was derived, as a tree of steps, to FILE in JSON",
+    )
+    parser.add_argument(
+        "--sensitivity-json",
+        metavar="FILE",
+        help="Write the partial derivatives of the output with respect to each input to FILE",
+    )
     parser.add_argument(
         "type",
         choices=["generic", "publisher", "atp"],
@@ -33,6 +48,8 @@ def main():
     if args.verbose:
         logging.basicConfig(level=logging.INFO)
 
+    trace = start_derivation_trace() if args.explain_json else None
+
     # Load facts about the company
     with open(args.companyFile[0], "r", encoding="UTF-8") as stream:
         document = yaml_load(stream)
@@ -40,12 +57,22 @@ def main():
             raise Exception("No 'name' field found in company file")
         facts = get_facts(document["facts"]) if "facts" in document else {}
 
-        depth = 4 if args.verbose else 0
+        depth = 4 if args.verbose or args.explain_json else 0
         corp = CorporateEmissions(**facts)  # type: ignore
         defaults = CorporateEmissions.load_default_yaml(args.type, args.defaultsFile)
-        org_emissions = corp.comp_emissions_g_co2e_per_month(defaults, depth - 1)
+        if args.sensitivity_json:
+            org_emissions, sensitivity = compute_sensitivity(
+                corp, corp.comp_emissions_g_co2e_per_month, defaults=defaults, depth=depth - 1
+            )
+            sensitivity_reports = [{"name": document["name"], "sensitivity": sensitivity}]
+        else:
+            org_emissions = corp.comp_emissions_g_co2e_per_month(defaults, depth - 1)
 
     print(yaml_dump(org_emissions))
+    if trace is not None:
+        trace.write_json(args.explain_json)
+    if args.sensitivity_json:
+        write_sensitivity_json(args.sensitivity_json, sensitivity_reports)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+""" Compute corporate emissions for a portfolio of organizations """
+import argparse
+import logging
+import os
+import sys
+
+from scope3_methodology.corporate.portfolio import find_company_files, model_portfolio
+from scope3_methodology.utils.modeled_records import OUTPUT_FORMATS
+from scope3_methodology.utils.public_yaml_files import PUBLIC_YAML_DIRECTORY
+
+
+def main():
+    """
+    Model corporate emissions for many organizations in one run, writing a row per
+    organization, with an error for organizations that can't be modeled
+    """
+    parser = argparse.ArgumentParser(
+        description="Compute corporate emissions for a portfolio of organizations"
+    )
+    parser.add_argument(
+        "-d",
+        "--defaultsFile",
+        default="defaults/organization-defaults.yaml",
+        help="Set the defaults file to use (overrides organization-defaults.yaml)",
+    )
+    parser.add_argument(
+        "-t",
+        "--type",
+        choices=["generic", "publisher", "atp"],
+        help="""
+            Type of organization for computing defaults, by default the template of each
+            organization, or generic without template
+            """,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        default=os.cpu_count() or 1,
+        type=int,
+        help="Number of processes used to model company files (small portfolios run serially)",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default="yaml",
+        help="Write the organizations in yaml, JSON or as a CSV table",
+    )
+    parser.add_argument(
+        "companyFiles",
+        nargs="*",
+        default=[PUBLIC_YAML_DIRECTORY],
+        help="""
+            Company files in YAML format, portfolio files listing company file documents under
+            organizations, or directories of companies (default: data/companies)
+            """,
+    )
+
+    args = parser.parse_args()
+    organizations = model_portfolio(
+        find_company_files(args.companyFiles), args.defaultsFile, args.type, args.workers
+    )
+    failed = sum(error is not None for error in organizations.column("error"))
+    if failed:
+        logging.warning("%d of %d organizations could not be modeled", failed, len(organizations))
+
+    organizations.write(sys.stdout, args.output_format, "organizations")
+    if args.output_format == "yaml":
+        # followed by a blank line, as the yaml was printed
+        print()
+
+
+if __name__ == "__main__":
+    main()
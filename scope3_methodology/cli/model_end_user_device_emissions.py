@@ -2,9 +2,13 @@
 """ Compute emissions for a end user device emissions for a specific property channel """
 import argparse
 import logging
+import sys
 
+from scope3_methodology.end_user_device.batch import model_end_user_devices
 from scope3_methodology.end_user_device.model import EndUserDevice
 from scope3_methodology.publisher.model import Property
+from scope3_methodology.utils.defaults_registry import defaults_registry
+from scope3_methodology.utils.derivation import start_derivation_trace
 from scope3_methodology.utils.yaml_helpers import yaml_dump
 
 
@@ -25,11 +29,23 @@ def parse_args():
         help="Set the property defaults file to use",
     )
     parser.add_argument("-v", "--verbose", action="store_true", help="Show derivation of output")
-    parser.add_argument("channel", nargs=1, help="The channel the device is being used within ")
+    parser.add_argument(
+        "--explain-json",
+        metavar="FILE",
+        help="Write how the output was derived, as a tree of steps, to FILE in JSON",
+    )
+    parser.add_argument(
+        "channel",
+        nargs="?",
+        help="The channel the device is being used within, every channel if omitted",
+    )
     parser.add_argument(
         "device",
-        nargs=1,
-        help="Environment to model: personal_computer, smartphone, tablet, tv_system",
+        nargs="?",
+        help="""
+            Environment to model: personal_computer, smartphone, tablet, tv_system, every
+            device if omitted
+            """,
     )
 
     return parser.parse_args()
@@ -43,24 +59,55 @@ def main():
     if args.verbose:
         logging.basicConfig(level=logging.INFO)
 
+    trace = start_derivation_trace() if args.explain_json else None
+
     template = "generic"
-    channel = str(args.channel[0]).lower()
-    device = str(args.device[0])
-    property_defaults = Property.load_default_yaml(template, args.propertyDefaultsFile, channel)
+    if args.channel is not None and args.device is not None:
+        channel = str(args.channel).lower()
+        device = str(args.device)
+        property_defaults = Property.load_default_yaml(template, args.propertyDefaultsFile, channel)
 
-    if not property_defaults.quality_impressions_per_duration_s:
-        logging.error("Unable to compute end user device emissions for channel: %s", channel)
-        return
+        if not property_defaults.quality_impressions_per_duration_s:
+            logging.error("Unable to compute end user device emissions for channel: %s", channel)
+            return
 
-    unmodeled_end_user_device = EndUserDevice.load_default_yaml(device, args.defaultsFile)
-    modeled_end_user_device = unmodeled_end_user_device.model_end_user_device(
-        device,
-        channel,
-        template,
-        property_defaults.quality_impressions_per_duration_s,
-    )
-    if modeled_end_user_device is not None:
-        print(yaml_dump({device: modeled_end_user_device}))
+        unmodeled_end_user_device = EndUserDevice.load_default_yaml(device, args.defaultsFile)
+        modeled_end_user_device = unmodeled_end_user_device.model_end_user_device(
+            device,
+            channel,
+            template,
+            property_defaults.quality_impressions_per_duration_s,
+        )
+        if modeled_end_user_device is not None:
+            print(yaml_dump({device: modeled_end_user_device}))
+    else:
+        channels = (
+            [str(args.channel).lower()]
+            if args.channel is not None
+            else list(defaults_registry.get_document(args.propertyDefaultsFile)["defaults"])
+        )
+        devices = (
+            [str(args.device)]
+            if args.device is not None
+            else list(defaults_registry.get_document(args.defaultsFile)["defaults"])
+        )
+        matrix = model_end_user_devices(
+            {
+                device: EndUserDevice.load_default_yaml(device, args.defaultsFile)
+                for device in devices
+            },
+            {
+                channel: Property.load_default_yaml(
+                    template, args.propertyDefaultsFile, channel
+                ).quality_impressions_per_duration_s
+                for channel in channels
+            },
+        )
+        matrix.records(template).write_yaml(sys.stdout, "end_user_devices")
+        # followed by a blank line, as the yaml was printed
+        print()
+    if trace is not None:
+        trace.write_json(args.explain_json)
 
 
 if __name__ == "__main__":
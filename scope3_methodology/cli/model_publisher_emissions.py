@@ -2,11 +2,25 @@
 """ Compute emissions for a publishers properties """
 import argparse
 import logging
+import sys
 from decimal import Decimal
+from typing import Any
 
+from scope3_methodology.publisher.batch import (
+    allocate_corporate_emissions,
+    model_inventory,
+    read_inventory_csv,
+)
 from scope3_methodology.publisher.model import ModeledProperty, Property
+from scope3_methodology.utils.batch import row_count
+from scope3_methodology.utils.derivation import start_derivation_trace
+from scope3_methodology.utils.modeled_records import OUTPUT_FORMATS, ModeledRecords
+from scope3_methodology.utils.sensitivity import (
+    compute_sensitivity,
+    write_sensitivity_json,
+)
 from scope3_methodology.utils.utils import get_facts
-from scope3_methodology.utils.yaml_helpers import yaml_dump, yaml_load
+from scope3_methodology.utils.yaml_helpers import yaml_load
 
 
 def parse_args():
@@ -79,22 +93,56 @@ def parse_args():
         help="Provide the corporate emissions per impression for organization",
     )
     parser.add_argument("-v", "--verbose", action="store_true", help="Show derivation of output")
-    parser.add_argument("companyFile", nargs=1, help="The company file to parse in YAML format")
+    parser.add_argument(
+        "--explain-json",
+        metavar="FILE",
+        help="Write how the output was derived, as a tree of steps, to FILE in JSON",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default=OUTPUT_FORMATS[0],
+        help="Write the modeled results to stdout in this format",
+    )
+    parser.add_argument(
+        "--sensitivity-json",
+        metavar="FILE",
+        help="Write the partial derivatives of the output with respect to each input to FILE",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="""
+            Model all properties at once with the NumPy batch engine, in float64 and without
+            derivation or sensitivity, as inventories in CSV format are
+            """,
+    )
+    parser.add_argument(
+        "companyFile",
+        nargs=1,
+        help="""
+            The company file to parse in YAML format, or an inventory of properties in CSV
+            format with a column per identifier, template, channel and property input
+            """,
+    )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if (args.batch or args.companyFile[0].endswith(".csv")) and (
+        args.verbose or args.explain_json or args.sensitivity_json
+    ):
+        parser.error(
+            "-v, --explain-json and --sensitivity-json are not available with --batch "
+            "or inventories in CSV format"
+        )
+    return args
 
 
-def process_property(
+def property_inputs(
     publisher_property: dict[str, str | list[dict[str, Decimal]]],
-    defaults_file: str,
-    depth: int,
     grid_intensity_g_co2e_per_kwh: Decimal,
     environment: str,
-) -> ModeledProperty:
-    """
-    Process a single publisher property.
-    :return: ModeledProperty
-    """
+) -> tuple[str, str, str, dict[str, Any]]:
+    """Return the identifier, template, channel and inputs of a property of a company file"""
     # Validate property & get property facts
     if (
         "identifier" not in publisher_property
@@ -109,45 +157,76 @@ def process_property(
     # Add in additional facts not parsed from yaml
     facts["environment"] = environment
     facts["grid_intensity_g_co2e_per_kwh"] = grid_intensity_g_co2e_per_kwh
-    unmodeled_property = Property(**facts)  # type: ignore
-    defaults = Property.load_default_yaml(str(template), defaults_file, str(channel))
-    return unmodeled_property.model_property(str(publisher_property["identifier"]), defaults, depth)
+    return str(publisher_property["identifier"]), str(template), str(channel), facts
 
 
-def main():
-    """Model the emisisons for a publishers properties"""
-    # Process Command Line Arguments
-    args = parse_args()
+def process_property(
+    publisher_property: dict[str, str | list[dict[str, Decimal]]],
+    defaults_file: str,
+    depth: int,
+    grid_intensity_g_co2e_per_kwh: Decimal,
+    environment: str,
+    sensitivity_reports: list[dict[str, Any]] | None = None,
+) -> ModeledProperty:
+    """
+    Process a single publisher property, adding its sensitivity to sensitivity_reports if given
+    :return: ModeledProperty
+    """
+    identifier, template, channel, facts = property_inputs(
+        publisher_property, grid_intensity_g_co2e_per_kwh, environment
+    )
+    unmodeled_property = Property(**facts)
+    defaults = Property.load_default_yaml(template, defaults_file, channel)
+    if sensitivity_reports is None:
+        return unmodeled_property.model_property(identifier, defaults, depth)
+    modeled_property, sensitivity = compute_sensitivity(
+        unmodeled_property,
+        unmodeled_property.model_property,
+        identifier=identifier,
+        defaults=defaults,
+        depth=depth,
+    )
+    sensitivity_reports.append({"name": identifier, "sensitivity": sensitivity})
+    return modeled_property
 
-    if args.verbose:
-        logging.basicConfig(level=logging.INFO)
 
+def process_properties(
+    company_file: str,
+    defaults_file: str,
+    grid_intensity_g_co2e_per_kwh: Decimal,
+    environment: str,
+    corporate_emissions_g: Decimal | None,
+    corporate_emissions_g_per_imp: Decimal | None,
+    depth: int,
+    sensitivity_reports: list[dict[str, Any]] | None = None,
+) -> list[ModeledProperty]:
+    """
+    Process the properties of a company file, allocating the corporate emissions if given
+    :return: list[ModeledProperty]
+    """
     # Load facts about the company
-    with open(args.companyFile[0], "r", encoding="UTF-8") as stream:
+    with open(company_file, "r", encoding="UTF-8") as stream:
         document = yaml_load(stream)
         if "properties" not in document:
             raise Exception("No 'properties' field found in company file")
 
-        depth = 4 if args.verbose else 0
-
         publisher_impressions = Decimal("0.0")
         properties: list[ModeledProperty] = []
         for publisher_property in document["properties"]:
             modeled_property = process_property(
                 publisher_property=publisher_property,
-                defaults_file=args.defaultsFile,
-                grid_intensity_g_co2e_per_kwh=args.gridIntensity,
-                environment=args.environment,
+                defaults_file=defaults_file,
+                grid_intensity_g_co2e_per_kwh=grid_intensity_g_co2e_per_kwh,
+                environment=environment,
                 depth=depth,
+                sensitivity_reports=sensitivity_reports,
             )
             publisher_impressions += modeled_property.impressions
             properties.append(modeled_property)
 
     # By default when processing the property the default corproate emissions g per impression
     # is set, only if we have direct inputs will we then override this values
-    if args.corporateEmissionsG or args.corporateEmissionsGPerImp:
-        corporate_emissions_g = args.corporateEmissionsG
-        corporate_emissions_g_per_imp = args.corporateEmissionsGPerImp
+    if corporate_emissions_g or corporate_emissions_g_per_imp:
         for modeled_property in properties:
             if corporate_emissions_g:
                 modeled_property.set_corporate_emissions_g_co2e_per_impression(
@@ -158,8 +237,97 @@ def main():
                 modeled_property.set_corporate_emissions_g_co2e_per_impression(
                     None, corporate_emissions_g_per_imp
                 )
+    return properties
+
+
+def process_properties_in_batch(
+    company_file: str,
+    defaults_file: str,
+    grid_intensity_g_co2e_per_kwh: Decimal,
+    environment: str,
+) -> ModeledRecords[ModeledProperty]:
+    """
+    Process the properties of a company file, or of an inventory in CSV format, with the
+    batch engine. The grid intensity and environment apply to the properties of an inventory
+    without their own.
+    :return: ModeledRecords[ModeledProperty]
+    """
+    with open(company_file, "r", encoding="UTF-8") as stream:
+        if company_file.endswith(".csv"):
+            columns = read_inventory_csv(stream)
+            rows = row_count(columns)
+            columns.setdefault("grid_intensity_g_co2e_per_kwh", [None] * rows)
+            columns.setdefault("environment", [None] * rows)
+            columns["grid_intensity_g_co2e_per_kwh"] = [
+                grid_intensity_g_co2e_per_kwh if value is None else value
+                for value in columns["grid_intensity_g_co2e_per_kwh"]
+            ]
+            columns["environment"] = [
+                environment if value is None else value for value in columns["environment"]
+            ]
+        else:
+            document = yaml_load(stream)
+            if "properties" not in document:
+                raise Exception("No 'properties' field found in company file")
+            columns = {}
+            for index, publisher_property in enumerate(document["properties"]):
+                identifier, template, channel, facts = property_inputs(
+                    publisher_property, grid_intensity_g_co2e_per_kwh, environment
+                )
+                inputs = {
+                    **facts,
+                    "identifier": identifier,
+                    "template": template,
+                    "channel": channel,
+                }
+                for name in inputs.keys() - columns.keys():
+                    columns[name] = [None] * index
+                for name, values in columns.items():
+                    values.append(inputs.get(name))
+    return model_inventory(columns, defaults_file)
+
+
+def main():
+    """Model the emisisons for a publishers properties"""
+    # Process Command Line Arguments
+    args = parse_args()
+
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    trace = start_derivation_trace() if args.explain_json else None
+    sensitivity_reports: list[dict[str, Any]] | None = [] if args.sensitivity_json else None
+
+    if args.batch or args.companyFile[0].endswith(".csv"):
+        properties = process_properties_in_batch(
+            args.companyFile[0], args.defaultsFile, args.gridIntensity, args.environment
+        )
+        allocate_corporate_emissions(
+            properties, args.corporateEmissionsG, args.corporateEmissionsGPerImp
+        )
+    else:
+        properties = ModeledRecords(
+            ModeledProperty,
+            process_properties(
+                args.companyFile[0],
+                args.defaultsFile,
+                args.gridIntensity,
+                args.environment,
+                args.corporateEmissionsG,
+                args.corporateEmissionsGPerImp,
+                4 if args.verbose or args.explain_json else 0,
+                sensitivity_reports,
+            ),
+        )
 
-    print(yaml_dump({"properties": properties}))
+    properties.write(sys.stdout, args.output_format, "properties")
+    if args.output_format == "yaml":
+        # followed by a blank line, as the yaml was printed
+        print()
+    if trace is not None:
+        trace.write_json(args.explain_json)
+    if sensitivity_reports is not None:
+        write_sensitivity_json(args.sensitivity_json, sensitivity_reports)
 
 
 if __name__ == "__main__":
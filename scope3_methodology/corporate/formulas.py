@@ -0,0 +1,78 @@
+""" Formulas of the corporate emissions model, evaluated by its methods """
+from scope3_methodology.utils.constants import G_PER_MT, ONE_HUNDRED
+from scope3_methodology.utils.formula import (
+    Formula,
+    Formulas,
+    if_not_none,
+    if_truthy,
+    logged,
+    model_input,
+    required,
+)
+
+corporate_emissions_mt_co2e_per_month = model_input("corporate_emissions_mt_co2e_per_month")
+number_of_employees = model_input("number_of_employees")
+
+# get_ad_revenue_allocation_rate
+ad_revenue_allocation_rate = (
+    required(model_input("revenue_allocation_to_digital_ads_pct")) / ONE_HUNDRED
+)
+
+
+def emissions_mt_co2e_per_month(depth: int) -> Formula:
+    """comp_emissions_mt_co2e_per_month"""
+    return logged(
+        if_not_none(
+            corporate_emissions_mt_co2e_per_month,
+            corporate_emissions_mt_co2e_per_month,
+            if_truthy(
+                number_of_employees,
+                number_of_employees
+                * (
+                    required(model_input("office_emissions_mt_co2e_per_employee_per_month"))
+                    + required(model_input("travel_emissions_mt_co2e_per_employee_per_month"))
+                    + required(model_input("datacenter_emissions_mt_co2e_per_employee_per_month"))
+                    + required(model_input("commuting_emissions_mt_co2e_per_employee_per_month"))
+                    + required(model_input("overhead_emissions_mt_co2e_per_employee_per_month"))
+                ),
+                None,
+            ),
+        ),
+        "corporate emissions mt co2e per month",
+        depth,
+        ".2f",
+    )
+
+
+corporate_emissions_mt = emissions_mt_co2e_per_month(0)
+total_emissions_g_co2e_per_month = corporate_emissions_mt * G_PER_MT
+
+# The results of comp_emissions_g_co2e_per_month, None when there are no emissions, logged at
+# the depth the evaluator is called with
+CORPORATE_EMISSIONS_FORMULAS = Formulas(
+    {
+        "total_corporate_emissions_g_co2e_per_month": if_truthy(
+            corporate_emissions_mt,
+            logged(
+                total_emissions_g_co2e_per_month,
+                "total corporate emissions g co2e per month",
+                0,
+                ".2f",
+            ),
+            None,
+        ),
+        "digital_ads_allocation_corporate_emissions_g_co2e_per_month": if_truthy(
+            corporate_emissions_mt,
+            logged(
+                ad_revenue_allocation_rate * total_emissions_g_co2e_per_month,
+                "digital ads allocation of corporate emissions g co2e per month",
+                0,
+                ".2f",
+            ),
+            None,
+        ),
+        "revenue_allocation_to_digital_ads_pct": model_input(
+            "revenue_allocation_to_digital_ads_pct"
+        ),
+    }
+)
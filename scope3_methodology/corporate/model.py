@@ -4,12 +4,19 @@ from dataclasses import dataclass, field
 from decimal import Decimal
 from typing import Optional
 
-from scope3_methodology.utils.constants import G_PER_MT, ONE_HUNDRED
-from scope3_methodology.utils.custom_base_model import CustomBaseModel
-from scope3_methodology.utils.utils import log_result, not_none
+from scope3_methodology.corporate import formulas
+from scope3_methodology.utils.custom_base_model import CustomBaseModel, resolve_inputs
+from scope3_methodology.utils.derivation import trace_model
+from scope3_methodology.utils.formula import scalar_function
+from scope3_methodology.utils.modeled_records import modeled_record
 
+# The methods of CorporateEmissions, compiled from its formulas
+evaluate_ad_revenue_allocation_rate = scalar_function(formulas.ad_revenue_allocation_rate)
+evaluate_emissions_mt_co2e_per_month = scalar_function(formulas.emissions_mt_co2e_per_month(0))
+evaluate_emissions_g_co2e_per_month = formulas.CORPORATE_EMISSIONS_FORMULAS.scalar()
 
-@dataclass
+
+@modeled_record(frozen=True)
 class ModeledCorporateEmissions:
     """A modeled corporate emissions for an organization"""
 
@@ -54,8 +61,8 @@ class CorporateEmissions(CustomBaseModel):
 
     def validate(self) -> None:
         """Validate the required CorporateEmissions fields for computation"""
-
-        if not self.number_of_employees and not self.corporate_emissions_mt_co2e_per_month:
+        inputs = resolve_inputs(self)
+        if not inputs.number_of_employees and not inputs.corporate_emissions_mt_co2e_per_month:
             raise Exception(
                 """
                 Unable to compute corporate emissions. Must provide either:
@@ -66,7 +73,7 @@ class CorporateEmissions(CustomBaseModel):
 
     def get_ad_revenue_allocation_rate(self):
         """Return the ad revenue allocation to digital ads rate (decimal fraction)"""
-        return not_none(self.revenue_allocation_to_digital_ads_pct) / ONE_HUNDRED
+        return evaluate_ad_revenue_allocation_rate(resolve_inputs(self))
 
     def comp_emissions_mt_co2e_per_month(
         self, defaults: "CorporateEmissions", depth: int
@@ -74,17 +81,7 @@ class CorporateEmissions(CustomBaseModel):
         """Computes the corporate emisisons per month in metric tons CO2e"""
         self.set_defaults(defaults)
         self.validate()
-        corporate_emissions = self.corporate_emissions_mt_co2e_per_month
-        if corporate_emissions is None and self.number_of_employees:
-            corporate_emissions = self.number_of_employees * (
-                not_none(self.office_emissions_mt_co2e_per_employee_per_month)
-                + not_none(self.travel_emissions_mt_co2e_per_employee_per_month)
-                + not_none(self.datacenter_emissions_mt_co2e_per_employee_per_month)
-                + not_none(self.commuting_emissions_mt_co2e_per_employee_per_month)
-                + not_none(self.overhead_emissions_mt_co2e_per_employee_per_month)
-            )
-        log_result("corporate emissions mt co2e per month", f"{corporate_emissions:.2f}", depth)
-        return corporate_emissions
+        return evaluate_emissions_mt_co2e_per_month(resolve_inputs(self), depth=depth)
 
     def comp_emissions_g_co2e_per_month(
         self, defaults: "CorporateEmissions", depth: int
@@ -92,25 +89,17 @@ class CorporateEmissions(CustomBaseModel):
         """Computes the corporate emisisons per month in grams CO2e"""
         self.set_defaults(defaults)
         self.validate()
-        corporate_emissions_mt = self.comp_emissions_mt_co2e_per_month(defaults, depth)
-        if corporate_emissions_mt:
-            total_emissions = corporate_emissions_mt * G_PER_MT
-            log_result(
-                "total corporate emissions g co2e per month",
-                f"{total_emissions:.2f}",
-                depth,
-            )
-
-            digital_ad_emissions = self.get_ad_revenue_allocation_rate() * total_emissions
-            log_result(
-                "digital ads allocation of corporate emissions g co2e per month",
-                f"{digital_ad_emissions:.2f}",
-                depth,
-            )
-
-            return ModeledCorporateEmissions(
-                total_corporate_emissions_g_co2e_per_month=total_emissions,
-                digital_ads_allocation_corporate_emissions_g_co2e_per_month=digital_ad_emissions,
-                revenue_allocation_to_digital_ads_pct=self.revenue_allocation_to_digital_ads_pct,
-            )
-        return None
+        (
+            total_emissions,
+            digital_ad_emissions,
+            revenue_allocation_to_digital_ads_pct,
+        ) = evaluate_emissions_g_co2e_per_month(resolve_inputs(self), depth=depth)
+        if total_emissions is None:
+            return None
+
+        trace_model("corporate", self)
+        return ModeledCorporateEmissions(
+            total_corporate_emissions_g_co2e_per_month=total_emissions,
+            digital_ads_allocation_corporate_emissions_g_co2e_per_month=digital_ad_emissions,
+            revenue_allocation_to_digital_ads_pct=revenue_allocation_to_digital_ads_pct,
+        )
@@ -0,0 +1,150 @@
+""" Portfolio engine modeling the corporate emissions of many organizations in one run """
+import os
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from glob import glob
+from itertools import repeat
+from typing import Any, Optional, Sequence
+
+from scope3_methodology.corporate.model import CorporateEmissions
+from scope3_methodology.utils.modeled_records import ModeledRecords, modeled_record
+from scope3_methodology.utils.utils import PARALLEL_MIN_FILES, get_facts
+from scope3_methodology.utils.yaml_helpers import yaml_load
+
+# The company files of a directory of companies, such as data/companies
+COMPANY_FILE_PATTERN = os.path.join("*", "corporate.yaml")
+
+
+@modeled_record(frozen=True)
+class ModeledPortfolioOrganization:
+    """
+    The modeled corporate emissions of an organization of a portfolio, or the error that
+    prevented modeling it
+    """
+
+    name: Optional[str]
+    identifier: Optional[str]
+    template: Optional[str]
+    file: str
+    total_corporate_emissions_g_co2e_per_month: Optional[Decimal]
+    digital_ads_allocation_corporate_emissions_g_co2e_per_month: Optional[Decimal]
+    revenue_allocation_to_digital_ads_pct: Optional[Decimal]
+    error: Optional[str]
+
+
+def find_company_files(paths: Sequence[str]) -> list[str]:
+    """Return the files of paths, directories replaced with their company files"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob(os.path.join(path, COMPANY_FILE_PATTERN))))
+        else:
+            files.append(path)
+    return files
+
+
+def model_organization(
+    organization: dict[str, Any],
+    file: str,
+    defaults_file: str,
+    defaults: dict[str, CorporateEmissions],
+    template: Optional[str] = None,
+) -> ModeledPortfolioOrganization:
+    """
+    Model an organization, a company file document, with the defaults of its template, or of
+    template if given. The defaults of each template are loaded once into defaults.
+    """
+    organization_template = template or organization.get("template") or "generic"
+    try:
+        if "name" not in organization:
+            raise Exception("No 'name' field found in company file")
+        facts = get_facts(organization["facts"]) if "facts" in organization else {}
+        if organization_template not in defaults:
+            defaults[organization_template] = CorporateEmissions.load_default_yaml(
+                organization_template, defaults_file
+            )
+        modeled = CorporateEmissions(**facts).comp_emissions_g_co2e_per_month(  # type: ignore
+            defaults[organization_template], 0
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        return ModeledPortfolioOrganization(
+            organization.get("name"),
+            organization.get("public_identifier"),
+            organization_template,
+            file,
+            None,
+            None,
+            None,
+            " ".join(str(exc).split()),
+        )
+    return ModeledPortfolioOrganization(
+        organization.get("name"),
+        organization.get("public_identifier"),
+        organization_template,
+        file,
+        modeled.total_corporate_emissions_g_co2e_per_month if modeled else None,
+        modeled.digital_ads_allocation_corporate_emissions_g_co2e_per_month if modeled else None,
+        modeled.revenue_allocation_to_digital_ads_pct if modeled else None,
+        None,
+    )
+
+
+def model_company_files(
+    files: Sequence[str], defaults_file: str, template: Optional[str] = None
+) -> list[ModeledPortfolioOrganization]:
+    """
+    Model the organizations of company files, in order. A file is a company file, or a
+    portfolio file listing company file documents under organizations.
+    """
+    defaults: dict[str, CorporateEmissions] = {}
+    modeled = []
+    for file in files:
+        try:
+            with open(file, "r", encoding="UTF-8") as stream:
+                document = yaml_load(stream)
+            if not isinstance(document, dict):
+                raise Exception("A company file must be a mapping")
+        except Exception as exc:  # pylint: disable=broad-except
+            modeled.append(
+                ModeledPortfolioOrganization(
+                    None, None, template, file, None, None, None, " ".join(str(exc).split())
+                )
+            )
+            continue
+        organizations = document["organizations"] if "organizations" in document else [document]
+        for organization in organizations:
+            modeled.append(
+                model_organization(organization, file, defaults_file, defaults, template)
+            )
+    return modeled
+
+
+def model_portfolio(
+    files: Sequence[str],
+    defaults_file: str,
+    template: Optional[str] = None,
+    workers: int = 1,
+) -> ModeledRecords[ModeledPortfolioOrganization]:
+    """
+    Model the organizations of company files, one row per organization in file order, see
+    model_company_files. Organizations that can't be modeled, such as those failing
+    validate, have an error instead of results. With more than one worker and at least
+    PARALLEL_MIN_FILES files, the files are sharded across a process pool.
+    """
+    if workers <= 1 or len(files) < PARALLEL_MIN_FILES:
+        return ModeledRecords(
+            ModeledPortfolioOrganization, model_company_files(files, defaults_file, template)
+        )
+
+    shard_size = max(1, len(files) // (workers * 4))
+    shards = []
+    for start in range(0, len(files), shard_size):
+        end = start + shard_size
+        shards.append(files[start:end])
+    records = ModeledRecords(ModeledPortfolioOrganization)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for modeled in executor.map(
+            model_company_files, shards, repeat(defaults_file), repeat(template)
+        ):
+            records.extend(modeled)
+    return records
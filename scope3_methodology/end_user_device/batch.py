@@ -0,0 +1,79 @@
+""" Batch engine modeling end user devices for many channels at once """
+from dataclasses import dataclass
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Mapping, Optional
+
+import numpy
+
+from scope3_methodology.end_user_device.formulas import END_USER_DEVICE_FORMULAS
+from scope3_methodology.end_user_device.model import EndUserDevice, ModeledEndUserDevice
+from scope3_methodology.utils.custom_base_model import resolve_inputs
+from scope3_methodology.utils.modeled_records import ModeledRecords
+from scope3_methodology.utils.numeric import to_number
+
+# model_end_user_device over arrays of inputs and rates, see END_USER_DEVICE_FORMULAS
+evaluate_end_user_device = END_USER_DEVICE_FORMULAS.scalar()
+
+
+@dataclass(frozen=True)
+class EndUserDeviceMatrix:
+    """
+    The results of model_end_user_device for each device and channel, a matrix per result
+    with a row per device and a column per channel
+    """
+
+    devices: tuple[str, ...]
+    channels: tuple[str, ...]
+    power_kwh_per_imp: Any
+    production_gco2e_per_imp: Any
+    power_kwh_per_second: Any
+    production_gco2e_per_second: Any
+
+    def values(self, name: str) -> list[Any]:
+        """Return the values of a result, device by device"""
+        return getattr(self, name).ravel().tolist()
+
+    def records(self, template: str) -> ModeledRecords[ModeledEndUserDevice]:
+        """Return the modeled end user device of each device and channel, device by device"""
+        return ModeledRecords.from_columns(
+            ModeledEndUserDevice,
+            {
+                "device": [device for device in self.devices for _ in self.channels],
+                "channel": list(self.channels) * len(self.devices),
+                "template": [template] * (len(self.devices) * len(self.channels)),
+                **{name: self.values(name) for name in END_USER_DEVICE_FORMULAS.names},
+            },
+        )
+
+
+def model_end_user_devices(
+    devices: Mapping[str, EndUserDevice],
+    quality_impressions_per_duration_s: Mapping[str, Optional[Decimal]],
+) -> EndUserDeviceMatrix:
+    """
+    Model each end user device for each channel as model_end_user_device does, given the
+    quality impressions per second of each channel. Channels without quality impressions
+    are left out, as they can't be modeled. The formulas are evaluated once, over a column
+    of device inputs and a row of channel rates, in the active numeric backend: with
+    Decimals the results are exactly those of model_end_user_device.
+    """
+    channels = {
+        channel: to_number(rate)
+        for channel, rate in quality_impressions_per_duration_s.items()
+        if rate
+    }
+    device_inputs = [resolve_inputs(device) for device in devices.values()]
+    shape = (len(device_inputs), len(channels))
+    # Decimals are held in object arrays, computed with the operators of Decimal
+    inputs = SimpleNamespace(
+        **{
+            name: numpy.array([getattr(inputs, name) for inputs in device_inputs]).reshape(-1, 1)
+            for name in END_USER_DEVICE_FORMULAS.input_names()
+        }
+    )
+    rates = numpy.array(list(channels.values())).reshape(1, -1)
+    results = [
+        numpy.broadcast_to(result, shape) for result in evaluate_end_user_device(inputs, rates)
+    ]
+    return EndUserDeviceMatrix(tuple(devices), tuple(channels), *results)
@@ -0,0 +1,44 @@
+""" Formulas of the end user device model, evaluated by its methods and its batch engine """
+from scope3_methodology.utils.constants import SEC_PER_HOUR
+from scope3_methodology.utils.formula import Formulas, logged, model_input, parameter
+
+draw_watts = model_input("draw_watts")
+production_emissions_gco2e_per_duration_s = model_input("production_emissions_gco2e_per_duration_s")
+seconds_per_impression = 1 / parameter("quality_impressions_per_duration_s")
+
+# compute_power_emissions_kwh_per_imp
+power_kwh_per_imp = seconds_per_impression * draw_watts / SEC_PER_HOUR / 1000
+# compute_power_emissions_kwh_per_second
+power_kwh_per_second = draw_watts / 1000 / SEC_PER_HOUR
+# compute_production_emissions_gco2e_per_imp
+production_gco2e_per_imp = seconds_per_impression * production_emissions_gco2e_per_duration_s
+
+# The results of compute_power_emissions_kwh_per_imp, compute_power_emissions_kwh_per_second
+# and compute_production_emissions_gco2e_per_imp as logged by model_end_user_device
+logged_power_kwh_per_imp = logged(power_kwh_per_imp, "power_emissions_kwh_per_imp", 2)
+logged_power_kwh_per_second = logged(power_kwh_per_second, "power_emissions_kwh_per_second", 2)
+logged_production_gco2e_per_imp = logged(
+    production_gco2e_per_imp, "production_emissions_gco2e_per_imp", 2
+)
+
+# The results of model_end_user_device, for the quality impressions rate of a channel
+MODEL_END_USER_DEVICE_FORMULAS = Formulas(
+    {
+        "power_kwh_per_imp": logged_power_kwh_per_imp,
+        "power_kwh_per_second": logged_power_kwh_per_second,
+        "production_gco2e_per_imp": logged_production_gco2e_per_imp,
+        "production_gco2e_per_second": production_emissions_gco2e_per_duration_s,
+    },
+    parameters=("quality_impressions_per_duration_s",),
+)
+
+# The same results without logging, evaluated over whole matrices of devices and channels
+END_USER_DEVICE_FORMULAS = Formulas(
+    {
+        "power_kwh_per_imp": power_kwh_per_imp,
+        "production_gco2e_per_imp": production_gco2e_per_imp,
+        "power_kwh_per_second": power_kwh_per_second,
+        "production_gco2e_per_second": production_emissions_gco2e_per_duration_s,
+    },
+    parameters=("quality_impressions_per_duration_s",),
+)
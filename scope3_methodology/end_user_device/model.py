@@ -3,11 +3,25 @@
 from dataclasses import dataclass, field
 from decimal import Decimal
 
-from scope3_methodology.utils.custom_base_model import CustomBaseModel
-from scope3_methodology.utils.utils import log_result
+from scope3_methodology.end_user_device import formulas
+from scope3_methodology.utils.custom_base_model import CustomBaseModel, resolve_inputs
+from scope3_methodology.utils.derivation import trace_model
+from scope3_methodology.utils.formula import scalar_function
+from scope3_methodology.utils.modeled_records import modeled_record
+from scope3_methodology.utils.numeric import to_number
 
+# The methods of EndUserDevice, compiled from its formulas
+evaluate_production_gco2e_per_imp = scalar_function(
+    formulas.logged_production_gco2e_per_imp, ("quality_impressions_per_duration_s",)
+)
+evaluate_power_kwh_per_imp = scalar_function(
+    formulas.logged_power_kwh_per_imp, ("quality_impressions_per_duration_s",)
+)
+evaluate_power_kwh_per_second = scalar_function(formulas.logged_power_kwh_per_second)
+evaluate_end_user_device = formulas.MODEL_END_USER_DEVICE_FORMULAS.scalar()
 
-@dataclass
+
+@modeled_record(frozen=True)
 class ModeledEndUserDevice:
     """A modeled end user device"""
 
@@ -32,24 +46,17 @@ class EndUserDevice(CustomBaseModel):
 
     def compute_production_emissions_gco2e_per_imp(self, quality_ads_per_second: Decimal):
         """Compute the production emissiions in gCO2e per impression"""
-        gco2e_per_imp = (1 / quality_ads_per_second) * (
-            self.production_emissions_gco2e_per_duration_s
+        return evaluate_production_gco2e_per_imp(
+            resolve_inputs(self), to_number(quality_ads_per_second)
         )
-        log_result("production_emissions_gco2e_per_imp", gco2e_per_imp, 2)
-        return gco2e_per_imp
 
     def compute_power_emissions_kwh_per_imp(self, quality_ads_per_second: Decimal):
         """Compute the power emissiions in kilowatt hours per impression"""
-        ws_per_imp = (1 / quality_ads_per_second) * (self.draw_watts)
-        kwh_per_imp = ws_per_imp / Decimal("3600") / Decimal("1000")
-        log_result("power_emissions_kwh_per_imp", kwh_per_imp, 2)
-        return kwh_per_imp
+        return evaluate_power_kwh_per_imp(resolve_inputs(self), to_number(quality_ads_per_second))
 
     def compute_power_emissions_kwh_per_second(self):
         """Device kilowatts"""
-        kwh_per_second = (self.draw_watts) / Decimal("1000") / Decimal("3600")
-        log_result("power_emissions_kwh_per_second", kwh_per_second, 2)
-        return kwh_per_second
+        return evaluate_power_kwh_per_second(resolve_inputs(self))
 
     def model_end_user_device(
         self,
@@ -63,14 +70,16 @@ class EndUserDevice(CustomBaseModel):
         :return: ModeledEndUserDevice
         """
         # Compute Emissions
-        power_kwh_per_imp = self.compute_power_emissions_kwh_per_imp(
-            quality_impressions_per_duration_s
-        )
-        power_kwh_per_second = self.compute_power_emissions_kwh_per_second()
-        production_gco2e_per_imp = self.compute_production_emissions_gco2e_per_imp(
-            quality_impressions_per_duration_s
+        (
+            power_kwh_per_imp,
+            power_kwh_per_second,
+            production_gco2e_per_imp,
+            production_gco2e_per_second,
+        ) = evaluate_end_user_device(
+            resolve_inputs(self), to_number(quality_impressions_per_duration_s)
         )
 
+        trace_model(device, self)
         return ModeledEndUserDevice(
             device,
             channel,
@@ -78,5 +87,5 @@ class EndUserDevice(CustomBaseModel):
             power_kwh_per_imp,
             production_gco2e_per_imp,
             power_kwh_per_second,
-            self.production_emissions_gco2e_per_duration_s,
+            production_gco2e_per_second,
         )
@@ -0,0 +1,171 @@
+""" Batch engine modeling the energy of many streaming sessions at once with NumPy """
+from decimal import Decimal
+from typing import Any, Optional
+
+import numpy
+
+from scope3_methodology.end_user_device.model import EndUserDevice
+from scope3_methodology.networking.model import NetworkingConnection
+from scope3_methodology.networking.transmission_rate_model import TransmissionRate
+from scope3_methodology.utils.batch import row_count, to_values
+from scope3_methodology.utils.custom_base_model import resolve_inputs
+from scope3_methodology.utils.defaults_registry import defaults_registry
+from scope3_methodology.utils.formula import column
+from scope3_methodology.utils.modeled_records import ModeledRecords, modeled_record
+
+# Columns of a batch of sessions, resolution and connection_type may be omitted or None
+SESSION_COLUMNS = ("device", "connection_type", "channel", "resolution", "duration_s")
+# Columns identifying the energy rates of a session, see session_rates
+KEY_COLUMNS = ("device", "connection_type", "channel", "resolution")
+
+
+@modeled_record(frozen=True)
+class ModeledStreamingSession:
+    """
+    Modeled networking and device energy and device production emissions of a streaming
+    session of a device, connection type, channel and resolution
+    """
+
+    device: str
+    connection_type: str
+    channel: str
+    resolution: Optional[str]
+    duration_s: Optional[Decimal]
+    network_energy_kwh: Optional[Decimal]
+    device_energy_kwh: Optional[Decimal]
+    production_emissions_gco2e: Optional[Decimal]
+
+
+def session_rates(
+    device: str,
+    connection_type: str,
+    channel: str,
+    resolution: Optional[str],
+    networking_defaults_file: str,
+    transmission_rate_defaults_file: str,
+    end_user_device_defaults_file: str,
+) -> tuple[Optional[str], float, float, float]:
+    """
+    Return the resolution of a session, the default resolution of its channel and device if
+    None, and its networking energy in kWh, device energy in kWh and production emissions in
+    gCO2e per second of streaming, NaN for rates of templates missing from the defaults
+    """
+    network_kwh_per_second = numpy.nan
+    if defaults_registry.has_template(connection_type, networking_defaults_file):
+        networking = NetworkingConnection.load_default_yaml(
+            connection_type, networking_defaults_file
+        )
+        if resolution is None:
+            qualities = networking.transmission_rate_quality_per_channel_per_device or {}
+            resolution = qualities.get(channel, {}).get(device)
+        if resolution is not None and defaults_registry.has_template(
+            resolution, transmission_rate_defaults_file, channel
+        ):
+            transmission_rate = TransmissionRate.load_default_yaml(
+                resolution, transmission_rate_defaults_file, channel
+            )
+            modeled_networking = networking.model_device_power_model(
+                device, connection_type, transmission_rate, channel
+            )
+            if (
+                modeled_networking is not None
+                and modeled_networking.power_model_energy_usage_kwh_per_second is not None
+            ):
+                network_kwh_per_second = float(
+                    modeled_networking.power_model_energy_usage_kwh_per_second
+                )
+
+    device_kwh_per_second = production_gco2e_per_second = numpy.nan
+    if defaults_registry.has_template(device, end_user_device_defaults_file):
+        end_user_device = EndUserDevice.load_default_yaml(device, end_user_device_defaults_file)
+        device_kwh_per_second = float(end_user_device.compute_power_emissions_kwh_per_second())
+        production_gco2e_per_second = float(
+            resolve_inputs(end_user_device).production_emissions_gco2e_per_duration_s
+        )
+    return resolution, network_kwh_per_second, device_kwh_per_second, production_gco2e_per_second
+
+
+def factorize(values: Any) -> tuple[list[Optional[str]], Any]:
+    """
+    Return the distinct values of a column, in order of first appearance, and the index of
+    the value of each row among them
+    """
+    # Key: a distinct value of the column
+    # Value: its index among the distinct values
+    indexes: dict[Any, int] = {}
+    codes = numpy.fromiter(
+        (indexes.setdefault(value, len(indexes)) for value in values), dtype=numpy.int64
+    )
+    return list(indexes), codes
+
+
+def model_sessions(
+    columns: dict[str, Any],
+    networking_defaults_file: str,
+    transmission_rate_defaults_file: str,
+    end_user_device_defaults_file: str,
+) -> ModeledRecords[ModeledStreamingSession]:
+    """
+    Model streaming sessions, for columns holding a sequence or array of values per
+    SESSION_COLUMNS, one value per session. Sessions without a connection type have the
+    unknown connection type, and sessions without resolution the default resolution of their
+    channel and device. The energy rates of each distinct device, connection type, channel
+    and resolution are computed once with the models, see session_rates, and multiplied by
+    the durations of their sessions. Results are float64, None where a rate can't be computed.
+    """
+    unknown = set(columns) - set(SESSION_COLUMNS)
+    if unknown:
+        raise Exception(f"unknown session columns: {', '.join(sorted(unknown))}")
+    missing = {"device", "channel", "duration_s"} - set(columns)
+    if missing:
+        raise Exception(f"sessions must have the columns {', '.join(sorted(missing))}")
+    rows = row_count(columns)
+    connection_types = [
+        "unknown" if connection_type is None else connection_type
+        for connection_type in columns.get("connection_type", [None] * rows)
+    ]
+    key_columns = {**columns, "connection_type": connection_types}
+    key_columns.setdefault("resolution", [None] * rows)
+
+    # Number the distinct combinations of key values of the sessions, see factorize
+    keys = [factorize(key_columns[name]) for name in KEY_COLUMNS]
+    codes = numpy.zeros(rows, dtype=numpy.int64)
+    for uniques, key_codes in keys:
+        codes = codes * len(uniques) + key_codes
+    combinations, rate_indexes = numpy.unique(codes, return_inverse=True)
+    rate_indexes = rate_indexes.reshape(-1)
+
+    resolutions: list[Optional[str]] = []
+    rates = numpy.empty((len(combinations), 3))
+    shape = tuple(len(uniques) for uniques, _ in keys)
+    for index, value_indexes in enumerate(zip(*numpy.unravel_index(combinations, shape))):
+        device, connection_type, channel, resolution = (
+            uniques[value_index] for (uniques, _), value_index in zip(keys, value_indexes)
+        )
+        resolution, *session_energies = session_rates(
+            str(device),
+            str(connection_type),
+            str(channel),
+            None if resolution is None else str(resolution),
+            networking_defaults_file,
+            transmission_rate_defaults_file,
+            end_user_device_defaults_file,
+        )
+        resolutions.append(resolution)
+        rates[index] = session_energies
+
+    durations = column(columns["duration_s"])
+    energies = rates[rate_indexes] * durations[:, None]
+    return ModeledRecords.from_columns(
+        ModeledStreamingSession,
+        {
+            "device": list(columns["device"]),
+            "connection_type": connection_types,
+            "channel": list(columns["channel"]),
+            "resolution": numpy.asarray(resolutions, dtype=object)[rate_indexes].tolist(),
+            "duration_s": list(columns["duration_s"]),
+            "network_energy_kwh": to_values(energies[:, 0]),
+            "device_energy_kwh": to_values(energies[:, 1]),
+            "production_emissions_gco2e": to_values(energies[:, 2]),
+        },
+    )
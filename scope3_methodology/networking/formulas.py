@@ -0,0 +1,28 @@
+""" Formulas of the networking connection model, evaluated by its methods """
+from scope3_methodology.utils.constants import SEC_PER_HOUR
+from scope3_methodology.utils.formula import if_truthy, parameter
+
+transmission_rate_mbps = parameter("transmission_rate_mbps")
+power_model_constant_watt = parameter("power_model_constant_watt")
+power_model_variable_watt_per_mbps = parameter("power_model_variable_watt_per_mbps")
+
+# The parameters of the power model of a device, in the order evaluators take them
+POWER_MODEL_PARAMETERS = (
+    "transmission_rate_mbps",
+    "power_model_constant_watt",
+    "power_model_variable_watt_per_mbps",
+)
+
+# calculate_power_energy_usage_kwh_per_second, for the power model of a device, None
+# without a transmission rate
+power_model_energy_usage_kwh_per_second = if_truthy(
+    power_model_constant_watt,
+    if_truthy(
+        power_model_variable_watt_per_mbps,
+        (power_model_constant_watt + power_model_variable_watt_per_mbps * transmission_rate_mbps)
+        / 1000
+        / SEC_PER_HOUR,
+        None,
+    ),
+    None,
+)
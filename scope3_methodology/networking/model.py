@@ -5,11 +5,19 @@ from decimal import Decimal
 from typing import Optional
 
 from scope3_methodology.api.input_models import NetworkingConnectionType
+from scope3_methodology.networking import formulas
 from scope3_methodology.networking.transmission_rate_model import TransmissionRate
-from scope3_methodology.utils.custom_base_model import CustomBaseModel
+from scope3_methodology.utils.custom_base_model import CustomBaseModel, resolve_inputs
+from scope3_methodology.utils.formula import scalar_function
+from scope3_methodology.utils.modeled_records import modeled_record
 
+# The methods of NetworkingConnection, compiled from its formulas
+evaluate_power_energy_usage_kwh_per_second = scalar_function(
+    formulas.power_model_energy_usage_kwh_per_second, formulas.POWER_MODEL_PARAMETERS
+)
 
-@dataclass
+
+@modeled_record(frozen=True)
 class ModeledDeviceNetworking:
     """
     Modeled conventional networking information for a specific device and connection type
@@ -53,30 +61,33 @@ class NetworkingConnection(CustomBaseModel):
 
     def get_power_usage_kwh_per_gb(self, device: str):
         """Get the networking kwh_per_gb for a specific device"""
+        inputs = resolve_inputs(self)
         if (
-            self.conventional_model_kwh_per_gb_per_device
-            and device in self.conventional_model_kwh_per_gb_per_device
+            inputs.conventional_model_kwh_per_gb_per_device
+            and device in inputs.conventional_model_kwh_per_gb_per_device
         ):
-            return round(self.conventional_model_kwh_per_gb_per_device[device], 5)
-        return round(self.conventional_model_generic_kwh_per_gb, 5)
+            return round(inputs.conventional_model_kwh_per_gb_per_device[device], 5)
+        return round(inputs.conventional_model_generic_kwh_per_gb, 5)
 
     def get_power_model_constant_watt(self, device: str) -> Decimal | None:
         """Get the networking power_model_constant_watt for a specific device"""
+        inputs = resolve_inputs(self)
         if (
-            self.power_model_constant_watt_per_device
-            and device in self.power_model_constant_watt_per_device
+            inputs.power_model_constant_watt_per_device
+            and device in inputs.power_model_constant_watt_per_device
         ):
-            return self.power_model_constant_watt_per_device[device]
-        return self.power_model_constant_watt
+            return inputs.power_model_constant_watt_per_device[device]
+        return inputs.power_model_constant_watt
 
     def get_power_model_variable_watt_per_mbps(self, device: str) -> Decimal | None:
         """Get the networking power_model_variable_watt_per_mbps for a specific device"""
+        inputs = resolve_inputs(self)
         if (
-            self.power_model_variable_watt_per_mbps_per_device
-            and device in self.power_model_variable_watt_per_mbps_per_device
+            inputs.power_model_variable_watt_per_mbps_per_device
+            and device in inputs.power_model_variable_watt_per_mbps_per_device
         ):
-            return self.power_model_variable_watt_per_mbps_per_device[device]
-        return self.power_model_variable_watt_per_mbps
+            return inputs.power_model_variable_watt_per_mbps_per_device[device]
+        return inputs.power_model_variable_watt_per_mbps
 
     def calculate_power_energy_usage_kwh_per_second(
         self, device: str, quality_transmission_rate: Optional[TransmissionRate]
@@ -85,23 +96,14 @@ class NetworkingConnection(CustomBaseModel):
         power_model_constant_watt = self.get_power_model_constant_watt(device)
         power_model_variable_watt_per_mbps = self.get_power_model_variable_watt_per_mbps(device)
 
-        if (
-            quality_transmission_rate
-            and power_model_constant_watt
-            and power_model_variable_watt_per_mbps
-        ):
-            return (
-                (
-                    power_model_constant_watt
-                    + (
-                        power_model_variable_watt_per_mbps
-                        * quality_transmission_rate.transmission_rate_mbps
-                    )
-                )
-                / Decimal("1000")
-                / Decimal("3600")
-            )
-        return None
+        if not quality_transmission_rate:
+            return None
+        return evaluate_power_energy_usage_kwh_per_second(
+            None,
+            resolve_inputs(quality_transmission_rate).transmission_rate_mbps,
+            power_model_constant_watt,
+            power_model_variable_watt_per_mbps,
+        )
 
     def model_device_conventional_model(
         self,
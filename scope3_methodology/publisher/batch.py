@@ -0,0 +1,179 @@
+""" Batch engine modeling many publisher properties at once with NumPy """
+import csv
+from decimal import Decimal
+from typing import IO, Any, Optional
+
+import numpy
+
+from scope3_methodology.publisher.formulas import PROPERTY_FORMULAS
+from scope3_methodology.publisher.model import ModeledProperty, Property
+from scope3_methodology.utils.batch import evaluate_batch, row_count, to_values
+from scope3_methodology.utils.custom_base_model import get_field_metadata
+from scope3_methodology.utils.formula import column
+from scope3_methodology.utils.modeled_records import ModeledRecords
+from scope3_methodology.utils.utils import not_none
+
+# Columns of a batch that are not inputs of Property: the identifier of each property
+PROPERTY_COLUMNS = ("identifier",)
+# Columns of an inventory selecting the defaults of each property, see read_inventory_csv
+DEFAULTS_COLUMNS = ("template", "channel")
+# Results of model_property computed from the load time, None without it
+LOAD_TIME_OUTPUTS = (
+    "data_transfer_electricity_kwh",
+    "page_load_electricity_kwh",
+    "client_device_emissions_g_co2e_per_imp",
+)
+
+
+def model_properties(
+    defaults: Property, columns: dict[str, Any]
+) -> ModeledRecords[ModeledProperty]:
+    """
+    Model properties of one template and channel as model_property does, for columns holding
+    a sequence or array of values per Property input or PROPERTY_COLUMNS, one value per
+    property. The watts of each property are those of its environment. Inputs not provided
+    or None take their value from the defaults, or from the default of their field for
+    inputs not eligible for default. Results are float64, within the error of the float64
+    numeric backend, and None for properties model_property would fail to model.
+    """
+    unknown = set(columns) - set(get_field_metadata(Property).input_fields)
+    unknown -= set(PROPERTY_COLUMNS)
+    if unknown:
+        raise Exception(f"unknown property columns: {', '.join(sorted(unknown))}")
+    rows = row_count(columns)
+
+    environments = numpy.array(
+        [
+            "computer" if environment is None else str(environment).lower()
+            for environment in columns.get("environment", [None] * rows)
+        ],
+        dtype=object,
+    )
+    outputs = {name: numpy.full(rows, numpy.nan) for name in PROPERTY_FORMULAS["computer"].names}
+    # model_property models properties of an unknown environment without load time, the
+    # results not depending on the environment are those of any environment
+    unknown_environment = ~numpy.isin(environments, list(PROPERTY_FORMULAS))
+    for environment, formulas in PROPERTY_FORMULAS.items():
+        selected = environments == environment
+        if environment == "computer":
+            selected |= unknown_environment
+        if not selected.any():
+            continue
+        environment_columns = columns
+        if not selected.all():
+            environment_columns = {
+                name: numpy.asarray(values)[selected] for name, values in columns.items()
+            }
+            environment_columns["environment"] = environments[selected]
+        for name, results in evaluate_batch(formulas, defaults, environment_columns).items():
+            outputs[name][selected] = results
+    for name in LOAD_TIME_OUTPUTS:
+        outputs[name][unknown_environment] = numpy.nan
+
+    # model_property fails missing an input of a result, or for an unknown environment with
+    # load time
+    failed = numpy.isnan(outputs["impressions"])
+    failed |= numpy.isnan(outputs["corporate_emissions_g_co2e_per_impression"])
+    # load_time_s is not eligible for default, and None by default
+    load_time_s = column(columns.get("load_time_s", [None] * rows))
+    has_load_time = (load_time_s != 0) & ~numpy.isnan(load_time_s)
+    for name in LOAD_TIME_OUTPUTS:
+        failed |= has_load_time & numpy.isnan(outputs[name])
+
+    return ModeledRecords.from_columns(
+        ModeledProperty,
+        {
+            "identifier": columns.get("identifier", [""] * rows),
+            **{
+                name: to_values(numpy.where(failed, numpy.nan, results))
+                for name, results in outputs.items()
+            },
+        },
+    )
+
+
+def allocate_corporate_emissions(
+    properties: ModeledRecords[ModeledProperty],
+    corporate_emissions_g: Optional[Decimal] = None,
+    corporate_emissions_g_per_imp: Optional[Decimal] = None,
+) -> None:
+    """
+    Replace the corporate emissions per impression of the properties of a publisher with its
+    corporate emissions allocated to each property by its share of impressions, or with its
+    corporate emissions per impression, as set_corporate_emissions_g_co2e_per_impression does
+    """
+    if not corporate_emissions_g and not corporate_emissions_g_per_imp:
+        return
+    corporate_emissions = properties.column("corporate_emissions_g_co2e_per_impression")
+    impressions = column(properties.column("impressions"))
+    if corporate_emissions_g:
+        publisher_impressions = numpy.nansum(impressions)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            allocated = float(corporate_emissions_g) * impressions / publisher_impressions
+            corporate_emissions[:] = to_values(allocated / impressions)
+    else:
+        corporate_emissions[:] = [
+            None if property_impressions is None else float(not_none(corporate_emissions_g_per_imp))
+            for property_impressions in properties.column("impressions")
+        ]
+
+
+def read_inventory_csv(stream: IO[str]) -> dict[str, list[Any]]:
+    """
+    Read an inventory of properties, a CSV file with a header naming the columns: the
+    identifier, template and channel of each property and any of its Property inputs.
+    Returns a list per column, with empty values as None and numbers as Decimal.
+    """
+    text_columns = {*PROPERTY_COLUMNS, *DEFAULTS_COLUMNS, "environment"}
+    reader = csv.reader(stream)
+    names = next(reader)
+    columns: dict[str, list[Any]] = {name: [] for name in names}
+    values = list(columns.values())
+    for row in reader:
+        row += [""] * (len(names) - len(row))
+        for name, row_values, value in zip(names, values, row):
+            if not value:
+                row_values.append(None)
+            elif name in text_columns:
+                row_values.append(value)
+            else:
+                row_values.append(Decimal(value))
+    return columns
+
+
+def model_inventory(
+    columns: dict[str, list[Any]], defaults_file: str
+) -> ModeledRecords[ModeledProperty]:
+    """
+    Model an inventory of properties, with the columns of model_properties and the template
+    and channel of each property, modeling the properties of each template and channel at once
+    """
+    missing = set(DEFAULTS_COLUMNS) - set(columns)
+    if missing:
+        raise Exception(f"an inventory must have the columns {', '.join(DEFAULTS_COLUMNS)}")
+    rows = row_count(columns)
+    # Key: template and channel
+    # Value: the index of each property of the template and channel
+    groups: dict[tuple[str, str], list[int]] = {}
+    for index, key in enumerate(zip(columns["template"], columns["channel"])):
+        groups.setdefault(key, []).append(index)
+
+    property_columns = {
+        name: numpy.asarray(values, dtype=object)
+        for name, values in columns.items()
+        if name not in DEFAULTS_COLUMNS
+    }
+    modeled_columns = {name: [None] * rows for name in ModeledRecords(ModeledProperty).names}
+    for (template, channel), indexes in groups.items():
+        defaults = Property.load_default_yaml(str(template), defaults_file, str(channel))
+        group_columns = (
+            property_columns
+            if len(indexes) == rows
+            else {name: values[indexes] for name, values in property_columns.items()}
+        )
+        modeled = model_properties(defaults, group_columns)
+        for name, values in zip(modeled.names, modeled.columns):
+            modeled_column = modeled_columns[name]
+            for index, value in zip(indexes, values):
+                modeled_column[index] = value
+    return ModeledRecords.from_columns(ModeledProperty, modeled_columns)
@@ -0,0 +1,109 @@
+""" Formulas of the property model, evaluated by its methods and its batch engine """
+from scope3_methodology.utils.constants import MB_BYTES_PER_GB, SEC_PER_HOUR
+from scope3_methodology.utils.formula import (
+    Formula,
+    Formulas,
+    if_truthy,
+    logged,
+    model_input,
+    required,
+)
+
+# The property environments, each with its own active and idle electricity use
+ENVIRONMENTS = ("computer", "mobile", "tv")
+
+average_visit_duration_s = required(model_input("average_visit_duration_s"))
+load_time_s = model_input("load_time_s")
+
+# comp_ads_per_visit
+ads_per_visit = average_visit_duration_s * required(
+    model_input("quality_impressions_per_duration_s")
+)
+# comp_impressions
+impressions = required(model_input("visits_per_month")) * ads_per_visit
+# comp_active_page_load_time
+active_page_load_time = required(model_input("pages_per_visit")) * required(load_time_s)
+# comp_browse_time
+browse_time = average_visit_duration_s - active_page_load_time
+# comp_data_transfer_per_impression
+data_transfer_per_impression = required(model_input("page_size_mb")) / ads_per_visit
+# comp_end_user_data_transfer_electricty_per_mb
+end_user_data_transfer_electricity_per_mb = (
+    required(model_input("end_user_data_transfer_electricity_use_kwh_per_gb")) / MB_BYTES_PER_GB
+)
+# comp_core_internet_data_transfer_electricty_per_mb
+core_internet_data_transfer_electricity_per_mb = (
+    required(model_input("core_internet_data_transfer_electricity_use_kwh_per_gb"))
+    / MB_BYTES_PER_GB
+)
+# comp_electricity_per_mb
+electricity_per_mb = (
+    end_user_data_transfer_electricity_per_mb + core_internet_data_transfer_electricity_per_mb
+)
+# comp_data_transfer_electricity_kwh
+data_transfer_electricity_kwh = electricity_per_mb * data_transfer_per_impression
+
+
+def energy_from_page_load_wh(environment: str, depth: int) -> Formula:
+    """comp_energy_from_page_load_wh for a property environment"""
+    return logged(
+        (
+            active_page_load_time * model_input(f"{environment}_active_electricity_use_watts")
+            + browse_time * model_input(f"{environment}_idle_electricity_use_watts")
+        )
+        / SEC_PER_HOUR,
+        "page load electricity wh",
+        depth,
+    )
+
+
+def page_load_electricity_kwh(environment: str, depth: int) -> Formula:
+    """comp_page_load_electricity_kwh for a property environment"""
+    return energy_from_page_load_wh(environment, depth) / 1000 / ads_per_visit
+
+
+def client_device_emissions_g_co2e_per_impression(environment: str, depth: int) -> Formula:
+    """comp_client_device_emissions_g_co2e_per_impression for a property environment"""
+    return model_input("grid_intensity_g_co2e_per_kwh") * (
+        data_transfer_electricity_kwh + page_load_electricity_kwh(environment, depth)
+    )
+
+
+def property_formulas(environment: str) -> Formulas:
+    """
+    Return the formulas of model_property for a property environment, logged at the depth
+    the evaluator is called with. Each result computed from the load time is a branch of
+    its own, computing its intermediate results again as model_property always has.
+    """
+    return Formulas(
+        {
+            "impressions": logged(impressions, "impressions per month", 0),
+            "page_load_electricity_kwh": if_truthy(
+                load_time_s,
+                logged(page_load_electricity_kwh(environment, -2), "page_load_electricity_kwh", -1),
+                None,
+            ),
+            "data_transfer_electricity_kwh": if_truthy(
+                load_time_s,
+                logged(data_transfer_electricity_kwh, "data_transfer_electricity_kwh", -1),
+                None,
+            ),
+            "client_device_emissions_g_co2e_per_imp": if_truthy(
+                load_time_s,
+                logged(
+                    client_device_emissions_g_co2e_per_impression(environment, -2),
+                    "client_device_emissions_g_co2e_per_impression",
+                    0,
+                ),
+                None,
+            ),
+            "corporate_emissions_g_co2e_per_impression": model_input(
+                "corporate_emissions_g_co2e_per_impression"
+            ),
+        }
+    )
+
+
+# Key: property environment
+# Value: formulas of model_property in this environment
+PROPERTY_FORMULAS = {environment: property_formulas(environment) for environment in ENVIRONMENTS}
@@ -4,9 +4,53 @@ from decimal import Decimal
 from enum import Enum
 from typing import Optional
 
-from scope3_methodology.utils.constants import MB_BYTES_PER_GB, SEC_PER_HOUR
-from scope3_methodology.utils.custom_base_model import CustomBaseModel
-from scope3_methodology.utils.utils import log_result, not_none
+from scope3_methodology.publisher import formulas
+from scope3_methodology.utils.custom_base_model import (
+    CustomBaseModel,
+    memoized,
+    resolve_inputs,
+)
+from scope3_methodology.utils.derivation import trace_model
+from scope3_methodology.utils.formula import scalar_function
+from scope3_methodology.utils.modeled_records import modeled_record
+from scope3_methodology.utils.numeric import to_number
+from scope3_methodology.utils.utils import derivation_logging_enabled, log_result
+
+# The methods of Property, compiled from its formulas
+evaluate_ads_per_visit = scalar_function(formulas.ads_per_visit)
+evaluate_impressions = scalar_function(formulas.impressions)
+evaluate_active_page_load_time = scalar_function(formulas.active_page_load_time)
+evaluate_browse_time = scalar_function(formulas.browse_time)
+evaluate_data_transfer_per_impression = scalar_function(formulas.data_transfer_per_impression)
+evaluate_end_user_data_transfer_electricity_per_mb = scalar_function(
+    formulas.end_user_data_transfer_electricity_per_mb
+)
+evaluate_core_internet_data_transfer_electricity_per_mb = scalar_function(
+    formulas.core_internet_data_transfer_electricity_per_mb
+)
+evaluate_electricity_per_mb = scalar_function(formulas.electricity_per_mb)
+evaluate_data_transfer_electricity_kwh = scalar_function(formulas.data_transfer_electricity_kwh)
+
+# Key: property environment
+# Value: the method of Property in this environment, compiled from its formulas
+evaluate_energy_from_page_load_wh = {
+    environment: scalar_function(formulas.energy_from_page_load_wh(environment, 0))
+    for environment in formulas.ENVIRONMENTS
+}
+evaluate_page_load_electricity_kwh = {
+    environment: scalar_function(formulas.page_load_electricity_kwh(environment, 0))
+    for environment in formulas.ENVIRONMENTS
+}
+evaluate_client_device_emissions_g_co2e_per_impression = {
+    environment: scalar_function(
+        formulas.client_device_emissions_g_co2e_per_impression(environment, 0)
+    )
+    for environment in formulas.ENVIRONMENTS
+}
+evaluate_property = {
+    environment: property_formulas.scalar()
+    for environment, property_formulas in formulas.PROPERTY_FORMULAS.items()
+}
 
 
 class EnvironmentIdleElectricityUseWattFields(Enum):
@@ -25,7 +69,7 @@ class EnvironmentActiveElectricityUseWattFields(Enum):
     TV = "tv_active_electricity_use_watts"
 
 
-@dataclass
+@modeled_record()
 class ModeledProperty:
     """A modeled media property, representing a web site, mobile app, ctv channel, etc"""
 
@@ -41,14 +85,17 @@ class ModeledProperty:
     ) -> None:
         """Compute and set the corporate emissions per impression in grams CO2e"""
         if emissions_g:
-            self.corporate_emissions_g_co2e_per_impression = emissions_g / self.impressions
+            self.corporate_emissions_g_co2e_per_impression = (
+                to_number(emissions_g) / self.impressions
+            )
         else:
-            self.corporate_emissions_g_co2e_per_impression = emissions_g_per_imp
-        log_result(
-            f"{self.identifier} corporate emissions g co2e per impression",
-            self.corporate_emissions_g_co2e_per_impression,
-            1,
-        )
+            self.corporate_emissions_g_co2e_per_impression = to_number(emissions_g_per_imp)
+        if derivation_logging_enabled():
+            log_result(
+                f"{self.identifier} corporate emissions g co2e per impression",
+                self.corporate_emissions_g_co2e_per_impression,
+                1,
+            )
 
 
 @dataclass
@@ -112,33 +159,35 @@ class Property(CustomBaseModel):
         """Set defaults to be used as fallback in computations"""
         self.defaults = defaults
 
+    @memoized
     def comp_ads_per_visit(self) -> Decimal:
         """Compute the ads per visit"""
-        return not_none(self.average_visit_duration_s) * not_none(
-            self.quality_impressions_per_duration_s
-        )
+        return evaluate_ads_per_visit(resolve_inputs(self))
 
     def comp_impressions(self) -> Decimal:
         """Compute the impressions for the property"""
-        return not_none(self.visits_per_month) * not_none(self.comp_ads_per_visit())
+        return evaluate_impressions(resolve_inputs(self))
 
+    @memoized
     def comp_active_page_load_time(self) -> Decimal:
         """Compute active page load time"""
-        return not_none(self.pages_per_visit) * not_none(self.load_time_s)
+        return evaluate_active_page_load_time(resolve_inputs(self))
 
     def comp_browse_time(self) -> Decimal:
         """Compute browse time"""
-        return not_none(self.average_visit_duration_s) - self.comp_active_page_load_time()
+        return evaluate_browse_time(resolve_inputs(self))
 
     def get_environment_active_electricity_use_watts(self):
         """Return active electricity use in watts for property environment"""
-        env_field = EnvironmentActiveElectricityUseWattFields[self.environment.upper()].value
-        return getattr(self, env_field)
+        inputs = resolve_inputs(self)
+        env_field = EnvironmentActiveElectricityUseWattFields[inputs.environment.upper()].value
+        return getattr(inputs, env_field)
 
     def get_environment_idle_electricity_use_watts(self):
         """Return idle electricity use in watts for property environment"""
-        env_field = EnvironmentIdleElectricityUseWattFields[self.environment.upper()].value
-        return getattr(self, env_field)
+        inputs = resolve_inputs(self)
+        env_field = EnvironmentIdleElectricityUseWattFields[inputs.environment.upper()].value
+        return getattr(inputs, env_field)
 
     # get_energy_from_page_load
     def comp_energy_from_page_load_wh(
@@ -146,54 +195,42 @@ class Property(CustomBaseModel):
         depth: int,
     ) -> Decimal:
         """Compute the energy from page load wh"""
-        total_energy_wh = (
-            self.comp_active_page_load_time() * self.get_environment_active_electricity_use_watts()
-            + self.comp_browse_time() * self.get_environment_idle_electricity_use_watts()
-        ) / SEC_PER_HOUR
-        log_result("page load electricity wh", total_energy_wh, depth)
-
+        inputs = resolve_inputs(self)
         # TODO - add embodied emissions factor here
         # https://circularcomputing.com/news/carbon-footprint-laptop/
         # https://pics.uvic.ca/sites/default/files/uploads/publications/Teehan,%20P.%20Article,%202013%20%202.pdf
-        return total_energy_wh
+        return evaluate_energy_from_page_load_wh[inputs.environment.lower()](inputs, depth=depth)
 
     def comp_page_load_electricity_kwh(self, depth: int) -> Decimal:
         """Compute the page load electricity kwh"""
-        return (
-            self.comp_energy_from_page_load_wh(depth)
-            / Decimal("1000.0")
-            / self.comp_ads_per_visit()
-        )
+        inputs = resolve_inputs(self)
+        return evaluate_page_load_electricity_kwh[inputs.environment.lower()](inputs, depth=depth)
 
     def comp_data_transfer_per_impression(self) -> Decimal:
         """Compute the data transfer per impressions in mb per impression"""
-        return not_none(self.page_size_mb) / self.comp_ads_per_visit()
+        return evaluate_data_transfer_per_impression(resolve_inputs(self))
 
     def comp_end_user_data_transfer_electricty_per_mb(self) -> Decimal:
         """Compute the end user data transfer electricity per mb"""
-        return not_none(self.end_user_data_transfer_electricity_use_kwh_per_gb) / MB_BYTES_PER_GB
+        return evaluate_end_user_data_transfer_electricity_per_mb(resolve_inputs(self))
 
     def comp_core_internet_data_transfer_electricty_per_mb(self) -> Decimal:
         """Compute the core internet data transfer electricity per mb"""
-        return (
-            not_none(self.core_internet_data_transfer_electricity_use_kwh_per_gb) / MB_BYTES_PER_GB
-        )
+        return evaluate_core_internet_data_transfer_electricity_per_mb(resolve_inputs(self))
 
     def comp_electricity_per_mb(self) -> Decimal:
         """Compute the electricity per mb used by tne end user and core internet data"""
-        return (
-            self.comp_end_user_data_transfer_electricty_per_mb()
-            + self.comp_core_internet_data_transfer_electricty_per_mb()
-        )
+        return evaluate_electricity_per_mb(resolve_inputs(self))
 
     def comp_data_transfer_electricity_kwh(self) -> Decimal:
         """Compute the data transfer electricity in kwh"""
-        return self.comp_electricity_per_mb() * self.comp_data_transfer_per_impression()
+        return evaluate_data_transfer_electricity_kwh(resolve_inputs(self))
 
     def comp_client_device_emissions_g_co2e_per_impression(self, depth: int) -> Decimal:
         """Compute the client device emissions per impressions in grams CO2e"""
-        return self.grid_intensity_g_co2e_per_kwh * (
-            self.comp_data_transfer_electricity_kwh() + self.comp_page_load_electricity_kwh(depth)
+        inputs = resolve_inputs(self)
+        return evaluate_client_device_emissions_g_co2e_per_impression[inputs.environment.lower()](
+            inputs, depth=depth
         )
 
     def model_property(self, identifier: str, defaults: "Property", depth: int) -> ModeledProperty:
@@ -202,35 +239,28 @@ class Property(CustomBaseModel):
         :return: ModeledProperty
         """
         self.set_defaults(defaults)
+        inputs = resolve_inputs(self)
+        environment = inputs.environment.lower()
+        if environment not in evaluate_property and not inputs.load_time_s:
+            # Only the results computed from the load time depend on the environment
+            environment = formulas.ENVIRONMENTS[0]
 
         # TODO - simulate auctions to multiple ad tech partners w/ cookie syncs
-        impressions = self.comp_impressions()
-        log_result("impressions per month", impressions, 2)
-
-        page_load_electricity_kwh = None
-        data_transfer_electricity_kwh = None
-        client_device_emissions_g_co2e_per_imp = None
-        if self.load_time_s:
-            page_load_electricity_kwh = self.comp_page_load_electricity_kwh(depth)
-            log_result("page_load_electricity_kwh", page_load_electricity_kwh, 2)
-
-            data_transfer_electricity_kwh = self.comp_data_transfer_electricity_kwh()
-            log_result("data_transfer_electricity_kwh", data_transfer_electricity_kwh, 2)
-
-            client_device_emissions_g_co2e_per_imp = (
-                self.comp_client_device_emissions_g_co2e_per_impression(depth)
-            )
-            log_result(
-                "client_device_emissions_g_co2e_per_impression",
-                client_device_emissions_g_co2e_per_imp,
-                2,
-            )
+        (
+            impressions,
+            page_load_electricity_kwh,
+            data_transfer_electricity_kwh,
+            client_device_emissions_g_co2e_per_imp,
+            corporate_emissions_g_co2e_per_impression,
+        ) = evaluate_property[environment](inputs, depth=depth)
 
-        return ModeledProperty(
+        modeled_property = ModeledProperty(
             identifier,
             impressions,
             data_transfer_electricity_kwh,
             page_load_electricity_kwh,
             client_device_emissions_g_co2e_per_imp,
-            self.corporate_emissions_g_co2e_per_impression,
+            corporate_emissions_g_co2e_per_impression,
         )
+        trace_model(identifier, self)
+        return modeled_property
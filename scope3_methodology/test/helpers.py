@@ -0,0 +1,8 @@
+""" Helpers shared by the tests """
+from scope3_methodology.utils.yaml_helpers import yaml_load
+
+
+def templates(defaults_file: str) -> list[str]:
+    """Return the templates of a defaults file"""
+    with open(defaults_file, "r", encoding="UTF-8") as stream:
+        return list(yaml_load(stream)["defaults"])
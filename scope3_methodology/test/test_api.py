@@ -1,20 +1,34 @@
 """ Tests for API startup and endpoints """
 
+import shutil
+import tempfile
 import unittest
 from decimal import Decimal
+from unittest import mock
+
+from fastapi import HTTPException, Request
 
 from scope3_methodology.api.api import (
-    adtech_platform_defaults,
-    docs_defaults,
-    end_user_device_defaults,
+    atp_from_input,
+    calculate_atp_emissions,
+    calculate_atp_emissions_batch,
+    calculate_atp_emissions_sensitivity,
+    calculate_corporate_emissions,
+    calculate_corporate_emissions_sensitivity,
+    defaults_reloader,
+    etag_matches,
+    get_all_end_user_device_defaults,
     get_all_networking_connection_device_defaults,
+    get_defaults,
+    get_public_yaml_file_info,
     load_default_files,
-    organization_defaults,
-    property_defaults,
-    transmission_rate_defaults,
+    load_public_yaml_files,
+    reload_defaults,
 )
 from scope3_methodology.api.input_models import (
+    ATPInput,
     ATPTemplate,
+    CorporateInput,
     EndUserDevices,
     NetworkingConnectionType,
     OrganizationType,
@@ -22,6 +36,7 @@ from scope3_methodology.api.input_models import (
     StreamingResolution,
 )
 from scope3_methodology.networking.transmission_rate_model import TransmissionRate
+from scope3_methodology.utils.derivation import derivation_trace
 
 TEST_DEVICE_DEFAULTS_FILE = "defaults/end_user_device-defaults.yaml"
 TEST_PROPERTY_DEFAULTS_FILE = "defaults/property-defaults.yaml"
@@ -89,9 +104,28 @@ TEST_TRANSMISSION_RATE_DA_MEDIUM = TransmissionRate.load_default_yaml(
 class TestAPI(unittest.TestCase):
     """Test API startup and endpoints"""
 
+    def test_etag_matches(self):
+        """Test If-None-Match headers are matched against an ETag"""
+        self.assertTrue(etag_matches('"abc"', '"abc"'))
+        self.assertTrue(etag_matches('"xyz", W/"abc"', '"abc"'))
+        self.assertTrue(etag_matches("*", '"abc"'))
+        self.assertFalse(etag_matches('"xyz"', '"abc"'))
+        self.assertFalse(etag_matches(None, '"abc"'))
+
+    def test_public_yaml_files_scanned_once(self):
+        """Test public yaml files are scanned on first use only, even when there are none"""
+        load_public_yaml_files.cache_clear()
+        self.addCleanup(load_public_yaml_files.cache_clear)
+        with mock.patch(
+            "scope3_methodology.api.api.get_all_public_yaml_files", return_value={}
+        ) as get_all_public_yaml_files:
+            self.assertEqual(get_public_yaml_file_info(), {})
+            self.assertEqual(get_public_yaml_file_info(), {})
+        get_all_public_yaml_files.assert_called_once()
+
     def test_startup(self):
         """Test api startup loads defaults correctly"""
-        load_default_files(
+        defaults = load_default_files(
             TEST_ATP_DEFAULTS_FILE,
             TEST_ORGANIZATION_DEFAULTS_FILE,
             TEST_PROPERTY_DEFAULTS_FILE,
@@ -100,6 +134,13 @@ class TestAPI(unittest.TestCase):
             TEST_TRANSMISSION_RATE_DEFAULTS_FILE,
             TEST_DOCS_DEFAULTS_FILE,
         )
+        self.assertIs(get_defaults(), defaults)
+        organization_defaults = defaults.organization
+        adtech_platform_defaults = defaults.adtech_platform
+        property_defaults = defaults.property
+        end_user_device_defaults = defaults.end_user_device
+        transmission_rate_defaults = defaults.transmission_rate
+        docs_defaults = defaults.docs
 
         # verify the correct count and a field that should be different across
         # all the different default types
@@ -242,6 +283,268 @@ class TestAPI(unittest.TestCase):
         docs_defs = docs_defaults
         self.assertEqual(len(docs_defs), 128)
 
+    def test_calculate_explain(self):
+        """Test explain=true returns the same result with the inputs and derivation"""
+        load_default_files(
+            TEST_ATP_DEFAULTS_FILE,
+            TEST_ORGANIZATION_DEFAULTS_FILE,
+            TEST_PROPERTY_DEFAULTS_FILE,
+            TEST_DEVICE_DEFAULTS_FILE,
+            TEST_NETWORKING_DEFAULTS_FILE,
+            TEST_TRANSMISSION_RATE_DEFAULTS_FILE,
+            TEST_DOCS_DEFAULTS_FILE,
+        )
+        corporate_input = CorporateInput(org_type=OrganizationType.GENERIC, number_of_employees=100)
+        result = calculate_corporate_emissions(corporate_input)
+        explained = calculate_corporate_emissions(corporate_input, explain=True)
+        self.assertEqual(explained["result"], result)
+        [model] = explained["explain"]
+        self.assertIn(
+            {"name": "number_of_employees", "value": 100, "source": "input", "depth": 0},
+            model["inputs"],
+        )
+        self.assertEqual(
+            [step["name"] for step in model["derivation"]],
+            [
+                "corporate emissions mt co2e per month",
+                "total corporate emissions g co2e per month",
+                "digital ads allocation of corporate emissions g co2e per month",
+            ],
+        )
+        self.assertEqual(
+            model["derivation"][1]["value"], result.total_corporate_emissions_g_co2e_per_month
+        )
+
+        atp_input = ATPInput(name="x", identifier="x", atp_template=ATPTemplate.DSP)
+        explained = calculate_atp_emissions(atp_input, explain=True)
+        self.assertEqual(explained["result"], calculate_atp_emissions(atp_input))
+        [model] = explained["explain"]
+        self.assertEqual(model["name"], "x")
+        primary = model["derivation"][0]
+        self.assertEqual(primary["name"], "primary emissions g co2e per bid request")
+        self.assertEqual(primary["value"], explained["result"].primary_bid_request_emissions_g_co2e)
+        self.assertEqual(
+            [step["name"] for step in primary["children"]],
+            [
+                "data transfer emissions g co2e per bid request",
+                "server emissions g co2e per bid request",
+            ],
+        )
+
+    def test_calculate_atp_specialised(self):
+        """Test the primary emissions endpoint models as model_product with its template"""
+        defaults = load_default_files(
+            TEST_ATP_DEFAULTS_FILE,
+            TEST_ORGANIZATION_DEFAULTS_FILE,
+            TEST_PROPERTY_DEFAULTS_FILE,
+            TEST_DEVICE_DEFAULTS_FILE,
+            TEST_NETWORKING_DEFAULTS_FILE,
+            TEST_TRANSMISSION_RATE_DEFAULTS_FILE,
+            TEST_DOCS_DEFAULTS_FILE,
+        )
+        for template in ATPTemplate:
+            for atp_input in [
+                ATPInput(name="x", identifier="x", atp_template=template),
+                ATPInput(
+                    name="y",
+                    identifier="y",
+                    atp_template=template,
+                    corporate_emissions_g_co2e=Decimal("123456789"),
+                    server_emissions_mt_co2e_per_month=Decimal("12.5"),
+                    data_transfer_emissions_mt_co2e_per_month=Decimal("3"),
+                ),
+            ]:
+                with self.subTest(template=template, name=atp_input.name):
+                    explained = calculate_atp_emissions(atp_input, explain=True)
+                    with derivation_trace() as trace:
+                        expected = atp_from_input(atp_input).model_product(
+                            atp_input.name,
+                            atp_input.identifier,
+                            defaults.adtech_platform[template],
+                            [],
+                            atp_input.corporate_emissions_g_co2e,
+                        )
+                    self.assertEqual(explained["result"], expected)
+                    self.assertEqual(explained["explain"], trace.to_dict())
+
+    def test_calculate_sensitivity(self):
+        """Test the sensitivity endpoints return the same result with its partial derivatives"""
+        load_default_files(
+            TEST_ATP_DEFAULTS_FILE,
+            TEST_ORGANIZATION_DEFAULTS_FILE,
+            TEST_PROPERTY_DEFAULTS_FILE,
+            TEST_DEVICE_DEFAULTS_FILE,
+            TEST_NETWORKING_DEFAULTS_FILE,
+            TEST_TRANSMISSION_RATE_DEFAULTS_FILE,
+            TEST_DOCS_DEFAULTS_FILE,
+        )
+        corporate_input = CorporateInput(org_type=OrganizationType.GENERIC, number_of_employees=100)
+        response = calculate_corporate_emissions_sensitivity(corporate_input)
+        self.assertEqual(response["result"], calculate_corporate_emissions(corporate_input))
+        total = response["sensitivity"]["total_corporate_emissions_g_co2e_per_month"]
+        self.assertEqual(
+            total["value"], response["result"].total_corporate_emissions_g_co2e_per_month
+        )
+        # 100 employees, in g per mt
+        self.assertEqual(
+            total["partials"]["office_emissions_mt_co2e_per_employee_per_month"], 100 * 1000000
+        )
+
+        atp_input = ATPInput(
+            name="x",
+            identifier="x",
+            atp_template=ATPTemplate.DSP,
+            bid_requests_processed_billion_per_month=Decimal("25"),
+        )
+        response = calculate_atp_emissions_sensitivity(atp_input)
+        self.assertEqual(response["result"], calculate_atp_emissions(atp_input))
+        primary = response["sensitivity"]["primary_bid_request_emissions_g_co2e"]
+        self.assertEqual(primary["value"], response["result"].primary_bid_request_emissions_g_co2e)
+        self.assertEqual(primary["partials"]["corporate_emissions_g_co2e_per_bid_request"], 1)
+        self.assertEqual(primary["partials"]["cookie_syncs_processed_per_bid_request"], 0)
+        self.assertLess(primary["partials"]["bid_requests_processed_billion_per_month"], 0)
+
+    def test_calculate_atp_batch(self):
+        """Test the batch endpoint models each platform as the primary emissions endpoint"""
+        load_default_files(
+            TEST_ATP_DEFAULTS_FILE,
+            TEST_ORGANIZATION_DEFAULTS_FILE,
+            TEST_PROPERTY_DEFAULTS_FILE,
+            TEST_DEVICE_DEFAULTS_FILE,
+            TEST_NETWORKING_DEFAULTS_FILE,
+            TEST_TRANSMISSION_RATE_DEFAULTS_FILE,
+            TEST_DOCS_DEFAULTS_FILE,
+        )
+        atp_inputs = [
+            ATPInput(
+                name=f"atp {index}",
+                identifier=f"atp{index}.com",
+                atp_template=template,
+                bid_requests_processed_billion_per_month=Decimal(25 + index),
+                corporate_emissions_g_co2e=Decimal("123456789") if index % 2 else None,
+                allocation_of_company_servers_pct=Decimal("0") if index % 3 else None,
+            )
+            for index, template in enumerate([ATPTemplate.DSP, ATPTemplate.SSP] * 3)
+        ]
+        results = calculate_atp_emissions_batch(atp_inputs)
+        for atp_input, result in zip(atp_inputs, results):
+            expected = calculate_atp_emissions(atp_input)
+            with self.subTest(name=atp_input.name):
+                self.assertEqual(result.name, expected.name)
+                self.assertEqual(result.identifier, expected.identifier)
+                self.assertAlmostEqual(
+                    result.primary_bid_request_emissions_g_co2e
+                    / float(expected.primary_bid_request_emissions_g_co2e),
+                    1,
+                    places=9,
+                )
+                self.assertAlmostEqual(
+                    result.corporate_emissions_g_co2e_per_bid_request
+                    / float(expected.corporate_emissions_g_co2e_per_bid_request),
+                    1,
+                    places=9,
+                )
+
+    def test_get_all_end_user_device_defaults(self):
+        """Test every device is modeled for every channel with quality impressions"""
+        load_default_files(
+            TEST_ATP_DEFAULTS_FILE,
+            TEST_ORGANIZATION_DEFAULTS_FILE,
+            TEST_PROPERTY_DEFAULTS_FILE,
+            TEST_DEVICE_DEFAULTS_FILE,
+            TEST_NETWORKING_DEFAULTS_FILE,
+            TEST_TRANSMISSION_RATE_DEFAULTS_FILE,
+            TEST_DOCS_DEFAULTS_FILE,
+        )
+        defaults = get_defaults()
+        expected = [
+            device_defaults.model_end_user_device(
+                device.value,
+                channel.value,
+                "generic",
+                channel_defaults.quality_impressions_per_duration_s,
+            )
+            for device, device_defaults in defaults.end_user_device.items()
+            for channel, channel_defaults in defaults.property.items()
+            if channel_defaults.quality_impressions_per_duration_s
+        ]
+        self.assertEqual(get_all_end_user_device_defaults(), expected)
+
+    def test_reload_defaults(self):
+        """Test reloading swaps in a new snapshot only when a defaults file changed"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        files = []
+        for file in [
+            TEST_ATP_DEFAULTS_FILE,
+            TEST_ORGANIZATION_DEFAULTS_FILE,
+            TEST_PROPERTY_DEFAULTS_FILE,
+            TEST_DEVICE_DEFAULTS_FILE,
+            TEST_NETWORKING_DEFAULTS_FILE,
+            TEST_TRANSMISSION_RATE_DEFAULTS_FILE,
+            TEST_DOCS_DEFAULTS_FILE,
+        ]:
+            files.append(shutil.copy(file, directory))
+        defaults = load_default_files(*files)
+        self.assertFalse(defaults_reloader.reload())
+        self.assertIs(get_defaults(), defaults)
+
+        with self.assertRaises(TypeError):
+            defaults.docs["added"] = True  # type: ignore
+
+        with open(files[3], "r", encoding="UTF-8") as stream:
+            content = stream.read()
+        with open(files[3], "w", encoding="UTF-8") as stream:
+            stream.write(content.replace("draw_watts: 0.77", "draw_watts: 0.88"))
+        self.assertTrue(defaults_reloader.reload())
+        reloaded = get_defaults()
+        self.assertEqual(reloaded.version, defaults.version + 1)
+        self.assertEqual(
+            reloaded.end_user_device[EndUserDevices.SMARTPHONE].draw_watts, Decimal("0.88")
+        )
+        # the previous snapshot is left untouched for requests still holding it
+        self.assertEqual(
+            defaults.end_user_device[EndUserDevices.SMARTPHONE].draw_watts, Decimal("0.77")
+        )
+
+        # a broken file keeps the current snapshot
+        with open(files[3], "w", encoding="UTF-8") as stream:
+            stream.write("defaults: [")
+        with self.assertRaises(Exception):
+            defaults_reloader.reload()
+        self.assertIs(get_defaults(), reloaded)
+
+    def test_reload_defaults_admin_token(self):
+        """Test the reload endpoint requires ADMIN_TOKEN to be set, and sent as a header"""
+        defaults = load_default_files(
+            TEST_ATP_DEFAULTS_FILE,
+            TEST_ORGANIZATION_DEFAULTS_FILE,
+            TEST_PROPERTY_DEFAULTS_FILE,
+            TEST_DEVICE_DEFAULTS_FILE,
+            TEST_NETWORKING_DEFAULTS_FILE,
+            TEST_TRANSMISSION_RATE_DEFAULTS_FILE,
+            TEST_DOCS_DEFAULTS_FILE,
+        )
+
+        def request(token: str | None = None) -> Request:
+            headers = [] if token is None else [(b"x-admin-token", token.encode())]
+            return Request({"type": "http", "headers": headers})
+
+        with mock.patch.dict("os.environ", {}, clear=True):
+            with self.assertRaises(HTTPException) as context:
+                reload_defaults(request("secret"), force=True)
+            self.assertEqual(context.exception.status_code, 403)
+        with mock.patch.dict("os.environ", {"ADMIN_TOKEN": "secret"}):
+            for token in [None, "wrong"]:
+                with self.assertRaises(HTTPException) as context:
+                    reload_defaults(request(token), force=True)
+                self.assertEqual(context.exception.status_code, 403)
+            self.assertIs(get_defaults(), defaults)
+            self.assertEqual(
+                reload_defaults(request("secret"), force=True),
+                {"reloaded": True, "version": defaults.version + 1},
+            )
+
     def test_get_all_con_networking_connection_device_fixed_defaults(self):
         """Test get_all_networking_connection_device_defaults returns expected output"""
         load_default_files(
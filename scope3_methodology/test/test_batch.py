@@ -0,0 +1,391 @@
+""" Tests for the batch engines, batch results against the scalar models """
+import io
+import math
+import unittest
+from decimal import Decimal
+from typing import Any, Optional
+from unittest import mock
+
+from scope3_methodology.ad_tech_platform.batch import PRODUCT_COLUMNS, model_products
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.end_user_device.batch import model_end_user_devices
+from scope3_methodology.end_user_device.model import EndUserDevice
+from scope3_methodology.networking.batch import model_sessions
+from scope3_methodology.networking.model import NetworkingConnection
+from scope3_methodology.networking.transmission_rate_model import TransmissionRate
+from scope3_methodology.publisher.batch import (
+    allocate_corporate_emissions,
+    model_inventory,
+    model_properties,
+    read_inventory_csv,
+)
+from scope3_methodology.publisher.model import Property
+from scope3_methodology.test.helpers import templates
+from scope3_methodology.utils.numeric import numeric_backend
+
+ATP_DEFAULTS_FILE = "defaults/atp-defaults.yaml"
+PROPERTY_DEFAULTS_FILE = "defaults/property-defaults.yaml"
+NETWORKING_DEFAULTS_FILE = "defaults/networking-defaults.yaml"
+TRANSMISSION_RATE_DEFAULTS_FILE = "defaults/transmission_rate-defaults.yaml"
+END_USER_DEVICE_DEFAULTS_FILE = "defaults/end_user_device-defaults.yaml"
+SESSION_DEFAULTS_FILES = (
+    NETWORKING_DEFAULTS_FILE,
+    TRANSMISSION_RATE_DEFAULTS_FILE,
+    END_USER_DEVICE_DEFAULTS_FILE,
+)
+
+# float64 batch results against the Decimal models, see test_numeric
+MAX_RELATIVE_ERROR = 1e-9
+
+
+def cycle(values: list[Any], rows: int) -> list[Any]:
+    """Return values repeated over rows"""
+    return [values[row % len(values)] for row in range(rows)]
+
+
+class BatchTestCase(unittest.TestCase):
+    """Test case comparing batch results with the results of the models"""
+
+    def assert_close(self, value: Any, expected: Optional[Decimal]) -> None:
+        """Test a float64 batch result against a Decimal result"""
+        if expected is None:
+            self.assertIsNone(value)
+        else:
+            self.assertTrue(
+                math.isclose(value, float(expected), rel_tol=MAX_RELATIVE_ERROR),
+                f"{value} != {expected}",
+            )
+
+
+class TestAdTechPlatformBatch(BatchTestCase):
+    """Test model_products against model_product"""
+
+    def test_parity(self):
+        """Test each product of a batch is modeled as model_product models it"""
+        rows = 24
+        columns = {
+            "name": [f"product {row}" for row in range(rows)],
+            "bid_requests_processed_billion_per_month": cycle(
+                [Decimal("25"), Decimal("0.5"), None, Decimal("310")], rows
+            ),
+            "server_emissions_mt_co2e_per_month": cycle([None, Decimal("3583")], rows),
+            "depreciation_dollars_per_month": cycle(
+                [None, None, Decimal("7366833.33"), Decimal("0")], rows
+            ),
+            "cookie_syncs_processed_billion_per_month": cycle([None, Decimal("12.5"), None], rows),
+            "data_transfer_emissions_mt_co2e_per_month": cycle([None, None, Decimal("42")], rows),
+            "servers_processing_bid_requests_pct": cycle([Decimal("50"), None, None], rows),
+            "allocation_of_corporate_emissions_pct": cycle([Decimal("100"), Decimal("35")], rows),
+            "corporate_emissions_g": cycle([None, None, Decimal("123456789.5")], rows),
+            "corporate_emissions_g_per_bid_request": cycle([None, Decimal("0.00002"), None], rows),
+        }
+        for template in templates(ATP_DEFAULTS_FILE):
+            defaults = AdTechPlatform.load_default_yaml(template, ATP_DEFAULTS_FILE)
+            modeled = list(model_products(defaults, columns))
+            for row in range(rows):
+                inputs = {
+                    name: values[row]
+                    for name, values in columns.items()
+                    if name not in PRODUCT_COLUMNS
+                }
+                expected = AdTechPlatform(**inputs).model_product(
+                    columns["name"][row],
+                    "",
+                    defaults,
+                    [],
+                    corporate_emissions_g=columns["corporate_emissions_g"][row],
+                    corporate_emissions_g_per_bid_request=columns[
+                        "corporate_emissions_g_per_bid_request"
+                    ][row],
+                )
+                with self.subTest(template=template, row=row):
+                    self.assertEqual(modeled[row].name, expected.name)
+                    for name in (
+                        "primary_bid_request_emissions_g_co2e",
+                        "primary_cookie_sync_emissions_g_co2e",
+                        "corporate_emissions_g_co2e_per_bid_request",
+                        "cookie_sync_distribution_ratio",
+                        "atp_block_rate",
+                        "publisher_block_rate",
+                    ):
+                        self.assert_close(getattr(modeled[row], name), getattr(expected, name))
+
+    def test_failures(self):
+        """Test products model_product fails to model have no results"""
+        defaults = AdTechPlatform.load_default_yaml("dsp", ATP_DEFAULTS_FILE)
+        columns = {
+            "bid_requests_processed_billion_per_month": [Decimal("0"), Decimal("25")],
+            "corporate_emissions_g": [Decimal("123456789.5"), Decimal("123456789.5")],
+        }
+        with self.assertRaises(Exception):
+            AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("0")).model_product(
+                "", "", defaults, [], corporate_emissions_g=Decimal("123456789.5")
+            )
+        failed, modeled = model_products(defaults, columns)
+        self.assertIsNone(failed.primary_bid_request_emissions_g_co2e)
+        self.assertIsNotNone(modeled.primary_bid_request_emissions_g_co2e)
+        with self.assertRaises(Exception):
+            model_products(defaults, {"bid_requests": [Decimal("25")]})
+        with self.assertRaises(Exception):
+            model_products(defaults, {**columns, "name": ["product"]})
+
+
+class TestPropertyBatch(BatchTestCase):
+    """Test model_properties against model_property"""
+
+    def test_parity(self):
+        """Test each property of a batch is modeled as model_property models it"""
+        rows = 30
+        columns = {
+            "identifier": [f"property{row}.com" for row in range(rows)],
+            "environment": cycle(["computer", "mobile", None, "TV", "console"], rows),
+            "grid_intensity_g_co2e_per_kwh": cycle([Decimal("417"), None], rows),
+            "visits_per_month": cycle([Decimal("1000"), Decimal("25000"), Decimal("0")], rows),
+            "average_visit_duration_s": cycle([Decimal("60"), Decimal("182.5")], rows),
+            "pages_per_visit": cycle([Decimal("3"), Decimal("1"), None, Decimal("7")], rows),
+            "load_time_s": cycle([Decimal("2"), None, Decimal("0.8")], rows),
+            "page_size_mb": cycle([Decimal("3"), Decimal("0.75")], rows),
+            "mobile_active_electricity_use_watts": cycle([None, Decimal("2.5")], rows),
+            "mobile_idle_electricity_use_watts": cycle([None, None, Decimal("1")], rows),
+            "tv_active_electricity_use_watts": cycle([Decimal("100"), None], rows),
+            "tv_idle_electricity_use_watts": cycle([Decimal("60")], rows),
+        }
+        for channel in templates(PROPERTY_DEFAULTS_FILE):
+            defaults = Property.load_default_yaml("generic", PROPERTY_DEFAULTS_FILE, channel)
+            modeled = list(model_properties(defaults, columns))
+            for row in range(rows):
+                inputs = {
+                    name: values[row]
+                    for name, values in columns.items()
+                    if name != "identifier" and values[row] is not None
+                }
+                try:
+                    expected = Property(**inputs).model_property(
+                        columns["identifier"][row], defaults, 0
+                    )
+                except Exception:  # pylint: disable=broad-except
+                    expected = None
+                with self.subTest(channel=channel, row=row):
+                    self.assertEqual(modeled[row].identifier, columns["identifier"][row])
+                    for name in (
+                        "impressions",
+                        "data_transfer_electricity_kwh",
+                        "page_load_electricity_kwh",
+                        "client_device_emissions_g_co2e_per_imp",
+                        "corporate_emissions_g_co2e_per_impression",
+                    ):
+                        self.assert_close(
+                            getattr(modeled[row], name),
+                            None if expected is None else getattr(expected, name),
+                        )
+
+    def test_allocate_corporate_emissions(self):
+        """Test corporate emissions are allocated as the publisher CLI allocates them"""
+        defaults = Property.load_default_yaml("generic", PROPERTY_DEFAULTS_FILE, "display-web")
+        visits = [Decimal("1000"), Decimal("25000"), Decimal("70")]
+        for corporate_emissions_g, corporate_emissions_g_per_imp in (
+            (Decimal("123456789.5"), None),
+            (None, Decimal("0.02")),
+        ):
+            expected = [
+                Property(
+                    visits_per_month=visits_per_month, average_visit_duration_s=Decimal("60")
+                ).model_property("", defaults, 0)
+                for visits_per_month in visits
+            ]
+            publisher_impressions = sum(modeled.impressions for modeled in expected)
+            for modeled in expected:
+                modeled.set_corporate_emissions_g_co2e_per_impression(
+                    corporate_emissions_g
+                    and corporate_emissions_g * modeled.impressions / publisher_impressions,
+                    corporate_emissions_g_per_imp,
+                )
+            properties = model_properties(
+                defaults,
+                {"visits_per_month": visits, "average_visit_duration_s": [Decimal("60")] * 3},
+            )
+            allocate_corporate_emissions(
+                properties, corporate_emissions_g, corporate_emissions_g_per_imp
+            )
+            for modeled, expected_property in zip(properties, expected):
+                self.assert_close(
+                    modeled.corporate_emissions_g_co2e_per_impression,
+                    expected_property.corporate_emissions_g_co2e_per_impression,
+                )
+
+    def test_inventory(self):
+        """Test an inventory is read and modeled per template and channel, in its order"""
+        columns = read_inventory_csv(
+            io.StringIO(
+                "identifier,template,channel,environment,"
+                "visits_per_month,average_visit_duration_s\n"
+                "a.com,generic,display-web,,1000,60\n"
+                "b.tv,generic,ctv-bvod,tv,2000,3600\n"
+                "c.com,generic,display-web,mobile,3000\n"
+            )
+        )
+        self.assertEqual(columns["environment"], [None, "tv", "mobile"])
+        self.assertEqual(
+            columns["average_visit_duration_s"], [Decimal("60"), Decimal("3600"), None]
+        )
+        modeled = list(model_inventory(columns, PROPERTY_DEFAULTS_FILE))
+        self.assertEqual([row.identifier for row in modeled], ["a.com", "b.tv", "c.com"])
+        expected = Property(
+            environment="tv",
+            visits_per_month=Decimal("2000"),
+            average_visit_duration_s=Decimal("3600"),
+        ).model_property(
+            "b.tv", Property.load_default_yaml("generic", PROPERTY_DEFAULTS_FILE, "ctv-bvod"), 0
+        )
+        self.assert_close(modeled[1].impressions, expected.impressions)
+        self.assertIsNone(modeled[2].impressions)
+        with self.assertRaises(Exception):
+            model_inventory({"identifier": ["a.com"]}, PROPERTY_DEFAULTS_FILE)
+        with self.assertRaises(Exception):
+            model_properties(Property(), {"visits": [Decimal("1000")]})
+
+
+class TestSessionBatch(BatchTestCase):
+    """Test model_sessions against the networking and end user device models"""
+
+    def test_parity(self):
+        """Test the energy of each session is the energy per second of the models"""
+        rows = 40
+        columns = {
+            "device": cycle(["tv_system", "smartphone", "tablet", "personal_computer"], rows),
+            "connection_type": cycle(["fixed", "mobile", None], rows),
+            "channel": cycle(["ctv-bvod", "digital-audio", "streaming-video"], rows),
+            "resolution": cycle([None, "low", None, "high", None], rows),
+            "duration_s": cycle([Decimal("3600"), Decimal("42.5"), Decimal("0")], rows),
+        }
+        modeled = list(model_sessions(columns, *SESSION_DEFAULTS_FILES))
+        for row in range(rows):
+            device = columns["device"][row]
+            channel = columns["channel"][row]
+            connection_type = columns["connection_type"][row] or "unknown"
+            duration_s = columns["duration_s"][row]
+            networking = NetworkingConnection.load_default_yaml(
+                connection_type, NETWORKING_DEFAULTS_FILE
+            )
+            resolution = (
+                columns["resolution"][row]
+                or networking.transmission_rate_quality_per_channel_per_device[channel][device]
+            )
+            transmission_rate = TransmissionRate.load_default_yaml(
+                resolution, TRANSMISSION_RATE_DEFAULTS_FILE, channel
+            )
+            modeled_networking = networking.model_device_power_model(
+                device, connection_type, transmission_rate, channel
+            )
+            modeled_device = EndUserDevice.load_default_yaml(
+                device, END_USER_DEVICE_DEFAULTS_FILE
+            ).model_end_user_device(device, channel, "generic", Decimal("1"))
+            with self.subTest(row=row):
+                self.assertEqual(modeled[row].connection_type, connection_type)
+                self.assertEqual(modeled[row].resolution, resolution)
+                self.assert_close(
+                    modeled[row].network_energy_kwh,
+                    modeled_networking.power_model_energy_usage_kwh_per_second * duration_s,
+                )
+                self.assert_close(
+                    modeled[row].device_energy_kwh,
+                    modeled_device.power_kwh_per_second * duration_s,
+                )
+                self.assert_close(
+                    modeled[row].production_emissions_gco2e,
+                    modeled_device.production_gco2e_per_second * duration_s,
+                )
+
+    def test_missing_rates(self):
+        """Test sessions have no energy where the models can't compute their rates"""
+        unknown_device, unknown_resolution, no_duration = model_sessions(
+            {
+                "device": ["toaster", "tv_system", "tv_system"],
+                "channel": ["ctv-bvod", "ctv-bvod", "ctv-bvod"],
+                "resolution": [None, "8k", None],
+                "duration_s": [Decimal("60"), Decimal("60"), None],
+            },
+            *SESSION_DEFAULTS_FILES,
+        )
+        self.assertIsNone(unknown_device.resolution)
+        self.assertIsNone(unknown_device.network_energy_kwh)
+        self.assertIsNone(unknown_device.device_energy_kwh)
+        self.assertIsNone(unknown_resolution.network_energy_kwh)
+        self.assertIsNotNone(unknown_resolution.device_energy_kwh)
+        self.assertEqual(no_duration.resolution, "ultra")
+        self.assertIsNone(no_duration.production_emissions_gco2e)
+        with self.assertRaises(Exception):
+            model_sessions({"device": ["tv_system"], "duration": [60]}, *SESSION_DEFAULTS_FILES)
+
+    def test_zero_rates(self):
+        """Test sessions with a zero energy rate have zero energy rather than no energy"""
+        with mock.patch.object(
+            NetworkingConnection,
+            "calculate_power_energy_usage_kwh_per_second",
+            return_value=Decimal("0"),
+        ):
+            (session,) = model_sessions(
+                {"device": ["tv_system"], "channel": ["ctv-bvod"], "duration_s": [Decimal("60")]},
+                *SESSION_DEFAULTS_FILES,
+            )
+        self.assertEqual(session.network_energy_kwh, Decimal("0"))
+
+    def test_unreadable_defaults(self):
+        """Test defaults files that can't be read raise instead of giving sessions no energy"""
+        with self.assertRaises(FileNotFoundError):
+            model_sessions(
+                {"device": ["tv_system"], "channel": ["ctv-bvod"], "duration_s": [Decimal("60")]},
+                "missing.yaml",
+                *SESSION_DEFAULTS_FILES[1:],
+            )
+
+
+class TestEndUserDeviceBatch(BatchTestCase):
+    """Test model_end_user_devices against model_end_user_device"""
+
+    def setUp(self):
+        self.devices = {
+            device: EndUserDevice.load_default_yaml(device, END_USER_DEVICE_DEFAULTS_FILE)
+            for device in templates(END_USER_DEVICE_DEFAULTS_FILE)
+        }
+        self.rates = {
+            channel: Property.load_default_yaml(
+                "generic", PROPERTY_DEFAULTS_FILE, channel
+            ).quality_impressions_per_duration_s
+            for channel in templates(PROPERTY_DEFAULTS_FILE)
+        }
+        self.rates["no-impressions"] = None
+
+    def expected(self) -> list[Any]:
+        """Return model_end_user_device of each device and channel, device by device"""
+        return [
+            device.model_end_user_device(name, channel, "generic", rate)
+            for name, device in self.devices.items()
+            for channel, rate in self.rates.items()
+            if rate
+        ]
+
+    def test_decimal(self):
+        """Test the matrix holds exactly the Decimal results of the model"""
+        matrix = model_end_user_devices(self.devices, self.rates)
+        self.assertEqual(matrix.devices, tuple(self.devices))
+        self.assertNotIn("no-impressions", matrix.channels)
+        self.assertEqual(list(matrix.records("generic")), self.expected())
+
+    def test_float64(self):
+        """Test the matrix is computed in the active numeric backend"""
+        expected = self.expected()
+        with numeric_backend("float64"):
+            modeled = list(model_end_user_devices(self.devices, self.rates).records("generic"))
+        self.assertEqual(len(modeled), len(expected))
+        for modeled_device, expected_device in zip(modeled, expected):
+            self.assertEqual(modeled_device.device, expected_device.device)
+            self.assertEqual(modeled_device.channel, expected_device.channel)
+            self.assert_close(modeled_device.power_kwh_per_imp, expected_device.power_kwh_per_imp)
+            self.assert_close(
+                modeled_device.production_gco2e_per_imp, expected_device.production_gco2e_per_imp
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+""" Tests for modeling the corporate emissions of a portfolio of organizations """
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from scope3_methodology.corporate import portfolio
+from scope3_methodology.corporate.model import CorporateEmissions
+from scope3_methodology.corporate.portfolio import find_company_files, model_portfolio
+from scope3_methodology.utils.public_yaml_files import PUBLIC_YAML_DIRECTORY
+from scope3_methodology.utils.utils import get_facts
+from scope3_methodology.utils.yaml_helpers import yaml_load
+
+TEST_DEFAULTS_FILE = "defaults/organization-defaults.yaml"
+
+PORTFOLIO = """
+organizations:
+  - name: Modeled
+    public_identifier: modeled
+    template: publisher
+    facts:
+      - number_of_employees: 1200
+  - name: Invalid
+    template: atp
+    facts:
+      - revenue_allocation_to_digital_ads_pct: 50
+  - public_identifier: unnamed
+  - name: Generic
+    facts:
+      - corporate_emissions_mt_co2e_per_month: 1000
+"""
+
+
+class TestCorporatePortfolio(unittest.TestCase):
+    """Test model_portfolio against comp_emissions_g_co2e_per_month"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.portfolio_file = os.path.join(directory.name, "portfolio.yaml")
+        with open(self.portfolio_file, "w", encoding="UTF-8") as stream:
+            stream.write(PORTFOLIO)
+        self.invalid_file = os.path.join(directory.name, "invalid.yaml")
+        with open(self.invalid_file, "w", encoding="UTF-8") as stream:
+            stream.write("- not a company file\n")
+
+    def test_company_files(self):
+        """Test each company is modeled as the corporate emissions script models it"""
+        files = find_company_files([PUBLIC_YAML_DIRECTORY])
+        self.assertIn(os.path.join(PUBLIC_YAML_DIRECTORY, "criteo", "corporate.yaml"), files)
+        organizations = model_portfolio(files, TEST_DEFAULTS_FILE)
+        self.assertEqual(len(organizations), len(files))
+        for file, organization in zip(files, organizations):
+            with open(file, "r", encoding="UTF-8") as stream:
+                document = yaml_load(stream)
+            with self.subTest(file=file):
+                self.assertEqual(organization.name, document["name"])
+                try:
+                    expected = CorporateEmissions(
+                        **get_facts(document["facts"])  # type: ignore
+                    ).comp_emissions_g_co2e_per_month(
+                        CorporateEmissions.load_default_yaml(
+                            document["template"], TEST_DEFAULTS_FILE
+                        ),
+                        0,
+                    )
+                except Exception:  # pylint: disable=broad-except
+                    self.assertIsNotNone(organization.error)
+                    continue
+                self.assertIsNone(organization.error)
+                assert expected is not None
+                self.assertEqual(
+                    organization.total_corporate_emissions_g_co2e_per_month,
+                    expected.total_corporate_emissions_g_co2e_per_month,
+                )
+                self.assertEqual(
+                    organization.digital_ads_allocation_corporate_emissions_g_co2e_per_month,
+                    expected.digital_ads_allocation_corporate_emissions_g_co2e_per_month,
+                )
+
+    def test_errors(self):
+        """Test organizations that can't be modeled have an error, and don't stop the run"""
+        modeled, invalid, unnamed, generic, invalid_file = model_portfolio(
+            [self.portfolio_file, self.invalid_file], TEST_DEFAULTS_FILE
+        )
+        self.assertIsNone(modeled.error)
+        self.assertIsNotNone(modeled.total_corporate_emissions_g_co2e_per_month)
+        self.assertRegex(str(invalid.error), "^Unable to compute corporate emissions")
+        self.assertIsNone(invalid.total_corporate_emissions_g_co2e_per_month)
+        self.assertEqual(unnamed.identifier, "unnamed")
+        self.assertEqual(unnamed.error, "No 'name' field found in company file")
+        self.assertEqual(generic.template, "generic")
+        self.assertIsNone(generic.error)
+        self.assertEqual(invalid_file.file, self.invalid_file)
+        self.assertIsNotNone(invalid_file.error)
+
+    def test_template(self):
+        """Test the given template replaces the template of every organization"""
+        organizations = model_portfolio([self.portfolio_file], TEST_DEFAULTS_FILE, "atp")
+        self.assertEqual(set(organizations.column("template")), {"atp"})
+
+    def test_parallel(self):
+        """Test a process pool returns the organizations in the same order as a serial run"""
+        files = find_company_files([PUBLIC_YAML_DIRECTORY]) + [self.portfolio_file]
+        expected = list(model_portfolio(files, TEST_DEFAULTS_FILE))
+        with mock.patch.object(portfolio, "PARALLEL_MIN_FILES", 1):
+            self.assertEqual(list(model_portfolio(files, TEST_DEFAULTS_FILE, workers=2)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+""" Tests for the custom base model """
+import pickle  # nosec - round trips a model built by the test
+import unittest
+from decimal import Decimal
+
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.networking.transmission_rate_model import TransmissionRate
+from scope3_methodology.utils.custom_base_model import (
+    get_field_metadata,
+    resolve_inputs,
+)
+from scope3_methodology.utils.numeric import numeric_backend
+
+
+class TestCustomBaseModel(unittest.TestCase):
+    """Test CustomBaseModel functions"""
+
+    def test_default_fields(self):
+        """Test default fields are the fields eligible for default in declaration order"""
+        self.assertEqual(
+            AdTechPlatform.default_fields(),
+            [
+                name
+                for name, model_field in AdTechPlatform.__dataclass_fields__.items()
+                if model_field.metadata.get("default_eligible")
+            ],
+        )
+        self.assertIs(get_field_metadata(AdTechPlatform), get_field_metadata(AdTechPlatform))
+
+    def test_fallback_to_defaults(self):
+        """Test fields eligible for default fall back to the defaults when not set"""
+        defaults = AdTechPlatform(
+            bid_request_size_in_bytes=Decimal("10"), cookie_sync_distribution_ratio=None
+        )
+        atp = AdTechPlatform(
+            allocation_of_company_servers_pct=None,
+            bid_requests_processed_billion_per_month=Decimal("5"),
+        )
+        self.assertIsNone(atp.bid_request_size_in_bytes)
+
+        atp.set_defaults(defaults)
+        self.assertEqual(atp.bid_requests_processed_billion_per_month, Decimal("5"))
+        self.assertEqual(atp.bid_request_size_in_bytes, Decimal("10"))
+        # fields not eligible for default never fall back
+        self.assertIsNone(atp.allocation_of_company_servers_pct)
+        with self.assertRaisesRegex(
+            Exception, "Failed to find value or default for cookie_sync_distribution_ratio"
+        ):
+            atp.cookie_sync_distribution_ratio  # pylint: disable=pointless-statement
+
+    def test_models_without_defaults(self):
+        """Test unset fields of models that cannot hold defaults are None"""
+        rate = TransmissionRate("streaming-video", "high", Decimal("5.0"))
+        self.assertIsNone(rate.resolution)
+        self.assertEqual(get_field_metadata(TransmissionRate).fallback_names, frozenset())
+
+    def test_resolve(self):
+        """Test resolved inputs merge values with defaults and are rebuilt on assignments"""
+        defaults = AdTechPlatform(
+            bid_request_size_in_bytes=Decimal("10"), cookie_sync_distribution_ratio=None
+        )
+        atp = AdTechPlatform(
+            allocation_of_company_servers_pct=None,
+            bid_requests_processed_billion_per_month=Decimal("5"),
+        )
+        self.assertIsNone(atp.resolve().bid_request_size_in_bytes)
+
+        atp.set_defaults(defaults)
+        inputs = atp.resolve()
+        self.assertIs(resolve_inputs(atp), inputs)
+        self.assertEqual(inputs.bid_requests_processed_billion_per_month, Decimal("5"))
+        self.assertEqual(inputs.bid_request_size_in_bytes, Decimal("10"))
+        self.assertIsNone(inputs.allocation_of_company_servers_pct)
+        self.assertNotIn("cookie_sync_distribution_ratio", repr(inputs))
+        with self.assertRaisesRegex(
+            Exception, "Failed to find value or default for cookie_sync_distribution_ratio"
+        ):
+            inputs.cookie_sync_distribution_ratio  # pylint: disable=pointless-statement
+        with self.assertRaises(AttributeError):
+            inputs.bid_request_size_in_bytes = Decimal("20")
+
+        # records are plain values, usable as cache keys
+        other = AdTechPlatform(
+            allocation_of_company_servers_pct=None,
+            bid_requests_processed_billion_per_month=Decimal("5"),
+        )
+        other.set_defaults(defaults)
+        self.assertEqual(other.resolve(), inputs)
+        self.assertEqual(len({inputs, other.resolve()}), 1)
+
+        # assigning a field or defaults resolves the inputs again
+        atp.bid_requests_processed_billion_per_month = Decimal("6")
+        self.assertEqual(atp.resolve().bid_requests_processed_billion_per_month, Decimal("6"))
+        self.assertNotEqual(atp.resolve(), inputs)
+        atp.defaults = defaults = AdTechPlatform(bid_request_size_in_bytes=Decimal("20"))
+        self.assertEqual(resolve_inputs(atp).bid_request_size_in_bytes, Decimal("20"))
+
+        # as does assigning a field of the defaults, or of the defaults of the defaults
+        defaults.bid_request_size_in_bytes = Decimal("30")
+        self.assertEqual(resolve_inputs(atp).bid_request_size_in_bytes, Decimal("30"))
+        defaults.bid_request_size_in_bytes = None
+        defaults_defaults = AdTechPlatform(bid_request_size_in_bytes=Decimal("40"))
+        defaults.set_defaults(defaults_defaults)
+        self.assertEqual(resolve_inputs(atp).bid_request_size_in_bytes, Decimal("40"))
+        defaults_defaults.bid_request_size_in_bytes = Decimal("50")
+        self.assertEqual(resolve_inputs(atp).bid_request_size_in_bytes, Decimal("50"))
+
+    def test_memoized(self):
+        """Test memoized results are reused until the inputs are resolved again"""
+        atp = AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("5"))
+        self.assertEqual(atp.get_bid_requests_processed_per_month(), Decimal("5000000000"))
+
+        atp.bid_requests_processed_billion_per_month = Decimal("6")
+        self.assertEqual(atp.get_bid_requests_processed_per_month(), Decimal("6000000000"))
+
+        atp.bid_requests_processed_billion_per_month = None
+        atp.set_defaults(AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("7")))
+        self.assertEqual(atp.get_bid_requests_processed_per_month(), Decimal("7000000000"))
+        atp.defaults = defaults = AdTechPlatform(
+            bid_requests_processed_billion_per_month=Decimal("8")
+        )
+        self.assertEqual(atp.get_bid_requests_processed_per_month(), Decimal("8000000000"))
+        defaults.bid_requests_processed_billion_per_month = Decimal("9")
+        self.assertEqual(atp.get_bid_requests_processed_per_month(), Decimal("9000000000"))
+
+        with numeric_backend("float64"):
+            self.assertEqual(atp.get_bid_requests_processed_per_month(), 9e9)
+            self.assertIsInstance(atp.get_bid_requests_processed_per_month(), float)
+        self.assertIsInstance(atp.get_bid_requests_processed_per_month(), Decimal)
+
+    def test_resolved_inputs_are_not_pickled(self):
+        """Test pickling a model drops its resolved inputs and memoized results"""
+        atp = AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("5"))
+        atp.get_bid_requests_processed_per_month()
+        copy = pickle.loads(pickle.dumps(atp))  # nosec
+        self.assertEqual(copy, atp)
+        self.assertNotIn("_resolved", copy.__dict__)
+        self.assertNotIn("_defaults_record", copy.__dict__)
+        self.assertNotIn("_memo", copy.__dict__)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+""" Tests for the defaults registry """
+import os
+import shutil
+import tempfile
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.networking.transmission_rate_model import TransmissionRate
+from scope3_methodology.publisher.model import Property
+from scope3_methodology.utils import yaml_helpers
+from scope3_methodology.utils.defaults_registry import DefaultsRegistry
+from scope3_methodology.utils.defaults_snapshot import compile_snapshot, load_snapshot
+
+TEST_ATP_DEFAULTS_FILE = "defaults/atp-defaults.yaml"
+TEST_PROPERTY_DEFAULTS_FILE = "defaults/property-defaults.yaml"
+TEST_TRANSMISSION_RATE_DEFAULTS_FILE = "defaults/transmission_rate-defaults.yaml"
+
+
+class TestDefaultsRegistry(unittest.TestCase):
+    """Test DefaultsRegistry functions"""
+
+    def test_parses_file_once(self):
+        """Test each defaults file is only parsed once across templates and channels"""
+        registry = DefaultsRegistry()
+        with mock.patch(
+            "scope3_methodology.utils.defaults_registry.yaml_load", wraps=yaml_helpers.yaml_load
+        ) as yaml_load:
+            for resolution in ["low", "medium", "high", "ultra"]:
+                for channel in ["streaming-video", "ctv-bvod"]:
+                    registry.get_model(
+                        TransmissionRate, resolution, TEST_TRANSMISSION_RATE_DEFAULTS_FILE, channel
+                    )
+            for template in ["dsp", "ssp"]:
+                registry.get_model(AdTechPlatform, template, TEST_ATP_DEFAULTS_FILE)
+            self.assertEqual(yaml_load.call_count, 2)
+
+    def test_get_model(self):
+        """Test typed models are built from the indexed defaults"""
+        registry = DefaultsRegistry()
+        dsp = registry.get_model(AdTechPlatform, "dsp", TEST_ATP_DEFAULTS_FILE)
+        self.assertEqual(dsp.bid_requests_processed_billion_per_month, Decimal("38109"))
+        self.assertEqual(
+            vars(dsp), vars(AdTechPlatform.load_default_yaml("dsp", TEST_ATP_DEFAULTS_FILE))
+        )
+        ctv = registry.get_model(Property, "generic", TEST_PROPERTY_DEFAULTS_FILE, "ctv-bvod")
+        self.assertEqual(ctv.quality_impressions_per_duration_s, Decimal("0.0032"))
+
+    def test_returns_new_instances(self):
+        """Test mutating a returned model does not leak into the registry"""
+        registry = DefaultsRegistry()
+        dsp = registry.get_model(AdTechPlatform, "dsp", TEST_ATP_DEFAULTS_FILE)
+        dsp.bid_request_size_in_bytes = Decimal("1")
+        self.assertEqual(
+            registry.get_model(
+                AdTechPlatform, "dsp", TEST_ATP_DEFAULTS_FILE
+            ).bid_request_size_in_bytes,
+            Decimal("10000"),
+        )
+
+    def test_missing_template_and_channel(self):
+        """Test unknown templates and channels raise"""
+        registry = DefaultsRegistry()
+        with self.assertRaisesRegex(Exception, "Template unknown not found in defaults"):
+            registry.get_model(AdTechPlatform, "unknown", TEST_ATP_DEFAULTS_FILE)
+        with self.assertRaisesRegex(Exception, "Channel unknown not found in defaults"):
+            registry.get_model(Property, "generic", TEST_PROPERTY_DEFAULTS_FILE, "unknown")
+
+    def test_reparses_modified_file(self):
+        """Test a defaults file is parsed again when it changes on disk"""
+        registry = DefaultsRegistry()
+        with tempfile.TemporaryDirectory() as directory:
+            defaults_file = os.path.join(directory, "atp-defaults.yaml")
+            shutil.copy(TEST_ATP_DEFAULTS_FILE, defaults_file)
+            registry.get_model(AdTechPlatform, "dsp", defaults_file)
+            with open(defaults_file, "w", encoding="UTF-8") as stream:
+                stream.write("defaults:\n  dsp:\n    bid_request_size_in_bytes: 5.0\n")
+            stat = os.stat(defaults_file)
+            os.utime(defaults_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            dsp = registry.get_model(AdTechPlatform, "dsp", defaults_file)
+            self.assertEqual(dsp.bid_request_size_in_bytes, Decimal("5.0"))
+
+
+class TestDefaultsSnapshot(unittest.TestCase):
+    """Test loading defaults from a compiled snapshot"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for file in ["atp-defaults.yaml", "property-defaults.yaml", "docs-defaults.yaml"]:
+            shutil.copy(os.path.join("defaults", file), self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_snapshot_preserves_documents(self):
+        """Test the snapshot holds exactly the parsed yaml documents"""
+        entries = load_snapshot(compile_snapshot(self.directory))
+        self.assertIsNotNone(entries)
+        for file, (_, document) in (entries or {}).items():
+            with open(os.path.join(self.directory, file), "r", encoding="UTF-8") as stream:
+                self.assertEqual(repr(document), repr(yaml_helpers.yaml_load(stream)))
+
+    def test_loads_from_snapshot(self):
+        """Test the registry skips yaml parsing when the snapshot hash matches"""
+        compile_snapshot(self.directory)
+        registry = DefaultsRegistry()
+        with mock.patch("scope3_methodology.utils.defaults_registry.yaml_load") as yaml_load:
+            ssp = registry.get_model(
+                AdTechPlatform, "ssp", os.path.join(self.directory, "atp-defaults.yaml")
+            )
+            yaml_load.assert_not_called()
+        self.assertEqual(ssp.bid_requests_processed_billion_per_month, Decimal("6100.6"))
+
+    def test_falls_back_to_yaml_on_hash_mismatch(self):
+        """Test a changed yaml file is parsed instead of using the stale snapshot"""
+        compile_snapshot(self.directory)
+        defaults_file = os.path.join(self.directory, "atp-defaults.yaml")
+        with open(defaults_file, "w", encoding="UTF-8") as stream:
+            stream.write("defaults:\n  ssp:\n    bid_request_size_in_bytes: 5.0\n")
+        ssp = DefaultsRegistry().get_model(AdTechPlatform, "ssp", defaults_file)
+        self.assertEqual(ssp.bid_request_size_in_bytes, Decimal("5.0"))
+
+    def test_ignores_invalid_snapshot(self):
+        """Test an unreadable snapshot falls back to yaml"""
+        snapshot_file = compile_snapshot(self.directory)
+        with open(snapshot_file, "wb") as stream:
+            stream.write(b"not a snapshot")
+        self.assertIsNone(load_snapshot(snapshot_file))
+        ssp = DefaultsRegistry().get_model(
+            AdTechPlatform, "ssp", os.path.join(self.directory, "atp-defaults.yaml")
+        )
+        self.assertEqual(ssp.bid_request_size_in_bytes, Decimal("10000"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+""" Tests for the derivation trace """
+import unittest
+from decimal import Decimal
+
+from scope3_methodology.corporate.model import CorporateEmissions
+from scope3_methodology.utils.derivation import DerivationTrace, derivation_trace
+from scope3_methodology.utils.utils import (
+    derivation_logging_enabled,
+    log_result,
+    log_step,
+)
+
+
+class TestDerivationTrace(unittest.TestCase):
+    """Test collecting derivation steps into a tree"""
+
+    def test_tree(self):
+        """Test calculations adopt the preceding calculations logged with a lower depth"""
+        with derivation_trace() as trace:
+            self.assertTrue(derivation_logging_enabled())
+            log_step("template", "dsp", "", 0)
+            log_result("a", Decimal("1"), 1)
+            log_result("b", Decimal("2"), 2)
+            log_result("c", Decimal("3"), 1)
+            log_result("d", Decimal("4"), 3, ".2f")
+            log_result("e", Decimal("5"), 3)
+        self.assertFalse(derivation_logging_enabled())
+
+        self.assertEqual(
+            trace.to_dict(),
+            [
+                {
+                    "name": None,
+                    "inputs": [{"name": "template", "value": "dsp", "source": "input", "depth": 0}],
+                    "derivation": [
+                        {
+                            "name": "d",
+                            "value": Decimal("4"),
+                            "source": "calculation",
+                            "depth": 3,
+                            "children": [
+                                {
+                                    "name": "b",
+                                    "value": Decimal("2"),
+                                    "source": "calculation",
+                                    "depth": 2,
+                                    "children": [
+                                        {
+                                            "name": "a",
+                                            "value": Decimal("1"),
+                                            "source": "calculation",
+                                            "depth": 1,
+                                        }
+                                    ],
+                                },
+                                {
+                                    "name": "c",
+                                    "value": Decimal("3"),
+                                    "source": "calculation",
+                                    "depth": 1,
+                                },
+                            ],
+                        },
+                        {"name": "e", "value": Decimal("5"), "source": "calculation", "depth": 3},
+                    ],
+                }
+            ],
+        )
+
+    def test_model_inputs(self):
+        """Test closing a model marks its inputs as provided or taken from its defaults"""
+        trace = DerivationTrace()
+        corporate = CorporateEmissions(number_of_employees=10)
+        corporate.set_defaults(
+            CorporateEmissions(office_emissions_mt_co2e_per_employee_per_month=Decimal(50))
+        )
+        trace.add("emissions", Decimal("1"), "calculation", 1)
+        trace.add_model("corporate", corporate)
+        [model] = trace.to_dict()
+        self.assertEqual(model["name"], "corporate")
+        self.assertEqual(
+            model["inputs"],
+            [
+                {
+                    "name": "office_emissions_mt_co2e_per_employee_per_month",
+                    "value": Decimal(50),
+                    "source": "default",
+                    "depth": 0,
+                },
+                {
+                    "name": "revenue_allocation_to_digital_ads_pct",
+                    "value": Decimal(100),
+                    "source": "input",
+                    "depth": 0,
+                },
+                {"name": "number_of_employees", "value": 10, "source": "input", "depth": 0},
+            ],
+        )
+        self.assertEqual(len(model["derivation"]), 1)
+        self.assertEqual(trace.to_dict()[1:], [])
+
+        with self.assertRaisesRegex(Exception, "Unknown derivation source"):
+            trace.add("emissions", Decimal("1"), "guess", 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+""" Tests for the persistent fact index """
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from scope3_methodology.utils.fact_index import FactIndex
+from scope3_methodology.utils.utils import get_all_facts, get_content_facts
+
+TEST_DOCUMENT = """
+company:
+  template: ssp
+  sources:
+    - url: https://example.com
+      facts:
+        - bid_requests_processed_billion_per_month: {value}
+"""
+
+
+def extract_serially(file_contents):
+    """Extract the facts of a batch of (file, content) pairs"""
+    return [get_content_facts(file, content) for file, content in file_contents]
+
+
+class TestFactIndex(unittest.TestCase):
+    """Test FactIndex functions"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index_file = os.path.join(self.directory, "index.pickle")
+        self.files = [self.write_file(f"company{i}", "1.5") for i in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, company: str, value: str) -> str:
+        """Write a data file for a company"""
+        os.makedirs(os.path.join(self.directory, company), exist_ok=True)
+        file = os.path.join(self.directory, company, "data.yaml")
+        with open(file, "w", encoding="UTF-8") as stream:
+            stream.write(TEST_DOCUMENT.format(value=value))
+        return file
+
+    def index_facts(self, extract=None):
+        """Run the files through a freshly loaded index and save it"""
+        if extract is None:
+            extract = extract_serially
+        fact_index = FactIndex.load(self.index_file)
+        file_facts = fact_index.get_facts(self.files, extract)
+        fact_index.save()
+        return file_facts
+
+    def test_unchanged_files_are_not_parsed(self):
+        """Test a second run reuses every file from the index"""
+        first = self.index_facts()
+        extract = mock.Mock(side_effect=extract_serially)
+        second = self.index_facts(extract)
+        extract.assert_not_called()
+        self.assertEqual(repr(first), repr(second))
+
+    def test_changed_file_is_parsed(self):
+        """Test only the changed file is extracted again"""
+        self.index_facts()
+        self.write_file("company1", "2.5")
+        stat = os.stat(self.files[1])
+        os.utime(self.files[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        extract = mock.Mock(side_effect=extract_serially)
+        file_facts = self.index_facts(extract)
+        extract.assert_called_once()
+        self.assertEqual([file for file, _ in extract.call_args.args[0]], [self.files[1]])
+        self.assertEqual(
+            str(file_facts[1]["bid_requests_processed_billion_per_month"][0].value), "2.5"
+        )
+
+    def test_touched_file_with_same_content_is_not_parsed(self):
+        """Test a new mtime with identical content only costs a hash"""
+        self.index_facts()
+        stat = os.stat(self.files[0])
+        os.utime(self.files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        extract = mock.Mock(side_effect=extract_serially)
+        self.index_facts(extract)
+        extract.assert_not_called()
+
+    def test_deleted_files_are_pruned(self):
+        """Test facts from deleted files are removed from the index"""
+        self.index_facts()
+        removed = self.files.pop()
+        os.remove(removed)
+        self.index_facts()
+        self.assertEqual(set(FactIndex.load(self.index_file).entries), set(self.files))
+
+    def test_invalid_index_is_rebuilt(self):
+        """Test an unreadable index file starts an empty index"""
+        with open(self.index_file, "wb") as stream:
+            stream.write(b"not an index")
+        self.assertEqual(FactIndex.load(self.index_file).entries, {})
+        self.assertEqual(len(self.index_facts()), 3)
+
+    def test_get_all_facts_with_index(self):
+        """Test indexed facts match the facts parsed from every file"""
+        expected = repr(get_all_facts())
+        self.assertEqual(repr(get_all_facts(self.index_file)), expected)
+        self.assertEqual(repr(get_all_facts(self.index_file)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
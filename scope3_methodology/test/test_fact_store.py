@@ -0,0 +1,78 @@
+""" Tests for the columnar fact store """
+import unittest
+from decimal import Decimal
+
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.cli.compute_defaults import build_fact_averages
+from scope3_methodology.publisher.model import Property
+from scope3_methodology.utils.fact_store import FactStore, get_fact_store
+from scope3_methodology.utils.utils import Fact, get_all_facts
+from scope3_methodology.utils.yaml_helpers import yaml_dump
+
+
+class TestFactStore(unittest.TestCase):
+    """Test FactStore functions"""
+
+    def setUp(self):
+        self.facts = get_all_facts()
+        self.store = get_fact_store()
+
+    def test_round_trip(self):
+        """Test the store holds exactly the facts of get_all_facts in the same order"""
+        self.assertEqual(len(self.store), sum(len(facts) for facts in self.facts.values()))
+        self.assertEqual(repr(self.store.to_dict()), repr(self.facts))
+        self.assertEqual(repr(FactStore.from_facts(self.facts).to_dict()), repr(self.facts))
+
+    def test_strings_are_interned(self):
+        """Test repeated strings are only stored once"""
+        self.assertEqual(len(self.store.keys), len(self.facts))
+        self.assertLess(len(self.store.companies), len(self.store))
+
+    def test_views(self):
+        """Test views read the same fields as the fact they were built from"""
+        store = FactStore()
+        store.append("company/data.yaml", None, True, Decimal("1.50"), "ssp", None, "key")
+        view = store[0]
+        fact = Fact("company/data.yaml", None, True, Decimal("1.50"), "ssp", None, "key")
+        self.assertEqual(repr(view), repr(fact))
+        self.assertEqual(vars(view.to_fact()), vars(fact))
+        self.assertEqual(str(view.value), "1.50")
+        self.assertEqual(yaml_dump([view]), yaml_dump([fact]))
+        with self.assertRaises(IndexError):
+            store[1]  # pylint: disable=pointless-statement
+
+    def test_filter(self):
+        """Test filtering rows matches filtering the facts"""
+        all_facts = [fact for facts in self.facts.values() for fact in facts]
+        for keys, templates, channels in [
+            ({"bid_requests_processed_billion_per_month"}, None, None),
+            (None, {"ssp", "dsp"}, None),
+            (None, None, {None}),
+            (None, {"generic"}, {"display-web", "not-a-channel"}),
+        ]:
+            with self.subTest(keys=keys, templates=templates, channels=channels):
+                expected = [
+                    repr(fact)
+                    for fact in all_facts
+                    if (keys is None or fact.key in keys)
+                    and (templates is None or fact.template in templates)
+                    and (channels is None or fact.channel in channels)
+                ]
+                rows = self.store.filter(keys=keys, templates=templates, channels=channels)
+                self.assertEqual(sorted(repr(self.store[row]) for row in rows), sorted(expected))
+
+    def test_build_fact_averages(self):
+        """Test averages computed on the store are identical to averages on the dictionary"""
+        for model_inputs, template, channel in [
+            (AdTechPlatform.default_fields(), "ssp", None),
+            (AdTechPlatform.default_fields(), "dsp", None),
+            (Property.default_fields(), "generic", "display-web"),
+        ]:
+            with self.subTest(template=template, channel=channel):
+                expected = build_fact_averages(template, channel, self.facts, set(model_inputs))
+                columnar = build_fact_averages(template, channel, self.store, set(model_inputs))
+                self.assertEqual(yaml_dump(columnar), yaml_dump(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
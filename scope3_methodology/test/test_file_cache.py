@@ -0,0 +1,88 @@
+""" Tests for the file cache """
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from scope3_methodology.utils.file_cache import FileCache
+
+
+class TestFileCache(unittest.TestCase):
+    """Test FileCache functions"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = [self.write_file(f"file{i}.yaml", f"value: {i}") for i in range(3)]
+        self.load = mock.Mock(side_effect=lambda content: content.decode("UTF-8"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name: str, content: str) -> str:
+        """Write a file in the test directory"""
+        file = os.path.join(self.directory, name)
+        with open(file, "w", encoding="UTF-8") as stream:
+            stream.write(content)
+        return file
+
+    def test_hits_and_revalidation(self):
+        """Test cached values are reused until their file changes"""
+        cache: FileCache[str] = FileCache(2)
+        first = cache.get(self.files[0], self.load)
+        self.assertEqual(first.value, "value: 0")
+        self.assertIs(cache.get(self.files[0], self.load), first)
+        self.assertEqual(self.load.call_count, 1)
+
+        self.write_file("file0.yaml", "value: 10")
+        changed = cache.get(self.files[0], self.load)
+        self.assertEqual(changed.value, "value: 10")
+        self.assertNotEqual(changed.etag, first.etag)
+        self.assertEqual(
+            cache.stats(), {"hits": 1, "misses": 2, "evictions": 0, "size": 1, "max_size": 2}
+        )
+
+    def test_etag_is_stable(self):
+        """Test the ETag only depends on the file content"""
+        self.write_file("file1.yaml", "value: 0")
+        self.assertEqual(
+            FileCache(2).get(self.files[0], self.load).etag,
+            FileCache(2).get(self.files[1], self.load).etag,
+        )
+
+    def test_eviction(self):
+        """Test the least recently used file is evicted first"""
+        cache: FileCache[str] = FileCache(2)
+        cache.get(self.files[0], self.load)
+        cache.get(self.files[1], self.load)
+        cache.get(self.files[0], self.load)
+        cache.get(self.files[2], self.load)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+
+        self.load.reset_mock()
+        cache.get(self.files[0], self.load)
+        self.load.assert_not_called()
+        cache.get(self.files[1], self.load)
+        self.load.assert_called_once()
+
+    def test_disabled(self):
+        """Test a cache of size 0 always loads the file"""
+        cache: FileCache[str] = FileCache(0)
+        cache.get(self.files[0], self.load)
+        cache.get(self.files[0], self.load)
+        self.assertEqual(self.load.call_count, 2)
+        self.assertEqual(len(cache), 0)
+        with self.assertRaises(Exception):
+            FileCache(-1)
+
+    def test_failed_load_is_not_cached(self):
+        """Test a file that fails to load is tried again"""
+        cache: FileCache[str] = FileCache(2)
+        with self.assertRaises(ValueError):
+            cache.get(self.files[0], mock.Mock(side_effect=ValueError))
+        self.assertEqual(cache.get(self.files[0], self.load).value, "value: 0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+""" Tests for the formula compiler, and its NumPy kernels against the models """
+import math
+import unittest
+from decimal import Decimal
+from typing import Any
+
+from scope3_methodology.ad_tech_platform.formulas import AD_TECH_PLATFORM_FORMULAS
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.publisher.formulas import PROPERTY_FORMULAS
+from scope3_methodology.publisher.model import Property
+from scope3_methodology.test.helpers import templates
+from scope3_methodology.utils.custom_base_model import resolve_inputs
+from scope3_methodology.utils.derivation import DerivationStep, derivation_trace
+from scope3_methodology.utils.formula import (
+    Formulas,
+    after,
+    compile_scalar,
+    constant,
+    if_truthy,
+    interned_formulas,
+    logged,
+    model_input,
+    parameter,
+    required,
+)
+
+ATP_DEFAULTS_FILE = "defaults/atp-defaults.yaml"
+PROPERTY_DEFAULTS_FILE = "defaults/property-defaults.yaml"
+
+# float64 kernels against the Decimal methods, see test_numeric
+MAX_RELATIVE_ERROR = 1e-9
+
+
+def columns(records: list[Any], names: list[str]) -> dict[str, list[Any]]:
+    """Return the named inputs of resolved records as columns"""
+    return {name: [getattr(record, name) for record in records] for name in names}
+
+
+def logged_results(steps: list[DerivationStep]) -> list[tuple[str, Any, int]]:
+    """Return the name, value and depth of traced calculations, in the order logged"""
+    results = []
+    for step in steps:
+        results.extend(logged_results(step.children))
+        results.append((step.name, step.value, step.depth))
+    return results
+
+
+def record(**inputs: Any) -> Any:
+    """Return resolved inputs, read as attributes by scalar evaluators"""
+    return type("Record", (), inputs)
+
+
+class TestFormula(unittest.TestCase):
+    """Test building and compiling formulas"""
+
+    def test_hash_consing(self):
+        """Test equal formulas are the same object, so shared computations are found"""
+        self.assertIs(model_input("a") * 2, model_input("a") * 2)
+        self.assertIsNot(model_input("a") * 2, model_input("a") * Decimal("2"))
+        with self.assertRaises(Exception):
+            bool(model_input("a"))
+
+    def test_branches_are_lazy(self):
+        """Test only the branch taken is evaluated, as in the methods"""
+        a = model_input("a")
+        evaluate = compile_scalar([if_truthy(a, 1 / a, 0)])
+        self.assertEqual(evaluate(record(a=Decimal("0"))), (0,))
+        self.assertEqual(evaluate(record(a=Decimal("4"))), (Decimal("0.25"),))
+
+    def test_required(self):
+        """Test a missing required value raises as not_none does"""
+        evaluate = compile_scalar([required(model_input("a")) + 1])
+        with self.assertRaises(Exception):
+            evaluate(record(a=None))
+
+    def test_parameters(self):
+        """Test parameters must match the formulas"""
+        with self.assertRaises(Exception):
+            Formulas({"a": parameter("a") * model_input("b")}, parameters=("b",))
+
+    def test_specialise(self):
+        """Test fixed inputs fold into constants, leaving operations that would raise"""
+        a, b = model_input("a"), model_input("b")
+        formulas = Formulas(
+            {
+                "sum": required(a) * 2 + b,
+                "branch": if_truthy(a, b / a, b),
+                "lazy": if_truthy(b, a / (a - 3), 0),
+            }
+        )
+        specialised = formulas.specialise({"a": Decimal("3")})
+        self.assertIs(specialised.outputs["sum"], constant(Decimal("6")) + b)
+        self.assertIs(specialised.outputs["branch"], b / constant(Decimal("3")))
+        # the division by zero is only raised if b is truthy, as in the methods
+        self.assertEqual(specialised.outputs["lazy"].operation, "if_truthy")
+        evaluate = specialised.scalar()
+        self.assertEqual(evaluate(record(b=Decimal("0")))[2], 0)
+        with self.assertRaises(ZeroDivisionError):
+            evaluate(record(b=Decimal("1")))
+        self.assertIs(formulas.specialise({"b": Decimal("0")}).outputs["lazy"], constant(0))
+
+    def test_interned_formulas_are_released(self):
+        """Test formulas are only interned while in use, so folded constants do not pile up"""
+        key = ("constant", (Decimal, repr(Decimal("0.000246914"))))
+        self.assertNotIn(key, interned_formulas)
+        specialised = Formulas({"a": model_input("a") * 2}).specialise(
+            {"a": Decimal("0.000123457")}
+        )
+        self.assertIs(interned_formulas[key], specialised.outputs["a"])
+        del specialised
+        self.assertNotIn(key, interned_formulas)
+
+    def test_logged(self):
+        """Test results are logged relative to the depth, once per evaluation and branch taken"""
+        a = model_input("a")
+        half = logged(a / 2, "half", 1)
+        evaluate = compile_scalar(
+            [
+                logged(if_truthy(a, half + half, half), "result", 0, ".2f"),
+                if_truthy(a, 0, logged(a + 1, "successor", 0)),
+            ]
+        )
+        self.assertEqual(evaluate(record(a=Decimal("4")), depth=2), (Decimal("4"), 0))
+        with derivation_trace() as trace:
+            evaluate(record(a=Decimal("4")), depth=2)
+            evaluate(record(a=Decimal("0")))
+        self.assertEqual(
+            logged_results(trace.steps),
+            [
+                ("half", Decimal("2"), 3),
+                ("result", Decimal("4"), 2),
+                ("half", Decimal("0"), 1),
+                ("result", Decimal("0"), 0),
+                ("successor", Decimal("1"), 0),
+            ],
+        )
+
+    def test_after(self):
+        """Test the first formula is evaluated for its logs and errors, before the value"""
+        a, b = model_input("a"), model_input("b")
+        evaluate = compile_scalar([after(logged(required(a), "a", 0), logged(b, "b", 0))])
+        with derivation_trace() as trace:
+            self.assertEqual(evaluate(record(a=1, b=2)), (2,))
+        self.assertEqual(logged_results(trace.steps), [("a", 1, 0), ("b", 2, 0)])
+        with self.assertRaises(Exception):
+            evaluate(record(a=None, b=2))
+        specialised = Formulas({"b": after(required(a), b)}).specialise({"a": Decimal("1")})
+        self.assertIs(specialised.outputs["b"], b)
+
+    def test_specialise_logged(self):
+        """Test logged results are kept by specialise, logged with their folded value"""
+        a = model_input("a")
+        specialised = Formulas({"a": logged(a * 2, "double", 0)}).specialise({"a": Decimal("3")})
+        self.assertIs(specialised.outputs["a"], logged(constant(Decimal("6")), "double", 0))
+        with derivation_trace() as trace:
+            self.assertEqual(specialised.scalar()(record()), (Decimal("6"),))
+        self.assertEqual(logged_results(trace.steps), [("double", Decimal("6"), 0)])
+
+
+class TestKernelParity(unittest.TestCase):
+    """Test the NumPy kernels of the batch engines against the models for every template"""
+
+    def test_ad_tech_platform(self):
+        """Test the kernel of the primary emissions of every template against model_product"""
+        records = []
+        expected = []
+        for template in templates(ATP_DEFAULTS_FILE):
+            defaults = AdTechPlatform.load_default_yaml(template, ATP_DEFAULTS_FILE)
+            platform = AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("25"))
+            expected.append(platform.model_product(template, template, defaults, []))
+            records.append(resolve_inputs(platform))
+        self.assert_kernel(AD_TECH_PLATFORM_FORMULAS, records, expected)
+
+    def test_property(self):
+        """Test the kernel of every channel and environment against model_property"""
+        for environment, formulas in PROPERTY_FORMULAS.items():
+            records: list[Any] = []
+            expected = []
+            for channel in templates(PROPERTY_DEFAULTS_FILE):
+                defaults = Property.load_default_yaml("generic", PROPERTY_DEFAULTS_FILE, channel)
+                if not defaults.quality_impressions_per_duration_s:
+                    continue
+                if getattr(defaults, f"{environment}_active_electricity_use_watts") is None:
+                    continue
+                modeled_property = Property(
+                    environment=environment,
+                    visits_per_month=Decimal("100000"),
+                    average_visit_duration_s=Decimal("93.5"),
+                    pages_per_visit=Decimal("3"),
+                    load_time_s=Decimal("2.2") if len(records) % 2 else None,
+                    page_size_mb=Decimal("3.1"),
+                )
+                expected.append(modeled_property.model_property(channel, defaults, 0))
+                records.append(resolve_inputs(modeled_property))
+            with self.subTest(environment=environment):
+                self.assert_kernel(formulas, records, expected)
+
+    def assert_kernel(self, formulas: Formulas, records: list[Any], expected: list[Any]) -> None:
+        """Test the NumPy kernel over the records as columns against the modeled records"""
+        results = formulas.numpy()(columns(records, formulas.input_names()))
+        for output, name in enumerate(formulas.names):
+            for row, modeled in enumerate(expected):
+                value = float(results[output][row])
+                expected_value = getattr(modeled, name)
+                with self.subTest(output=name, row=row):
+                    if expected_value is None:
+                        self.assertTrue(math.isnan(value))
+                    else:
+                        self.assertTrue(
+                            math.isclose(value, float(expected_value), rel_tol=MAX_RELATIVE_ERROR),
+                            f"{value} != {expected_value}",
+                        )
+
+
+if __name__ == "__main__":
+    unittest.main()
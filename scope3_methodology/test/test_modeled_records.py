@@ -0,0 +1,102 @@
+""" Tests for the modeled result records and their column wise container """
+import csv
+import io
+import json
+import unittest
+from dataclasses import FrozenInstanceError, asdict
+from decimal import Decimal
+
+from scope3_methodology.ad_tech_platform.model import ModeledAdTechPlatform
+from scope3_methodology.api.input_models import NetworkingConnectionType
+from scope3_methodology.networking.model import ModeledDeviceNetworking
+from scope3_methodology.publisher.model import ModeledProperty
+from scope3_methodology.utils.derivation import json_default
+from scope3_methodology.utils.modeled_records import ModeledRecords
+from scope3_methodology.utils.yaml_helpers import yaml_dump
+
+PLATFORMS = [
+    ModeledAdTechPlatform(
+        name=f"platform {index}",
+        identifier=f"platform{index}.com",
+        primary_bid_request_emissions_g_co2e=Decimal("0.0007033278081937295") * index,
+        primary_cookie_sync_emissions_g_co2e=Decimal("0.004111234960495689"),
+        corporate_emissions_g_co2e_per_bid_request=Decimal("2.04e-05"),
+        cookie_sync_distribution_ratio=Decimal("1.0") if index % 2 else None,
+        secondary_bid_request_emissions_g_co2e=Decimal("0.5") if index else None,
+    )
+    for index in range(3)
+]
+
+
+class TestModeledRecord(unittest.TestCase):
+    """Test modeled records are slotted, and dump as the dataclasses they were"""
+
+    def test_slots(self):
+        """Test records have no __dict__, and frozen records can't be modified"""
+        self.assertFalse(hasattr(PLATFORMS[0], "__dict__"))
+        with self.assertRaises(FrozenInstanceError):
+            PLATFORMS[0].atp_block_rate = Decimal("1")  # type: ignore
+        modeled_property = ModeledProperty("example.com", Decimal("6000"), None, None, None, None)
+        modeled_property.set_corporate_emissions_g_co2e_per_impression(Decimal("600"), None)
+        self.assertEqual(modeled_property.corporate_emissions_g_co2e_per_impression, Decimal("0.1"))
+
+    def test_yaml(self):
+        """Test a record dumps as the mapping of its fields"""
+        self.assertEqual(yaml_dump(PLATFORMS[1]), yaml_dump(asdict(PLATFORMS[1])))
+
+
+class TestModeledRecords(unittest.TestCase):
+    """Test storing and writing modeled records column wise"""
+
+    def test_rows(self):
+        """Test records are stored as columns and built again on access"""
+        records = ModeledRecords(ModeledAdTechPlatform, PLATFORMS)
+        self.assertEqual(len(records), 3)
+        self.assertEqual(list(records), PLATFORMS)
+        self.assertEqual(records[2], PLATFORMS[2])
+        self.assertEqual(records.column("name"), ["platform 0", "platform 1", "platform 2"])
+        columns = {name: records.column(name) for name in records.names}
+        self.assertEqual(
+            list(ModeledRecords.from_columns(ModeledAdTechPlatform, columns)), PLATFORMS
+        )
+        with self.assertRaises(Exception):
+            ModeledRecords.from_columns(ModeledAdTechPlatform, {**columns, "name": ["platform 0"]})
+        self.assertEqual(len(ModeledRecords(ModeledAdTechPlatform)), 0)
+
+    def test_write_yaml(self):
+        """Test the yaml is the yaml_dump of the list of records"""
+        for records in (PLATFORMS, []):
+            stream = io.StringIO()
+            ModeledRecords(ModeledAdTechPlatform, records).write_yaml(stream, "products")
+            self.assertEqual(stream.getvalue(), yaml_dump({"products": records}))
+            stream = io.StringIO()
+            ModeledRecords(ModeledAdTechPlatform, records).write(stream)
+            self.assertEqual(stream.getvalue(), yaml_dump(records))
+
+    def test_write_json(self):
+        """Test the JSON is the list of records as objects"""
+        stream = io.StringIO()
+        ModeledRecords(ModeledAdTechPlatform, PLATFORMS).write(stream, "json")
+        self.assertEqual(
+            stream.getvalue(),
+            json.dumps([asdict(platform) for platform in PLATFORMS], default=json_default) + "\n",
+        )
+
+    def test_write_csv(self):
+        """Test the CSV has a header, exact decimals, enum values and empty values for None"""
+        networking = ModeledDeviceNetworking(
+            "tv_system", NetworkingConnectionType.FIXED, Decimal("0.0065"), None, None, "ctv-bvod"
+        )
+        stream = io.StringIO()
+        ModeledRecords(ModeledDeviceNetworking, [networking]).write(stream, "csv")
+        rows = list(csv.reader(io.StringIO(stream.getvalue())))
+        self.assertEqual(
+            rows[0][:3], ["device", "connection_type", "conventional_model_power_usage_kwh_per_gb"]
+        )
+        self.assertEqual(rows[1], ["tv_system", "fixed", "0.0065", "", "", "ctv-bvod"])
+        with self.assertRaises(Exception):
+            ModeledRecords(ModeledDeviceNetworking, [networking]).write(stream, "xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+""" Tests for the numeric backends, float64 results against the Decimal reference """
+import math
+import unittest
+from dataclasses import fields, is_dataclass
+from decimal import Decimal
+from typing import Any, Callable
+
+from scope3_methodology.ad_tech_platform.model import (
+    AdTechPlatform,
+    DistributionPartner,
+)
+from scope3_methodology.corporate.model import CorporateEmissions
+from scope3_methodology.end_user_device.model import EndUserDevice
+from scope3_methodology.networking.model import NetworkingConnection
+from scope3_methodology.networking.transmission_rate_model import TransmissionRate
+from scope3_methodology.publisher.model import Property
+from scope3_methodology.test.helpers import templates
+from scope3_methodology.utils.numeric import (
+    DECIMAL,
+    FLOAT64,
+    active_backend,
+    get_numeric_backend,
+    numeric_backend,
+    to_number,
+)
+from scope3_methodology.utils.yaml_helpers import yaml_load
+
+ATP_DEFAULTS_FILE = "defaults/atp-defaults.yaml"
+PROPERTY_DEFAULTS_FILE = "defaults/property-defaults.yaml"
+END_USER_DEVICE_DEFAULTS_FILE = "defaults/end_user_device-defaults.yaml"
+ORGANIZATION_DEFAULTS_FILE = "defaults/organization-defaults.yaml"
+NETWORKING_DEFAULTS_FILE = "defaults/networking-defaults.yaml"
+TRANSMISSION_RATE_DEFAULTS_FILE = "defaults/transmission_rate-defaults.yaml"
+
+# Accumulated over the few tens of operations of a model, from 1e-16 per operation
+MAX_RELATIVE_ERROR = 1e-9
+
+
+class TestNumericBackend(unittest.TestCase):
+    """Test selecting the numeric backend"""
+
+    def test_get_numeric_backend(self):
+        """Test backends are found by name, and unknown names raise"""
+        self.assertIs(get_numeric_backend("decimal"), DECIMAL)
+        self.assertIs(get_numeric_backend("float64"), FLOAT64)
+        with self.assertRaises(Exception):
+            get_numeric_backend("float32")
+
+    def test_numeric_backend(self):
+        """Test the backend is set within the with block only"""
+        self.assertIs(active_backend.get(), DECIMAL)
+        with numeric_backend("float64") as backend:
+            self.assertIs(backend, FLOAT64)
+            self.assertEqual(to_number(Decimal("1.5")), 1.5)
+            self.assertIsInstance(to_number(2), float)
+        self.assertIs(active_backend.get(), DECIMAL)
+        self.assertEqual(to_number(2), Decimal("2"))
+        self.assertIsInstance(to_number(2), Decimal)
+        self.assertEqual(to_number(0.1), Decimal("0.1"))
+        self.assertEqual(to_number({"a": 1, "b": "c"}), {"a": Decimal("1"), "b": "c"})
+        self.assertIs(to_number(True), True)
+
+    def test_resolved_inputs_follow_backend(self):
+        """Test resolved inputs are converted again when the backend changes"""
+        # integers as loaded from yaml
+        device = EndUserDevice(
+            production_emissions_gco2e_per_duration_s=Decimal("0.5"), draw_watts=3  # type: ignore
+        )
+        self.assertIsInstance(device.resolve().draw_watts, Decimal)
+        with numeric_backend(FLOAT64):
+            self.assertIsInstance(device.resolve().draw_watts, float)
+            self.assertIs(device.resolve().backend, FLOAT64)
+        self.assertIsInstance(device.resolve().draw_watts, Decimal)
+
+
+class TestFloat64Parity(unittest.TestCase):
+    """Test the float64 backend against the Decimal reference for every defaults template"""
+
+    def assert_parity(self, compute: Callable[[], Any]) -> None:
+        """Compute in both backends, right away, and compare every number of the results"""
+        expected = compute()
+        with numeric_backend(FLOAT64):
+            actual = compute()
+        self.assert_close(expected, actual, "result")
+
+    def assert_close(self, expected: Any, actual: Any, path: str) -> None:
+        """Compare a Decimal reference with its float64 value, recursing into dataclasses"""
+        if expected is actual:
+            # inputs passed through, such as the transmission rate of the power model
+            return
+        if is_dataclass(expected) and not isinstance(expected, type):
+            for model_field in fields(expected):
+                self.assert_close(
+                    getattr(expected, model_field.name),
+                    getattr(actual, model_field.name),
+                    f"{path}.{model_field.name}",
+                )
+        elif isinstance(expected, Decimal):
+            self.assertIsInstance(actual, float, path)
+            self.assertTrue(
+                math.isclose(actual, float(expected), rel_tol=MAX_RELATIVE_ERROR),
+                f"{path}: {actual} != {expected}",
+            )
+        else:
+            self.assertEqual(expected, actual, path)
+
+    def test_ad_tech_platform(self):
+        """Test model_product for every template, alone and with distribution partners"""
+        for template in templates(ATP_DEFAULTS_FILE):
+            with self.subTest(template=template):
+                defaults = AdTechPlatform.load_default_yaml(template, ATP_DEFAULTS_FILE)
+
+                def model_product():
+                    partner = AdTechPlatform().model_product("partner", "partner", defaults, [])
+                    return AdTechPlatform(
+                        bid_requests_processed_billion_per_month=Decimal("25"),
+                    ).model_product(
+                        "platform",
+                        "platform",
+                        defaults,
+                        [DistributionPartner(partner, Decimal("0.4"))],
+                        corporate_emissions_g=Decimal("123456789.5"),
+                    )
+
+                self.assert_parity(model_product)
+
+    def test_property(self):
+        """Test model_property for every channel with impressions"""
+        for channel in templates(PROPERTY_DEFAULTS_FILE):
+            defaults = Property.load_default_yaml("generic", PROPERTY_DEFAULTS_FILE, channel)
+            if not defaults.quality_impressions_per_duration_s:
+                continue
+            for environment in ("computer", "mobile", "tv"):
+                if getattr(defaults, f"{environment}_active_electricity_use_watts") is None:
+                    continue
+                with self.subTest(channel=channel, environment=environment):
+
+                    def model_property():
+                        modeled_property = Property(
+                            environment=environment,
+                            visits_per_month=Decimal("100000"),
+                            average_visit_duration_s=Decimal("93.5"),
+                            pages_per_visit=3,  # type: ignore
+                            load_time_s=Decimal("2.2"),
+                            page_size_mb=Decimal("3.1"),
+                        ).model_property(channel, defaults, 1)
+                        modeled_property.set_corporate_emissions_g_co2e_per_impression(
+                            Decimal("9876543.21"), None
+                        )
+                        return modeled_property
+
+                    self.assert_parity(model_property)
+
+    def test_end_user_device(self):
+        """Test model_end_user_device for every device and channel with impressions"""
+        for device in templates(END_USER_DEVICE_DEFAULTS_FILE):
+            defaults = EndUserDevice.load_default_yaml(device, END_USER_DEVICE_DEFAULTS_FILE)
+            for channel in templates(PROPERTY_DEFAULTS_FILE):
+                property_defaults = Property.load_default_yaml(
+                    "generic", PROPERTY_DEFAULTS_FILE, channel
+                )
+                quality_impressions = property_defaults.quality_impressions_per_duration_s
+                if not quality_impressions:
+                    continue
+                with self.subTest(device=device, channel=channel):
+                    self.assert_parity(
+                        lambda: defaults.model_end_user_device(
+                            device, channel, "generic", quality_impressions
+                        )
+                    )
+
+    def test_corporate_emissions(self):
+        """Test comp_emissions_g_co2e_per_month for every organization type"""
+        for template in templates(ORGANIZATION_DEFAULTS_FILE):
+            defaults = CorporateEmissions.load_default_yaml(template, ORGANIZATION_DEFAULTS_FILE)
+            with self.subTest(template=template):
+                self.assert_parity(
+                    lambda: CorporateEmissions(
+                        number_of_employees=1234
+                    ).comp_emissions_g_co2e_per_month(defaults, 0)
+                )
+
+    def test_networking_connection(self):
+        """Test both networking models for every connection, device and transmission rate"""
+        with open(NETWORKING_DEFAULTS_FILE, "r", encoding="UTF-8") as stream:
+            networking_defaults = yaml_load(stream)["defaults"]
+        for connection, connection_defaults in networking_defaults.items():
+            defaults = NetworkingConnection.load_default_yaml(connection, NETWORKING_DEFAULTS_FILE)
+            qualities = connection_defaults.get("transmission_rate_quality_per_channel_per_device")
+            for device in templates(END_USER_DEVICE_DEFAULTS_FILE):
+                with self.subTest(connection=connection, device=device):
+                    self.assert_parity(
+                        lambda: defaults.model_device_conventional_model(device, connection)
+                    )
+                for channel, channel_qualities in (qualities or {}).items():
+                    if device not in channel_qualities:
+                        continue
+                    transmission_rate = TransmissionRate.load_default_yaml(
+                        channel_qualities[device], TRANSMISSION_RATE_DEFAULTS_FILE, channel
+                    )
+                    with self.subTest(connection=connection, device=device, channel=channel):
+                        self.assert_parity(
+                            lambda: defaults.model_device_power_model(
+                                device, connection, transmission_rate, channel
+                            )
+                        )
+
+
+if __name__ == "__main__":
+    unittest.main()
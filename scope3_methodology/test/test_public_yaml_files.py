@@ -0,0 +1,107 @@
+""" Tests for the public yaml file manifest """
+import os
+import shutil
+import tempfile
+import unittest
+from glob import glob
+from unittest import mock
+
+from scope3_methodology.utils import public_yaml_files
+from scope3_methodology.utils.public_yaml_files import (
+    HEADER_KEYS,
+    get_all_public_yaml_files,
+    read_header,
+)
+from scope3_methodology.utils.yaml_helpers import yaml_load
+
+TEST_DOCUMENT = """
+type: corporate
+facts:
+  - number_of_employees: 10
+    nested: {{a: [1, 2, {{b: c}}]}}
+name: {name}
+ratio: 1.5
+public_identifier: {identifier}
+template: publisher
+"""
+
+
+class TestPublicYamlFiles(unittest.TestCase):
+    """Test public yaml file functions"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest_file = os.path.join(self.directory, "manifest.pickle")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, company: str, name: str) -> str:
+        """Write a corporate file for a company"""
+        os.makedirs(os.path.join(self.directory, company), exist_ok=True)
+        file = os.path.join(self.directory, company, "corporate.yaml")
+        with open(file, "w", encoding="UTF-8") as stream:
+            stream.write(TEST_DOCUMENT.format(name=name, identifier=company))
+        return file
+
+    def test_read_header(self):
+        """Test the header holds the same top level scalars as the parsed document"""
+        content = TEST_DOCUMENT.format(name="Test", identifier="test")
+        document = yaml_load(content)
+        self.assertEqual(read_header(content), {key: document[key] for key in HEADER_KEYS})
+        self.assertEqual(repr(read_header(content, {"ratio"})), repr({"ratio": document["ratio"]}))
+        self.assertEqual(read_header(content, {"facts"}), {})
+        self.assertEqual(read_header("- a\n- b\n"), {})
+        self.assertEqual(read_header(""), {})
+
+    def test_data_headers(self):
+        """Test the header of every public yaml file matches the parsed document"""
+        for file in glob("data/companies/*/*.yaml"):
+            with self.subTest(file=file):
+                with open(file, "r", encoding="UTF-8") as stream:
+                    document = yaml_load(stream)
+                with open(file, "rb") as stream:
+                    header = read_header(stream.read())
+                self.assertEqual(
+                    header, {key: document[key] for key in HEADER_KEYS if key in document}
+                )
+
+    def test_manifest(self):
+        """Test only new or changed files are scanned again"""
+        self.write_file("first", "First")
+        second_file = self.write_file("second", "Second")
+
+        with mock.patch.object(
+            public_yaml_files, "read_header", wraps=public_yaml_files.read_header
+        ) as read_mock:
+            files = get_all_public_yaml_files(self.directory, self.manifest_file)
+            self.assertEqual(read_mock.call_count, 2)
+            self.assertEqual(files["firstcorporate"].name, "First")
+            self.assertEqual(files["secondcorporate"].template, "publisher")
+
+            read_mock.reset_mock()
+            get_all_public_yaml_files(self.directory, self.manifest_file)
+            read_mock.assert_not_called()
+
+            # touched but unchanged files are matched by their content hash
+            stat = os.stat(second_file)
+            os.utime(second_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            get_all_public_yaml_files(self.directory, self.manifest_file)
+            read_mock.assert_not_called()
+
+            self.write_file("second", "Renamed")
+            files = get_all_public_yaml_files(self.directory, self.manifest_file)
+            self.assertEqual(read_mock.call_count, 1)
+            self.assertEqual(files["secondcorporate"].name, "Renamed")
+
+        os.remove(second_file)
+        files = get_all_public_yaml_files(self.directory, self.manifest_file)
+        self.assertEqual(list(files), ["firstcorporate"])
+        manifest = public_yaml_files.PublicYamlManifest.load(self.manifest_file)
+        self.assertEqual(
+            list(manifest.entries), [os.path.join(self.directory, "first", "corporate.yaml")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+""" Tests for the sensitivity of model results, derivatives against finite differences """
+import unittest
+from dataclasses import fields
+from decimal import Decimal
+from typing import Any, Callable
+
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.corporate.model import CorporateEmissions
+from scope3_methodology.publisher.model import Property
+from scope3_methodology.test.helpers import templates
+from scope3_methodology.utils.custom_base_model import CustomBaseModel, resolve_inputs
+from scope3_methodology.utils.derivation import derivation_trace
+from scope3_methodology.utils.numeric import FLOAT64, numeric_backend
+from scope3_methodology.utils.sensitivity import Dual, compute_sensitivity, sensitivity
+
+ATP_DEFAULTS_FILE = "defaults/atp-defaults.yaml"
+PROPERTY_DEFAULTS_FILE = "defaults/property-defaults.yaml"
+ORGANIZATION_DEFAULTS_FILE = "defaults/organization-defaults.yaml"
+
+# Relative step of the central differences, and their agreement with the derivatives
+STEP = Decimal("1e-9")
+MAX_RELATIVE_ERROR = Decimal("1e-6")
+
+
+class TestDual(unittest.TestCase):
+    """Test the arithmetic of dual numbers"""
+
+    def test_arithmetic(self):
+        """Test the chain rule of each operation, with duals and numbers"""
+        x = Dual(Decimal("2"), {"x": Decimal("1")})
+        y = Dual(Decimal("5"), {"y": Decimal("1")})
+        self.assertEqual((x + y).partials, {"x": 1, "y": 1})
+        self.assertEqual((x - y).partials, {"x": 1, "y": -1})
+        self.assertEqual((x * y).partials, {"x": 5, "y": 2})
+        self.assertEqual((x / y).partials, {"x": Decimal("0.2"), "y": Decimal("-0.08")})
+        self.assertEqual((x * x).partials, {"x": 4})
+        self.assertEqual((1 - x).partials, {"x": -1})
+        self.assertEqual((3 * x / 1000).partials, {"x": Decimal("0.003")})
+        self.assertEqual((1 / x).partials, {"x": Decimal("-0.25")})
+        self.assertEqual((-x).value, -2)
+        self.assertEqual((x + 1).value, 3)
+
+    def test_number_protocol(self):
+        """Test duals are compared, formatted and tested for truth by their value"""
+        zero = Dual(Decimal("0"), {"x": Decimal("1")})
+        self.assertFalse(zero)
+        self.assertEqual(zero, 0)
+        self.assertLess(zero, 1)
+        self.assertEqual(f"{Dual(Decimal('1.23456'), {}):.2f}", "1.23")
+        self.assertEqual(round(Dual(Decimal("1.23456"), {}), 2).value, Decimal("1.23"))
+
+
+class TestSensitivity(unittest.TestCase):
+    """Test the derivatives of the models against central finite differences"""
+
+    def assert_derivatives(
+        self, model: CustomBaseModel, compute: Callable[[CustomBaseModel], Any]
+    ) -> None:
+        """
+        Compute the sensitivity of a model, with and without a derivation trace, then compare
+        each derivative with a finite difference on a copy of the model
+        """
+        result, report = compute_sensitivity(model, lambda: compute(model))
+        with derivation_trace():
+            traced_result, traced_report = compute_sensitivity(model, lambda: compute(model))
+        self.assertEqual(result, compute(model))
+        self.assertEqual(traced_result, result)
+        self.assertEqual(traced_report, report)
+        assert report is not None
+
+        inputs = resolve_inputs(model)
+        for name in next(iter(report.values()))["partials"]:
+            value = getattr(inputs, name)
+            step = abs(value) * STEP or STEP
+            above = compute(type(model)(**{**model_values(model), name: value + step}))
+            below = compute(type(model)(**{**model_values(model), name: value - step}))
+            for output, sensitivity_of_output in report.items():
+                difference = (getattr(above, output) - getattr(below, output)) / (2 * step)
+                derivative = sensitivity_of_output["partials"][name]
+                with self.subTest(output=output, input=name):
+                    self.assertLessEqual(
+                        abs(derivative - difference),
+                        MAX_RELATIVE_ERROR * max(abs(derivative), abs(difference), 1),
+                        f"{derivative} != {difference}",
+                    )
+
+    def test_ad_tech_platform(self):
+        """Test model_product for every template, with corporate emissions"""
+        for template in templates(ATP_DEFAULTS_FILE):
+            defaults = AdTechPlatform.load_default_yaml(template, ATP_DEFAULTS_FILE)
+            with self.subTest(template=template):
+                self.assert_derivatives(
+                    AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("25")),
+                    lambda platform: platform.model_product(
+                        "platform",
+                        "platform",
+                        defaults,
+                        [],
+                        corporate_emissions_g=Decimal("123456789.5"),
+                    ),
+                )
+
+    def test_property(self):
+        """Test model_property for every channel with impressions"""
+        for channel in templates(PROPERTY_DEFAULTS_FILE):
+            defaults = Property.load_default_yaml("generic", PROPERTY_DEFAULTS_FILE, channel)
+            if not defaults.quality_impressions_per_duration_s:
+                continue
+            if defaults.computer_active_electricity_use_watts is None:
+                continue
+            with self.subTest(channel=channel):
+                self.assert_derivatives(
+                    Property(
+                        environment="computer",
+                        visits_per_month=Decimal("100000"),
+                        average_visit_duration_s=Decimal("93.5"),
+                        pages_per_visit=Decimal("3"),
+                        load_time_s=Decimal("2.2"),
+                        page_size_mb=Decimal("3.1"),
+                    ),
+                    lambda modeled_property: modeled_property.model_property(channel, defaults, 1),
+                )
+
+    def test_corporate_emissions(self):
+        """Test comp_emissions_g_co2e_per_month for every organization type"""
+        for template in templates(ORGANIZATION_DEFAULTS_FILE):
+            defaults = CorporateEmissions.load_default_yaml(template, ORGANIZATION_DEFAULTS_FILE)
+            with self.subTest(template=template):
+                self.assert_derivatives(
+                    CorporateEmissions(number_of_employees=1234),
+                    lambda corporate: corporate.comp_emissions_g_co2e_per_month(defaults, 0),
+                )
+
+    def test_only_the_model_is_seeded(self):
+        """Test the defaults are not seeded, and the model is plain again after the block"""
+        defaults = AdTechPlatform.load_default_yaml("dsp", ATP_DEFAULTS_FILE)
+        platform = AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("25"))
+        platform.set_defaults(defaults)
+        with sensitivity(platform) as inputs:
+            self.assertIsInstance(resolve_inputs(platform).bid_request_size_in_bytes, Dual)
+            self.assertNotIsInstance(resolve_inputs(defaults).bid_request_size_in_bytes, Dual)
+            platform.comp_corporate_emissions_g_co2e_per_bid_request(
+                defaults, corporate_emissions_g=Decimal("123456789.5")
+            )
+            self.assertIsInstance(platform.corporate_emissions_g_co2e_per_bid_request, Dual)
+        self.assertIn("bid_request_size_in_bytes", inputs)
+        self.assertNotIsInstance(resolve_inputs(platform).bid_request_size_in_bytes, Dual)
+        self.assertIsInstance(platform.corporate_emissions_g_co2e_per_bid_request, Decimal)
+
+    def test_float64(self):
+        """Test derivatives are computed in the active numeric backend"""
+        defaults = CorporateEmissions.load_default_yaml("generic", ORGANIZATION_DEFAULTS_FILE)
+        corporate = CorporateEmissions(number_of_employees=1234)
+        with numeric_backend(FLOAT64):
+            _, report = compute_sensitivity(
+                corporate, lambda: corporate.comp_emissions_g_co2e_per_month(defaults, 0)
+            )
+        assert report is not None
+        total = report["total_corporate_emissions_g_co2e_per_month"]
+        self.assertIsInstance(total["value"], float)
+        self.assertEqual(
+            total["partials"]["office_emissions_mt_co2e_per_employee_per_month"], 1234e6
+        )
+
+
+def model_values(model: CustomBaseModel) -> dict[str, Any]:
+    """Return the inputs set on a model, without its defaults"""
+    return {
+        model_field.name: object.__getattribute__(model, model_field.name)
+        for model_field in fields(model)
+        if model_field.name != "defaults"
+    }
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+""" Tests for util functions """
+import logging
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from scope3_methodology.ad_tech_platform.model import AdTechPlatform
+from scope3_methodology.cli.compute_defaults import build_fact_averages
+from scope3_methodology.utils import utils
+from scope3_methodology.utils.utils import (
+    GENERAL_FACT,
+    derivation_logging_enabled,
+    extract_file_facts,
+    get_all_facts,
+    get_data_files,
+    get_file_facts,
+    iter_facts,
+    log_result,
+)
+
+
+class TestFactExtraction(unittest.TestCase):
+    """Test fact extraction across the data tree"""
+
+    def test_parallel_facts_match_serial(self):
+        """Test a process pool returns the facts in the same order as a serial run"""
+        expected = repr(get_all_facts())
+        with mock.patch.object(utils, "PARALLEL_MIN_FILES", 1):
+            self.assertEqual(repr(get_all_facts(workers=2)), expected)
+
+    def test_small_trees_are_extracted_serially(self):
+        """Test no process pool is started below PARALLEL_MIN_FILES"""
+        files = [(file,) for file in get_data_files()[:3]]
+        with mock.patch.object(utils, "ProcessPoolExecutor") as executor:
+            file_facts = extract_file_facts(get_file_facts, files, workers=4)
+            executor.assert_not_called()
+        self.assertEqual(len(file_facts), 3)
+
+
+class TestDerivationLogging(unittest.TestCase):
+    """Test derivation logging is skipped when INFO logging is off"""
+
+    def test_disabled(self):
+        """Test nothing is logged, nor formatted, when INFO logging is off"""
+        self.addCleanup(logging.root.setLevel, logging.root.level)
+        logging.root.setLevel(logging.WARNING)
+        self.assertFalse(derivation_logging_enabled())
+        with mock.patch("logging.info") as info:
+            log_result("emissions", Decimal("1.5"), 2)
+            atp = AdTechPlatform(bid_requests_processed_billion_per_month=Decimal("10"))
+            atp.model_product(
+                "x",
+                "x",
+                AdTechPlatform.load_default_yaml("dsp", "defaults/atp-defaults.yaml"),
+                [],
+            )
+            info.assert_not_called()
+
+    def test_enabled(self):
+        """Test results are logged with their depth when INFO logging is on"""
+        with self.assertLogs(level=logging.INFO) as logs:
+            self.assertTrue(derivation_logging_enabled())
+            log_result("emissions", Decimal("1.5"), 2)
+        self.assertEqual(logs.output[1], "INFO:root:     emissions = 1.5 (calculation)")
+
+
+class TestIterFacts(unittest.TestCase):
+    """Test streaming facts with key, template and channel filters"""
+
+    def test_key_filter(self):
+        """Test a single key yields the same facts as get_all_facts"""
+        key = "bid_requests_processed_billion_per_month"
+        self.assertEqual(repr(list(iter_facts(keys={key}))), repr(get_all_facts()[key]))
+
+    def test_key_filter_skips_files(self):
+        """Test files that cannot contain the key are not parsed"""
+        with mock.patch.object(
+            utils, "get_content_facts", wraps=utils.get_content_facts
+        ) as get_content_facts:
+            self.assertEqual(list(iter_facts(keys={"not_a_fact_key"})), [])
+            get_content_facts.assert_not_called()
+
+    def test_template_and_channel_filters(self):
+        """Test template and channel filters match filtering every fact"""
+        all_facts = [fact for facts in get_all_facts().values() for fact in facts]
+        for templates, channels in [
+            ({"ssp"}, None),
+            ({GENERAL_FACT}, None),
+            (None, {"social"}),
+            (None, {None}),
+            ({"generic"}, {"display-web", None}),
+        ]:
+            with self.subTest(templates=templates, channels=channels):
+                expected = [
+                    fact
+                    for fact in all_facts
+                    if (templates is None or fact.template in templates)
+                    and (channels is None or fact.channel in channels)
+                ]
+                streamed = list(iter_facts(templates=templates, channels=channels))
+                self.assertEqual(
+                    sorted(repr(fact) for fact in streamed), sorted(repr(fact) for fact in expected)
+                )
+
+    def test_build_fact_averages_from_stream(self):
+        """Test averages built from a stream are identical to averages from the dictionary"""
+        model_inputs = set(AdTechPlatform.default_fields())
+        for template, channel in [("ssp", None), ("dsp", None), ("generic", "display-web")]:
+            with self.subTest(template=template, channel=channel):
+                expected = build_fact_averages(template, channel, get_all_facts(), model_inputs)
+                streamed = build_fact_averages(
+                    template, channel, iter_facts(keys=model_inputs), model_inputs
+                )
+                self.assertEqual(repr(streamed), repr(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
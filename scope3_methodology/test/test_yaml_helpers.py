@@ -0,0 +1,56 @@
+""" Tests for yaml helpers """
+import unittest
+from decimal import Decimal
+from glob import glob
+
+from scope3_methodology.utils.yaml_helpers import CLoader, Loader
+
+YAML_FILES = sorted(
+    glob("data/**/*.yaml", recursive=True)
+    + glob("defaults/*.yaml")
+    + glob("templates/**/*.yaml", recursive=True)
+)
+
+
+def load_with(loader_class, content: str):
+    """Load a single yaml document with a specific loader class"""
+    loader = loader_class(content)
+    try:
+        return loader.get_single_data()
+    finally:
+        loader.dispose()
+
+
+class TestYamlHelpers(unittest.TestCase):
+    """Test the custom yaml loaders"""
+
+    def test_loader_reads_decimals(self):
+        """Test floats are read as Decimal and ints are untouched"""
+        document = load_with(Loader, "a: 1.10\nb: 3\nc: text\n")
+        self.assertEqual(document, {"a": Decimal("1.10"), "b": 3, "c": "text"})
+        self.assertIsInstance(document["a"], Decimal)
+
+    @unittest.skipIf(CLoader is None, "PyYAML was built without libyaml")
+    def test_cloader_reads_decimals(self):
+        """Test the libyaml loader reads floats as Decimal"""
+        document = load_with(CLoader, "a: 1.10\nb: 3\nc: .5e+3\n")
+        self.assertEqual(
+            repr(document), repr({"a": Decimal("1.10"), "b": 3, "c": Decimal(".5e+3")})
+        )
+
+    @unittest.skipIf(CLoader is None, "PyYAML was built without libyaml")
+    def test_cloader_parity(self):
+        """Test the libyaml loader matches the pure python loader for every repo yaml file"""
+        self.assertTrue(YAML_FILES)
+        for file in YAML_FILES:
+            with self.subTest(file=file):
+                with open(file, "r", encoding="UTF-8") as stream:
+                    content = stream.read()
+                # repr also compares Decimal exponents and python types
+                self.assertEqual(
+                    repr(load_with(Loader, content)), repr(load_with(CLoader, content))
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+""" Batch evaluation of model formulas over columns of inputs, resolved against defaults """
+from dataclasses import MISSING as NO_DEFAULT
+from dataclasses import fields
+from typing import Any, Callable, Iterable
+
+import numpy
+
+from scope3_methodology.utils.custom_base_model import (
+    MISSING,
+    CustomBaseModel,
+    get_field_metadata,
+    get_instance_attribute,
+    resolve_inputs,
+)
+from scope3_methodology.utils.formula import Formulas, column
+
+
+def row_count(columns: dict[str, Any]) -> int:
+    """Return the number of rows of columns, which must all have the same length"""
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise Exception("columns of a batch must have the same length")
+    return lengths.pop() if lengths else 0
+
+
+def fallback_values(model_class: type, defaults: CustomBaseModel) -> dict[str, Any]:
+    """
+    Return the value of each input of a model class when a row does not provide it: the
+    value in the defaults for inputs eligible for default, the default of the field for the
+    others, None when there is neither
+    """
+    default_inputs = resolve_inputs(defaults)
+    fallback_names = get_field_metadata(model_class).fallback_names
+    values = {}
+    for model_field in fields(model_class):
+        if model_field.name == "defaults":
+            continue
+        if model_field.name in fallback_names:
+            value = getattr(default_inputs, model_field.name, None)
+        else:
+            value = None if model_field.default is NO_DEFAULT else model_field.default
+        values[model_field.name] = None if value is MISSING else value
+    return values
+
+
+def resolve_columns(
+    names: Iterable[str], columns: dict[str, Any], fallbacks: dict[str, Any]
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    """
+    Return the named inputs provided in columns as float64 arrays, missing values (None or
+    NaN) replaced with their fallback, and the values of the inputs not provided, the same
+    for every row
+    """
+    resolved: dict[str, Any] = {}
+    fixed: dict[str, Any] = {}
+    for name in names:
+        if name not in columns:
+            fixed[name] = fallbacks.get(name)
+            continue
+        values = column(columns[name])
+        fallback = fallbacks.get(name)
+        if fallback is not None:
+            values = numpy.where(numpy.isnan(values), float(fallback), values)
+        resolved[name] = values
+    return resolved, fixed
+
+
+def specialised_kernel(
+    formulas: Formulas, defaults: CustomBaseModel, fixed: dict[str, Any]
+) -> Callable[..., tuple]:
+    """
+    Return the NumPy kernel of formulas specialised to the values fixed for every row, which
+    are taken from defaults. Kernels are compiled once per set of inputs fixed and memoized
+    with the resolved defaults, see memoized.
+    """
+    resolve_inputs(defaults)
+    memo = get_instance_attribute(defaults, "__dict__")["_memo"]
+    key = (formulas, "numpy", frozenset(fixed))
+    kernel = memo.get(key)
+    if kernel is None:
+        constants = {name: value for name, value in fixed.items() if value is not None}
+        kernel = memo[key] = formulas.specialise(constants).numpy()
+    return kernel
+
+
+def evaluate_batch(
+    formulas: Formulas,
+    defaults: CustomBaseModel,
+    columns: dict[str, Any],
+    *parameters: Any,
+) -> dict[str, Any]:
+    """
+    Evaluate formulas over columns of inputs of the model class of defaults, one sequence or
+    array per input, resolving missing values as model methods do, see fallback_values and
+    resolve_columns. Returns a float64 array per output name, NaN where the methods of the
+    model would raise.
+    """
+    fallbacks = fallback_values(type(defaults), defaults)
+    resolved, fixed = resolve_columns(formulas.input_names(), columns, fallbacks)
+    kernel = specialised_kernel(formulas, defaults, fixed)
+    rows = row_count(columns)
+    inputs = {**fixed, **resolved}
+    return {
+        name: numpy.broadcast_to(result, (rows,))
+        for name, result in zip(formulas.names, kernel(inputs, *parameters))
+    }
+
+
+def to_values(results: Any) -> list[Any]:
+    """Return a float64 array as a list of floats, with NaN as None"""
+    return [None if value != value else value for value in results.tolist()]
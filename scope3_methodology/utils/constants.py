@@ -1,9 +1,8 @@
-""" Constants """
-from decimal import Decimal
+""" Constants, integers so they combine exactly with either numeric backend """
 
-G_PER_MT = Decimal("1000000.0")
-BILLION = Decimal("1000000000.0")
-SEC_PER_HOUR = Decimal("3600.0")
-BYTES_PER_GB = Decimal("1024.0") * Decimal("1024.0") * Decimal("1024.0")
-MB_BYTES_PER_GB = Decimal("1024.0")
-ONE_HUNDRED = Decimal("100.0")
+G_PER_MT = 1000000
+BILLION = 1000000000
+SEC_PER_HOUR = 3600
+BYTES_PER_GB = 1024 * 1024 * 1024
+MB_BYTES_PER_GB = 1024
+ONE_HUNDRED = 100
@@ -1,9 +1,145 @@
 """ Base Model that is inherited by publisher, ad tech platform and corporate models"""
+from collections import namedtuple
+from contextvars import ContextVar
 from dataclasses import dataclass, fields
-from decimal import Decimal
-from typing import Optional
+from functools import wraps
+from operator import itemgetter
+from typing import Any, Callable, Optional, TypeVar
 
-from scope3_methodology.utils.yaml_helpers import yaml_load
+from scope3_methodology.utils.defaults_registry import defaults_registry
+from scope3_methodology.utils.numeric import NumericBackend, active_backend
+
+
+class Missing:
+    """Placeholder in a resolved record for an input with neither a value nor a default"""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+MISSING = Missing()
+
+
+class ResolvedInputs(tuple):
+    """
+    Flat, read only record of the inputs of a model with its defaults applied, see
+    CustomBaseModel.resolve. A named tuple subclass is created for each model class so
+    inputs are read with C level accessors, and records double as hashable cache keys.
+    """
+
+    __slots__ = ()
+    # numeric backend the inputs were converted to
+    backend: NumericBackend
+
+    def __repr__(self) -> str:
+        inputs = ", ".join(
+            f"{name}={value!r}"
+            for name, value in zip(type(self)._fields, self)  # type: ignore
+            if value is not MISSING
+        )
+        return f"{type(self).__name__}({inputs})"
+
+
+def missing_input(name: str) -> property:
+    """Return a property raising for an input with neither a value nor a default"""
+
+    def get_missing(_) -> Any:
+        raise Exception(f"Failed to find value or default for {name}")
+
+    return property(get_missing)
+
+
+class FieldMetadata:
+    """Field metadata of a model class, computed once per class"""
+
+    __slots__ = (
+        "field_names",
+        "default_fields",
+        "fallback_names",
+        "input_fields",
+        "input_getter",
+        "fallback_indexes",
+        "fallback_getter",
+        "default_indexes",
+        "resolved_class",
+        "backend_classes",
+    )
+
+    def __init__(self, model_class: type) -> None:
+        model_fields = fields(model_class)
+        self.field_names = frozenset(f.name for f in model_fields)
+        self.default_fields = tuple(
+            f.name for f in model_fields if f.metadata.get("default_eligible")
+        )
+        # Only fields eligible for default fall back to defaults, and only on models with defaults
+        self.fallback_names = (
+            frozenset(self.default_fields)
+            if any(f.name == "defaults" for f in model_fields)
+            else frozenset()
+        )
+        self.input_fields = tuple(f.name for f in model_fields if f.name != "defaults")
+        self.fallback_indexes = tuple(
+            (index, name)
+            for index, name in enumerate(self.input_fields)
+            if name in self.fallback_names
+        )
+        self.input_getter = tuple_getter(self.input_fields)
+        self.fallback_getter = tuple_getter(tuple(name for _, name in self.fallback_indexes))
+        self.default_indexes = tuple(
+            (index, name)
+            for index, name in enumerate(self.input_fields)
+            if name in self.default_fields
+        )
+        self.resolved_class: type[ResolvedInputs] = type(
+            f"Resolved{model_class.__name__}",
+            (ResolvedInputs, namedtuple(f"Resolved{model_class.__name__}", self.input_fields)),
+            {"__slots__": ()},
+        )
+        self.backend_classes: dict[tuple[NumericBackend, frozenset[str]], type[ResolvedInputs]] = {}
+
+    def get_resolved_class(
+        self, backend: NumericBackend, missing: frozenset[str]
+    ) -> type[ResolvedInputs]:
+        """Return the record class of a numeric backend, raising on access to missing inputs"""
+        backend_class = self.backend_classes.get((backend, missing))
+        if backend_class is None:
+            namespace: dict[str, Any] = {name: missing_input(name) for name in missing}
+            namespace["__slots__"] = ()
+            namespace["backend"] = backend
+            backend_class = self.backend_classes[(backend, missing)] = type(
+                self.resolved_class.__name__, (self.resolved_class,), namespace
+            )
+        return backend_class
+
+
+def tuple_getter(names: tuple[str, ...]) -> Callable[[dict], tuple]:
+    """Return a function reading the named values of a dict as a tuple"""
+    # itemgetter of a single item does not return a tuple
+    if len(names) > 1:
+        return itemgetter(*names)
+    return lambda values: tuple(values[name] for name in names)
+
+
+# Key: model class
+# Value: field metadata of the class
+field_metadata: dict[type, FieldMetadata] = {}
+
+
+def get_field_metadata(model_class: type) -> FieldMetadata:
+    """Return the field metadata of a model class, building it on first use"""
+    metadata = field_metadata.get(model_class)
+    if metadata is None:
+        metadata = field_metadata[model_class] = FieldMetadata(model_class)
+    return metadata
+
+
+# The model whose inputs eligible for default are seeded when resolved, and the function
+# returning the seeded value of an input from its name and value, see sensitivity
+input_seeding: ContextVar[Optional[tuple[Any, Callable[[str, Any], Any]]]] = ContextVar(
+    "input_seeding", default=None
+)
 
 
 @dataclass
@@ -13,7 +149,7 @@ class CustomBaseModel:
     @classmethod
     def default_fields(cls):
         """Retun all default fields of a model"""
-        return [f.name for f in fields(cls) if f.metadata.get("default_eligible")]
+        return list(get_field_metadata(cls).default_fields)
 
     @classmethod
     def load_default_yaml(
@@ -24,37 +160,179 @@ class CustomBaseModel:
     ):
         """
         Takes a yaml file and loads in all default facts into the
-        fields eligible for default
+        fields eligible for default. Each file is only parsed once, see DefaultsRegistry.
         """
-        with open(defaults_file, "r", encoding="UTF-8") as defaults_stream:
-            defaults_document = yaml_load(defaults_stream)
-            doc_defaults = defaults_document["defaults"]
-            if channel:
-                if channel not in defaults_document["defaults"]:
-                    raise Exception(f"Channel {channel} not found in defaults")
-                doc_defaults = defaults_document["defaults"][channel]
-
-            if template not in doc_defaults:
-                raise Exception(f"Template {template} not found in defaults")
-            defaults: dict[str, Decimal] = doc_defaults[template]
-            keys = [f.name for f in fields(cls) if f.metadata.get("default_eligible")]
-            return cls(**{k: v for k, v in defaults.items() if k in keys and v is not None})
+        return defaults_registry.get_model(cls, template, defaults_file, channel)
 
     def __getattribute__(self, name):
-        if object.__getattribute__(self, name) is not None:
-            return object.__getattribute__(self, name)
+        value = object.__getattribute__(self, name)
+        if value is not None:
+            return value
+
+        metadata = field_metadata.get(type(self))
+        if metadata is None:
+            metadata = get_field_metadata(type(self))
+        if name not in metadata.fallback_names:
+            return None
+        defaults = object.__getattribute__(self, "defaults")
+        if not defaults:
+            return None
+        default = object.__getattribute__(defaults, name)
+        if default is not None:
+            return default
+        raise Exception(f"Failed to find value or default for {name}")
+
+    def __setattr__(self, name, value):
+        set_instance_attribute(self, name, value)
+        # Assigning a field, defaults included, invalidates the resolved inputs, and with them
+        # those of the models resolved against this model as their defaults, see current_record
+        values = get_instance_attribute(self, "__dict__")
+        if "_resolved" in values and name in get_field_metadata(type(self)).field_names:
+            del values["_resolved"]
+            values.pop("_memo", None)
 
-        default_eligible = [
-            f.name for f in fields(object.__class__(self)) if f.metadata.get("default_eligible")
+    def __getstate__(self):
+        state = dict(object.__getattribute__(self, "__dict__"))
+        state.pop("_resolved", None)
+        state.pop("_defaults_record", None)
+        state.pop("_memo", None)
+        return state
+
+    def clear_resolved(self) -> None:
+        """
+        Drop the resolved inputs and the results memoized from them, they are built again
+        on the next call to resolve
+        """
+        values = object.__getattribute__(self, "__dict__")
+        values.pop("_resolved", None)
+        values.pop("_memo", None)
+
+    def resolve(self) -> Any:
+        """
+        Return the inputs of the model merged with its defaults in a flat, read only record.
+        The record is built on first use and reused until a field, or defaults, is assigned
+        on the model or on its defaults, or clear_resolved is called, see current_record.
+        Reading an input eligible for default that has neither a value nor a default raises
+        the same exception as reading it from the model. Numbers are converted to the active
+        numeric backend, see numeric_backend, and the record is built again when it changes.
+        Within sensitivity, the inputs eligible for default of the model studied are seeded.
+        """
+        values = object.__getattribute__(self, "__dict__")
+        resolved = current_record(values)
+        if resolved is not None:
+            return resolved
+
+        backend = active_backend.get()
+        metadata = field_metadata.get(type(self))
+        if metadata is None:
+            metadata = get_field_metadata(type(self))
+        missing = []
+        convert = backend.convert
+        number = backend.number
+        row = [
+            value if value is None or type(value) is number else convert(value)
+            for value in metadata.input_getter(values)
         ]
+        defaults = values.get("defaults")
+        defaults_record = None
+        if defaults:
+            # defaults are of the same class, their record is converted once per backend
+            default_row = resolve_inputs(defaults)
+            defaults_record = (object.__getattribute__(defaults, "__dict__"), default_row)
+            for index, name in metadata.fallback_indexes:
+                if row[index] is None:
+                    row[index] = default_row[index]
+                    if row[index] is None:
+                        row[index] = MISSING
+                        missing.append(name)
+        seeding = input_seeding.get()
+        if seeding is not None and seeding[0] is self:
+            seed = seeding[1]
+            for index, name in metadata.default_indexes:
+                row[index] = seed(name, row[index])
+        resolved = tuple.__new__(metadata.get_resolved_class(backend, frozenset(missing)), row)
+        values["_resolved"] = resolved
+        # the attributes of the defaults and the record of the defaults this record was
+        # resolved against, see current_record
+        values["_defaults_record"] = defaults_record
+        # results of memoized methods and specialised kernels, valid as long as the record
+        values["_memo"] = {}
+        return resolved
+
+
+# Bound once, resolve_inputs is called several times per computation, and __setattr__ for
+# every field of a new model
+get_instance_attribute = object.__getattribute__
+set_instance_attribute = object.__setattr__
+get_active_backend = active_backend.get
+
+
+def current_record(values: dict[str, Any]) -> Any:
+    """
+    Return the resolved inputs in the attributes of a model if they are still current, else
+    None. They are not once resolved in another numeric backend, or when the defaults of the
+    model no longer hold the record they were resolved against, as a field of the defaults,
+    or of their own defaults, was assigned since.
+    """
+    resolved = values.get("_resolved")
+    if resolved is None or resolved.backend is not get_active_backend():
+        return None
+    defaults_record = values["_defaults_record"]
+    if defaults_record is None:
+        return resolved
+    defaults_values, defaults_resolved = defaults_record
+    if defaults_values.get("_resolved") is not defaults_resolved:
+        return None
+    # the record of the defaults is in the same backend, only their own defaults are left
+    if defaults_values["_defaults_record"] is None or current_record(defaults_values):
+        return resolved
+    return None
+
+
+def resolve_inputs(model: CustomBaseModel) -> Any:
+    """
+    Return the resolved inputs of a model, see CustomBaseModel.resolve.
+    Model methods use this function rather than the method as it reads an already built
+    record without going through the __getattribute__ override of the model.
+    """
+    values = get_instance_attribute(model, "__dict__")
+    resolved = values.get("_resolved")
+    if resolved is not None and resolved.backend is get_active_backend():
+        # inlined current_record for models without defaults, or defaults without defaults
+        defaults_record = values["_defaults_record"]
+        if defaults_record is None:
+            return resolved
+        defaults_values = defaults_record[0]
         if (
-            hasattr(self, "defaults")
-            and object.__getattribute__(self, "defaults")
-            and name in default_eligible
+            defaults_values.get("_resolved") is defaults_record[1]
+            and defaults_values["_defaults_record"] is None
         ):
-            default = object.__getattribute__(object.__getattribute__(self, "defaults"), name)
-            if default is not None:
-                return default
-            raise Exception(f"Failed to find value or default for {name}")
+            return resolved
+    resolved = current_record(values)
+    if resolved is not None:
+        return resolved
+    return CustomBaseModel.resolve(model)
 
-        return None
+
+Result = TypeVar("Result")
+
+
+def memoized(method: Callable[[Any], Result]) -> Callable[[Any], Result]:
+    """
+    Memoize a model method without arguments, computed from the resolved inputs only.
+    The result is reused until the inputs are resolved again, after a field or defaults is
+    assigned on the model or on its defaults, or clear_resolved, or in another numeric backend.
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def memoized_method(self) -> Result:
+        # the memo is replaced whenever the inputs are resolved again
+        resolve_inputs(self)
+        memo = get_instance_attribute(self, "__dict__")["_memo"]
+        if name in memo:
+            return memo[name]
+        result = memo[name] = method(self)
+        return result
+
+    return memoized_method
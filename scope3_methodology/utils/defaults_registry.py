@@ -0,0 +1,126 @@
+""" Registry that parses each defaults file once and hands out typed default models """
+import os
+from typing import Any, Optional, TypeVar
+
+from scope3_methodology.utils.defaults_snapshot import (
+    SnapshotEntries,
+    content_hash,
+    load_snapshot,
+    snapshot_path,
+)
+from scope3_methodology.utils.yaml_helpers import yaml_load
+
+ModelType = TypeVar("ModelType")
+
+
+class DefaultsFile:
+    """A parsed defaults file indexed by (channel, template)"""
+
+    def __init__(self, file_path: str, mtime_ns: int, document: dict[str, Any]) -> None:
+        self.file_path = file_path
+        self.mtime_ns = mtime_ns
+        self.document = document
+        defaults: dict[str, Any] = document["defaults"] if document.get("defaults") else {}
+        self.channels: set[str] = set(defaults)
+        self.index: dict[tuple[Optional[str], str], dict[str, Any]] = {}
+        for key, value in defaults.items():
+            if not isinstance(value, dict):
+                continue
+            self.index[(None, key)] = value
+            for template, template_defaults in value.items():
+                if isinstance(template_defaults, dict):
+                    self.index[(key, template)] = template_defaults
+
+    def has_template(self, template: str, channel: Optional[str] = None) -> bool:
+        """Return whether the defaults contain a template, optionally within a channel"""
+        return (channel if channel else None, template) in self.index
+
+    def get_template_defaults(self, template: str, channel: Optional[str] = None) -> dict[str, Any]:
+        """Return the raw defaults of a template, optionally within a channel"""
+        if channel and channel not in self.channels:
+            raise Exception(f"Channel {channel} not found in defaults")
+        key = (channel if channel else None, template)
+        if key not in self.index:
+            raise Exception(f"Template {template} not found in defaults")
+        return self.index[key]
+
+
+class DefaultsRegistry:
+    """
+    Parses each defaults file exactly once and hands out typed model instances.
+    A file is only parsed again if its modification time changes.
+
+    If the defaults directory contains a compiled snapshot (see compile_defaults.py) whose
+    content hash matches the yaml file, the document is taken from the snapshot instead.
+    """
+
+    def __init__(self) -> None:
+        self._files: dict[str, DefaultsFile] = {}
+        self._snapshots: dict[str, tuple[int, SnapshotEntries]] = {}
+
+    def clear(self) -> None:
+        """Drop all parsed defaults files and snapshots"""
+        self._files.clear()
+        self._snapshots.clear()
+
+    def get_snapshot_entries(self, defaults_directory: str) -> SnapshotEntries:
+        """Return the compiled snapshot entries of a defaults directory, if any"""
+        snapshot_file = snapshot_path(defaults_directory)
+        try:
+            mtime_ns = os.stat(snapshot_file).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        cached = self._snapshots.get(snapshot_file)
+        if cached is None or cached[0] != mtime_ns:
+            cached = (mtime_ns, load_snapshot(snapshot_file) or {})
+            self._snapshots[snapshot_file] = cached
+        return cached[1]
+
+    def read_document(self, file_path: str) -> dict[str, Any]:
+        """Read a defaults document from the snapshot when its hash matches, else from yaml"""
+        with open(file_path, "rb") as defaults_stream:
+            content = defaults_stream.read()
+        entries = self.get_snapshot_entries(os.path.dirname(file_path))
+        entry = entries.get(os.path.basename(file_path))
+        if entry is not None and entry[0] == content_hash(content):
+            return entry[1]
+        return yaml_load(content.decode("UTF-8"))
+
+    def get_file(self, defaults_file: str) -> DefaultsFile:
+        """Return the parsed and indexed defaults file"""
+        file_path = os.path.abspath(defaults_file)
+        mtime_ns = os.stat(file_path).st_mtime_ns
+        parsed = self._files.get(file_path)
+        if parsed is None or parsed.mtime_ns != mtime_ns:
+            parsed = DefaultsFile(file_path, mtime_ns, self.read_document(file_path))
+            self._files[file_path] = parsed
+        return parsed
+
+    def get_document(self, defaults_file: str) -> dict[str, Any]:
+        """Return the full parsed defaults document"""
+        return self.get_file(defaults_file).document
+
+    def has_template(
+        self, template: str, defaults_file: str, channel: Optional[str] = None
+    ) -> bool:
+        """Return whether a defaults file contains a template, optionally within a channel"""
+        return self.get_file(defaults_file).has_template(template, channel)
+
+    def get_model(
+        self,
+        model_class: type[ModelType],
+        template: str,
+        defaults_file: str,
+        channel: Optional[str] = None,
+    ) -> ModelType:
+        """
+        Build a new model instance from the fields eligible for default of a template.
+        A new instance is returned on every call so callers are free to mutate it.
+        """
+        defaults = self.get_file(defaults_file).get_template_defaults(template, channel)
+        keys = model_class.default_fields()  # type: ignore
+        return model_class(**{k: v for k, v in defaults.items() if k in keys and v is not None})
+
+
+# Shared by the API, the CLIs and the tests
+defaults_registry = DefaultsRegistry()
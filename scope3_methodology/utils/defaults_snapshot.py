@@ -0,0 +1,65 @@
+""" Compiled binary snapshot of the defaults files """
+import hashlib
+import os
+import pickle  # nosec - the snapshot is a trusted build artifact
+from glob import glob
+from typing import Any, Optional
+
+from scope3_methodology.utils.yaml_helpers import yaml_load
+
+SNAPSHOT_FILE_NAME = ".defaults-snapshot.pickle"
+SNAPSHOT_VERSION = 1
+
+# Key: defaults file name
+# Value: (content hash of the source yaml, parsed document)
+SnapshotEntries = dict[str, tuple[str, dict[str, Any]]]
+
+
+def content_hash(content: bytes) -> str:
+    """Return the content hash used to validate a snapshot entry against its source yaml"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def snapshot_path(defaults_directory: str) -> str:
+    """Return the path of the snapshot for a defaults directory"""
+    return os.path.join(defaults_directory, SNAPSHOT_FILE_NAME)
+
+
+def compile_snapshot(defaults_directory: str) -> str:
+    """
+    Parse every defaults yaml file in the directory and write them to a single binary snapshot,
+    at the snapshot_path of the directory, where DefaultsRegistry looks for it.
+    Decimals are pickled from their exact string representation so no precision is lost.
+    :return: path of the written snapshot
+    """
+    entries: SnapshotEntries = {}
+    for file in sorted(glob(f"{defaults_directory}/*.yaml")):
+        with open(file, "rb") as stream:
+            content = stream.read()
+        entries[os.path.basename(file)] = (
+            content_hash(content),
+            yaml_load(content.decode("UTF-8")),
+        )
+
+    output_file = snapshot_path(defaults_directory)
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, "wb") as write_stream:
+        pickle.dump(
+            {"version": SNAPSHOT_VERSION, "entries": entries},
+            write_stream,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_file, output_file)
+    return output_file
+
+
+def load_snapshot(snapshot_file: str) -> Optional[SnapshotEntries]:
+    """Load a snapshot, returning None if it is missing, unreadable or from another version"""
+    try:
+        with open(snapshot_file, "rb") as stream:
+            snapshot = pickle.load(stream)  # nosec
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    return snapshot["entries"]
@@ -0,0 +1,146 @@
+""" Structured trace of how results are derived, the explain mode of the API and CLIs """
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, Iterator, Optional
+
+from scope3_methodology.utils.custom_base_model import MISSING, CustomBaseModel
+
+DERIVATION_SOURCES = ("input", "default", "calculation")
+
+
+class DerivationStep:
+    """A named value, where it comes from and the steps it was derived from"""
+
+    __slots__ = ("name", "value", "source", "depth", "children")
+
+    def __init__(self, name: str, value: Any, source: str, depth: int) -> None:
+        self.name = name
+        self.value = value
+        self.source = source
+        self.depth = depth
+        self.children: list["DerivationStep"] = []
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the step and its children as plain dictionaries, without empty children"""
+        step = {
+            "name": self.name,
+            "value": self.value,
+            "source": self.source,
+            "depth": self.depth,
+        }
+        if self.children:
+            step["children"] = [child.to_dict() for child in self.children]
+        return step
+
+
+class DerivationTrace:
+    """
+    Collects the steps logged by log_step and log_result per modeled object, inputs in a
+    list and calculations in a tree. Calculations are logged after the calculations they
+    depend on, which are logged with a lower depth, so a calculation adopts every preceding
+    calculation with a lower depth that has no parent yet.
+    """
+
+    __slots__ = ("models", "inputs", "steps")
+
+    def __init__(self) -> None:
+        self.models: list[dict[str, Any]] = []
+        self.inputs: list[DerivationStep] = []
+        self.steps: list[DerivationStep] = []
+
+    def add(self, name: str, value: Any, source: str, depth: int) -> None:
+        """Add an input or a calculation, adopting the calculations it depends on"""
+        if source not in DERIVATION_SOURCES:
+            raise Exception(f"Unknown derivation source {source}")
+        step = DerivationStep(name, value, source, depth)
+        if source != "calculation":
+            self.inputs.append(step)
+            return
+        index = len(self.steps)
+        while index > 0 and self.steps[index - 1].depth < depth:
+            index -= 1
+        step.children = self.steps[index:]
+        del self.steps[index:]
+        self.steps.append(step)
+
+    def add_model(self, name: str, model: CustomBaseModel) -> None:
+        """
+        Close the derivation of a modeled object with the steps added since the previous one
+        and the inputs of the model, each marked as provided or taken from its defaults
+        """
+        inputs = self.inputs
+        names = {step.name for step in inputs}
+        resolved = model.resolve()
+        for field, value in zip(resolved._fields, resolved):
+            if value is None or value is MISSING or field in names:
+                continue
+            provided = object.__getattribute__(model, field) is not None
+            inputs.append(DerivationStep(field, value, "input" if provided else "default", 0))
+        self.models.append({"name": name, "inputs": inputs, "derivation": self.steps})
+        self.inputs = []
+        self.steps = []
+
+    def to_dict(self) -> list[dict[str, Any]]:
+        """
+        Return the inputs and the tree of derivation steps of every modeled object as
+        plain dictionaries, then the steps that do not belong to a modeled object, if any
+        """
+        models = [
+            {
+                "name": model["name"],
+                "inputs": [step.to_dict() for step in model["inputs"]],
+                "derivation": [step.to_dict() for step in model["derivation"]],
+            }
+            for model in self.models
+        ]
+        if self.inputs or self.steps:
+            models.append(
+                {
+                    "name": None,
+                    "inputs": [step.to_dict() for step in self.inputs],
+                    "derivation": [step.to_dict() for step in self.steps],
+                }
+            )
+        return models
+
+    def write_json(self, file_path: str) -> None:
+        """Write the trace to a JSON file, with decimals as numbers"""
+        with open(file_path, "w", encoding="UTF-8") as stream:
+            json.dump(self.to_dict(), stream, default=json_default, indent=2)
+
+
+def json_default(value: Any) -> Any:
+    """Serialise decimals as numbers, and anything else as a string"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+active_trace: ContextVar[Optional[DerivationTrace]] = ContextVar("active_trace", default=None)
+
+
+def trace_model(name: str, model: CustomBaseModel) -> None:
+    """Close the derivation of a modeled object in the active trace, see add_model"""
+    trace = active_trace.get()
+    if trace is not None:
+        trace.add_model(name, model)
+
+
+def start_derivation_trace() -> DerivationTrace:
+    """Collect the derivation steps of the current context, until the end of the program"""
+    trace = DerivationTrace()
+    active_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def derivation_trace() -> Iterator[DerivationTrace]:
+    """Collect the derivation steps of the current context within the with block"""
+    trace = DerivationTrace()
+    token = active_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        active_trace.reset(token)
@@ -0,0 +1,110 @@
+""" Persistent index of the facts extracted from each yaml file under data """
+import hashlib
+import os
+import pickle  # nosec - the index is a local cache written by this module
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from scope3_methodology.utils.utils import Fact
+
+FACT_INDEX_VERSION = 1
+DEFAULT_FACT_INDEX_FILE = "data/.fact-index.pickle"
+
+
+class FactIndexEntry:
+    """The facts of a single file with the stat and content hash they were extracted from"""
+
+    def __init__(
+        self,
+        mtime_ns: int,
+        size: int,
+        content_hash: str,
+        facts: dict[str, list["Fact"]],
+    ) -> None:
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.content_hash = content_hash
+        self.facts = facts
+
+
+class FactIndex:
+    """
+    Facts per file keyed by file path, modification time and content hash.
+    Unchanged files only cost a stat(), touched files with identical content only
+    cost a hash, and only new or changed files are extracted again.
+    """
+
+    def __init__(self, index_file: str) -> None:
+        self.index_file = index_file
+        self.entries: dict[str, FactIndexEntry] = {}
+        self.changed = False
+
+    @classmethod
+    def load(cls, index_file: str) -> "FactIndex":
+        """Load an index from disk, starting empty if it is missing, invalid or outdated"""
+        fact_index = cls(index_file)
+        try:
+            with open(index_file, "rb") as stream:
+                stored = pickle.load(stream)  # nosec
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return fact_index
+        if isinstance(stored, dict) and stored.get("version") == FACT_INDEX_VERSION:
+            fact_index.entries = stored["entries"]
+        return fact_index
+
+    def save(self) -> None:
+        """Write the index to disk if anything changed"""
+        if not self.changed:
+            return
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "wb") as write_stream:
+            pickle.dump(
+                {"version": FACT_INDEX_VERSION, "entries": self.entries},
+                write_stream,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_file, self.index_file)
+        self.changed = False
+
+    def get_facts(
+        self,
+        files: list[str],
+        extract: Callable[[list[tuple[str, bytes]]], list[dict[str, list["Fact"]]]],
+    ) -> list[dict[str, list["Fact"]]]:
+        """
+        Return the facts of every file in order. New or changed files are passed to extract
+        in a single batch of (file, content) pairs, and files that no longer exist are
+        pruned from the index.
+        """
+        stale_files: list[tuple[str, os.stat_result, str, bytes]] = []
+        for file in files:
+            stat = os.stat(file)
+            entry: Optional[FactIndexEntry] = self.entries.get(file)
+            if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                continue
+
+            with open(file, "rb") as stream:
+                content = stream.read()
+            content_hash = hashlib.sha256(content).hexdigest()
+            if entry and entry.content_hash == content_hash:
+                self.entries[file] = FactIndexEntry(
+                    stat.st_mtime_ns, stat.st_size, content_hash, entry.facts
+                )
+                self.changed = True
+            else:
+                stale_files.append((file, stat, content_hash, content))
+
+        if stale_files:
+            extracted = extract([(file, content) for file, _, _, content in stale_files])
+            for (file, stat, content_hash, _), facts in zip(stale_files, extracted):
+                self.entries[file] = FactIndexEntry(
+                    stat.st_mtime_ns, stat.st_size, content_hash, facts
+                )
+            self.changed = True
+
+        removed_files = set(self.entries).difference(files)
+        for file in removed_files:
+            del self.entries[file]
+        if removed_files:
+            self.changed = True
+        return [self.entries[file].facts for file in files]
@@ -0,0 +1,271 @@
+""" Columnar storage for facts with interned strings """
+from array import array
+from decimal import Decimal
+from typing import Collection, Iterable, Iterator, Mapping, Optional
+
+import yaml
+
+from scope3_methodology.utils.utils import Fact, get_all_file_facts
+
+
+class StringTable:
+    """Interns strings (and None) to integer codes"""
+
+    __slots__ = ("strings", "codes")
+
+    def __init__(self) -> None:
+        self.strings: list[Optional[str]] = []
+        self.codes: dict[Optional[str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def intern(self, value: Optional[str]) -> int:
+        """Return the code of a string, adding it to the table if needed"""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(value)
+            self.codes[value] = code
+        return code
+
+
+class FactView:
+    """A lightweight read only view of a single fact in a FactStore"""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: "FactStore", row: int) -> None:
+        self.store = store
+        self.row = row
+
+    @property
+    def company(self) -> str:
+        """Company (file) the fact was found in"""
+        return self.store.companies.strings[self.store.company_codes[self.row]]  # type: ignore
+
+    @property
+    def url(self) -> str:
+        """Source url of the fact"""
+        return self.store.urls.strings[self.store.url_codes[self.row]]  # type: ignore
+
+    @property
+    def is_calculation(self) -> bool:
+        """Whether the fact is a calculation"""
+        return bool(self.store.is_calculation[self.row])
+
+    @property
+    def value(self) -> Decimal:
+        """Value of the fact"""
+        return self.store.values[self.row]
+
+    @property
+    def template(self) -> str:
+        """Template of the fact"""
+        return self.store.templates.strings[self.store.template_codes[self.row]]  # type: ignore
+
+    @property
+    def channel(self) -> Optional[str]:
+        """Channel of the fact"""
+        return self.store.channels.strings[self.store.channel_codes[self.row]]
+
+    @property
+    def key(self) -> str:
+        """Key of the fact"""
+        return self.store.keys.strings[self.store.key_codes[self.row]]  # type: ignore
+
+    def to_fact(self) -> Fact:
+        """Materialise the view into a standalone Fact"""
+        return Fact(
+            self.company,
+            self.url,
+            self.is_calculation,
+            self.value,
+            self.template,
+            self.channel,
+            self.key,
+        )
+
+    def __repr__(self):
+        calc = " (calculation)" if self.is_calculation else ""
+        if self.channel:
+            return f"{self.company}({self.channel}{self.template}){calc} {self.key}: {self.value}"
+        return f"{self.company}({self.template}){calc} {self.key}: {self.value}"
+
+
+class FactStore:
+    """
+    Facts stored column-wise: one array of string codes per string field, interned
+    through a string table per field, and the exact Decimal values in a list.
+    Rows keep the order facts were added in.
+    """
+
+    __slots__ = (
+        "companies",
+        "urls",
+        "templates",
+        "channels",
+        "keys",
+        "company_codes",
+        "url_codes",
+        "template_codes",
+        "channel_codes",
+        "key_codes",
+        "is_calculation",
+        "values",
+        "_key_rows",
+    )
+
+    def __init__(self) -> None:
+        self.companies = StringTable()
+        self.urls = StringTable()
+        self.templates = StringTable()
+        self.channels = StringTable()
+        self.keys = StringTable()
+        self.company_codes = array("I")
+        self.url_codes = array("I")
+        self.template_codes = array("I")
+        self.channel_codes = array("I")
+        self.key_codes = array("I")
+        self.is_calculation = bytearray()
+        self.values: list[Decimal] = []
+        self._key_rows: Optional[dict[int, array]] = None
+
+    @classmethod
+    def from_facts(cls, facts: Mapping[str, list[Fact]] | Iterable[Fact]) -> "FactStore":
+        """Build a store from the get_all_facts dictionary or a stream of facts"""
+        store = cls()
+        store.extend(facts)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self) -> Iterator[FactView]:
+        for row in range(len(self.values)):
+            yield FactView(self, row)
+
+    def __getitem__(self, row: int) -> FactView:
+        if not 0 <= row < len(self.values):
+            raise IndexError(f"Fact row {row} out of range")
+        return FactView(self, row)
+
+    def append(
+        self,
+        company: str,
+        url: str | None,
+        is_calculation: bool,
+        value: Decimal,
+        template: str,
+        channel: str | None,
+        key: str,
+    ) -> None:
+        """Add a single fact, with the same arguments as Fact"""
+        self.company_codes.append(self.companies.intern(company))
+        self.url_codes.append(self.urls.intern("n/a" if not url else url))
+        self.is_calculation.append(1 if is_calculation else 0)
+        self.values.append(value)
+        self.template_codes.append(self.templates.intern(template))
+        self.channel_codes.append(self.channels.intern(channel))
+        self.key_codes.append(self.keys.intern(key))
+        self._key_rows = None
+
+    def extend(self, facts: Mapping[str, list[Fact]] | Iterable[Fact]) -> None:
+        """Add facts from a get_all_facts style dictionary or a stream of facts"""
+        if isinstance(facts, Mapping):
+            facts = (fact for key_facts in facts.values() for fact in key_facts)
+        for fact in facts:
+            self.append(
+                fact.company,
+                fact.url,
+                fact.is_calculation,
+                fact.value,
+                fact.template,
+                fact.channel,
+                fact.key,
+            )
+
+    def group_by_key(self, keys: Optional[Collection[str]] = None) -> dict[str, array]:
+        """
+        Return the rows of each key, keys ordered by their first fact and rows in store order.
+        This is the same grouping as the get_all_facts dictionary.
+        """
+        if self._key_rows is None:
+            key_rows: dict[int, array] = {}
+            for row, key_code in enumerate(self.key_codes):
+                rows = key_rows.get(key_code)
+                if rows is None:
+                    rows = key_rows[key_code] = array("I")
+                rows.append(row)
+            self._key_rows = key_rows
+        return {
+            self.keys.strings[key_code]: rows  # type: ignore
+            for key_code, rows in self._key_rows.items()
+            if keys is None or self.keys.strings[key_code] in keys
+        }
+
+    def filter(
+        self,
+        keys: Optional[Collection[str]] = None,
+        templates: Optional[Collection[str]] = None,
+        channels: Optional[Collection[Optional[str]]] = None,
+    ) -> array:
+        """Return the rows matching all of the provided keys, templates and channels"""
+        columns = [
+            (self.keys, self.key_codes, keys),
+            (self.templates, self.template_codes, templates),
+            (self.channels, self.channel_codes, channels),
+        ]
+        conditions = [
+            (
+                codes,
+                {table.codes[value] for value in values if value in table.codes},
+            )
+            for table, codes, values in columns
+            if values is not None
+        ]
+        return array(
+            "I",
+            (
+                row
+                for row in range(len(self.values))
+                if all(codes[row] in allowed for codes, allowed in conditions)
+            ),
+        )
+
+    def to_dict(self) -> dict[str, list[Fact]]:
+        """Materialise the store into a get_all_facts style dictionary"""
+        return {
+            key: [FactView(self, row).to_fact() for row in rows]
+            for key, rows in self.group_by_key().items()
+        }
+
+
+def get_fact_store(index_file: Optional[str] = None, workers: int = 1) -> FactStore:
+    """
+    Extract all facts from all yaml files under data into a FactStore, see get_all_file_facts.
+    Files are added one at a time so the Fact objects of only one file are alive at once.
+    """
+    store = FactStore()
+    for file_facts in get_all_file_facts(index_file, workers):
+        store.extend(file_facts)
+    return store
+
+
+def represent_fact_view(dumper, data: FactView):
+    """Dump a fact view with the same fields as a Fact"""
+    return dumper.represent_mapping(
+        "tag:yaml.org,2002:map",
+        {
+            "company": data.company,
+            "url": data.url,
+            "is_calculation": data.is_calculation,
+            "value": data.value,
+            "template": data.template,
+            "channel": data.channel,
+            "key": data.key,
+        },
+    )
+
+
+yaml.add_representer(FactView, represent_fact_view)
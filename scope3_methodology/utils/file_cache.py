@@ -0,0 +1,93 @@
+""" Bounded least recently used cache of values derived from files """
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, TypeVar
+
+ValueType = TypeVar("ValueType")
+
+
+class CachedFile(Generic[ValueType]):
+    """A value derived from a file with the stat it was derived from and its ETag"""
+
+    __slots__ = ("mtime_ns", "size", "etag", "value")
+
+    def __init__(self, mtime_ns: int, size: int, etag: str, value: ValueType) -> None:
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = etag
+        self.value = value
+
+
+class FileCache(Generic[ValueType]):
+    """
+    Keeps the values derived from at most max_size files, keyed by file path and revalidated
+    against the modification time and size of the file on every lookup.
+    The least recently used file is evicted first, a max_size of 0 disables caching.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        if max_size < 0:
+            raise Exception(f"Cache size must not be negative, got {max_size}")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, CachedFile[ValueType]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Drop all cached values and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get(self, file_path: str, load: Callable[[bytes], ValueType]) -> CachedFile[ValueType]:
+        """
+        Return the cached value of a file, calling load with the file content if the file
+        is not cached or changed since. The ETag is a hash of the file content.
+        """
+        stat = os.stat(file_path)
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                self._entries.move_to_end(file_path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        with open(file_path, "rb") as stream:
+            content = stream.read()
+        entry = CachedFile(
+            stat.st_mtime_ns,
+            stat.st_size,
+            f'"{hashlib.sha256(content).hexdigest()[:32]}"',
+            load(content),
+        )
+        if self.max_size == 0:
+            return entry
+
+        with self._lock:
+            self._entries[file_path] = entry
+            self._entries.move_to_end(file_path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit, miss and eviction counters with the current and maximum size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
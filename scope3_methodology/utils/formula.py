@@ -0,0 +1,533 @@
+""" Declarative formula graphs of the models, compiled into scalar and NumPy evaluators """
+import operator
+from typing import Any, Callable, Iterator, Optional, Sequence
+from weakref import WeakValueDictionary
+
+import numpy
+
+from scope3_methodology.utils.utils import (
+    derivation_logging_enabled,
+    log_result,
+    not_none,
+)
+
+OPERATORS = {"add": "+", "sub": "-", "mul": "*", "div": "/"}
+OPERATOR_FUNCTIONS = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "div": operator.truediv,
+}
+BRANCHES = {"if_truthy", "if_not_none"}
+
+
+class Formula:
+    """
+    A node of a formula graph: an input of the model, a parameter of the evaluator, a
+    constant or an operation on other formulas. Formulas are built with the arithmetic
+    operators and the functions below. Identical formulas are the same object, so a
+    sub-expression shared by several results is evaluated once.
+    """
+
+    __slots__ = ("operation", "operands", "__weakref__")
+
+    operation: str
+    operands: tuple[Any, ...]
+
+    def __new__(cls, operation: str, *operands: Any) -> "Formula":
+        key = (operation, *(constant_key(operand) for operand in operands))
+        formula = interned_formulas.get(key)
+        if formula is None:
+            formula = interned_formulas[key] = super().__new__(cls)
+            formula.operation = operation
+            formula.operands = operands
+        return formula
+
+    def __repr__(self) -> str:
+        if self.operation in ("input", "parameter", "constant"):
+            return f"{self.operation}({self.operands[0]!r})"
+        operands = ", ".join(repr(operand) for operand in self.operands)
+        return f"{self.operation}({operands})"
+
+    def __bool__(self) -> bool:
+        raise Exception("Formulas have no truth value, use if_truthy or if_not_none")
+
+    def __add__(self, other: Any) -> "Formula":
+        return Formula("add", self, as_formula(other))
+
+    def __radd__(self, other: Any) -> "Formula":
+        return Formula("add", as_formula(other), self)
+
+    def __sub__(self, other: Any) -> "Formula":
+        return Formula("sub", self, as_formula(other))
+
+    def __rsub__(self, other: Any) -> "Formula":
+        return Formula("sub", as_formula(other), self)
+
+    def __mul__(self, other: Any) -> "Formula":
+        return Formula("mul", self, as_formula(other))
+
+    def __rmul__(self, other: Any) -> "Formula":
+        return Formula("mul", as_formula(other), self)
+
+    def __truediv__(self, other: Any) -> "Formula":
+        return Formula("div", self, as_formula(other))
+
+    def __rtruediv__(self, other: Any) -> "Formula":
+        return Formula("div", as_formula(other), self)
+
+
+# Key: operation and operands, constants by type and representation
+# Value: the only formula with this key, dropped once unused, such as the constants folded
+# from defaults by Formulas.specialise when its kernel is released
+interned_formulas: WeakValueDictionary[tuple, Formula] = WeakValueDictionary()
+
+
+def constant_key(operand: Any) -> Any:
+    """Return a key telling constants apart, Decimal("1.0") from Decimal("1") or 1"""
+    if isinstance(operand, Formula):
+        return operand
+    return (type(operand), repr(operand))
+
+
+def model_input(name: str) -> Formula:
+    """An input of the model, read from its resolved inputs"""
+    return Formula("input", name)
+
+
+def parameter(name: str) -> Formula:
+    """A value passed to the evaluator that is not an input of the model"""
+    return Formula("parameter", name)
+
+
+def constant(value: Any) -> Formula:
+    """A constant, integers combine exactly with either numeric backend"""
+    return Formula("constant", value)
+
+
+def as_formula(value: Any) -> Formula:
+    """Return a formula as is and any other value as a constant"""
+    return value if isinstance(value, Formula) else constant(value)
+
+
+def required(formula: Formula) -> Formula:
+    """The value of a formula, raising like not_none when it is None"""
+    return Formula("required", formula)
+
+
+def if_truthy(condition: Formula, then: Any, otherwise: Any) -> Formula:
+    """then if the condition is truthy, otherwise otherwise, only the branch taken is evaluated"""
+    return Formula("if_truthy", condition, as_formula(then), as_formula(otherwise))
+
+
+def if_not_none(condition: Formula, then: Any, otherwise: Any) -> Formula:
+    """then if the condition is not None, otherwise otherwise"""
+    return Formula("if_not_none", condition, as_formula(then), as_formula(otherwise))
+
+
+def round_to(formula: Formula, digits: int) -> Formula:
+    """The value of a formula rounded to a number of decimal places"""
+    return Formula("round", formula, digits)
+
+
+def logged(formula: Formula, name: str, depth: int, value_format: str = "") -> Formula:
+    """
+    The value of a formula, logged as a result when derivation logging is enabled, see
+    log_result. The depth is relative to the depth the evaluator is called with.
+    """
+    return Formula("log", formula, name, depth, value_format)
+
+
+def after(first: Formula, then: Any) -> Formula:
+    """The value of then, evaluated after first for the results it logs and the errors it raises"""
+    return Formula("after", first, as_formula(then))
+
+
+def walk(outputs: Sequence[Formula]) -> Iterator[Formula]:
+    """Yield every formula the outputs depend on once, operands before the formulas using them"""
+    visited: set[Formula] = set()
+    for output in outputs:
+        stack: list[tuple[Formula, bool]] = [(output, False)]
+        while stack:
+            formula, expanded = stack.pop()
+            if expanded:
+                yield formula
+                continue
+            if formula in visited:
+                continue
+            visited.add(formula)
+            stack.append((formula, True))
+            for operand in reversed(operands_of(formula)):
+                if operand not in visited:
+                    stack.append((operand, False))
+
+
+def operands_of(formula: Formula) -> tuple[Formula, ...]:
+    """Return the operands of a formula that are formulas"""
+    if formula.operation in ("input", "parameter", "constant"):
+        return ()
+    if formula.operation in ("round", "log"):
+        return formula.operands[:1]
+    return formula.operands
+
+
+def unconditional(outputs: Sequence[Formula]) -> set[Formula]:
+    """Return the formulas evaluated whatever the branches taken"""
+    evaluated: set[Formula] = set()
+    stack = list(outputs)
+    while stack:
+        formula = stack.pop()
+        if formula in evaluated:
+            continue
+        evaluated.add(formula)
+        operands = operands_of(formula)
+        # Only the condition of a branch is always evaluated
+        stack.extend(operands[:1] if formula.operation in BRANCHES else operands)
+    return evaluated
+
+
+def is_constant(formula: Formula) -> bool:
+    """Return whether a formula is a constant"""
+    return formula.operation == "constant"
+
+
+def fold_branch(
+    formula: Formula, values: dict[str, Any], folded: dict[Formula, Formula]
+) -> Formula:
+    """Fold a branch, replaced by the branch taken when its condition is constant"""
+    operation, operands = formula.operation, formula.operands
+    condition = fold(operands[0], values, folded)
+    if is_constant(condition):
+        value = condition.operands[0]
+        taken = value if operation == "if_truthy" else value is not None
+        return fold(operands[1] if taken else operands[2], values, folded)
+    then, otherwise = (fold(operand, values, folded) for operand in operands[1:])
+    return Formula(operation, condition, then, otherwise)
+
+
+def fold_operation(
+    formula: Formula, values: dict[str, Any], folded: dict[Formula, Formula]
+) -> Formula:
+    """Fold an operator or a rounding, computed when all its operands are constants"""
+    operation, operands = formula.operation, formula.operands
+    folded_operands = [fold(operand, values, folded) for operand in operands_of(formula)]
+    if operation == "round":
+        result = round_to(folded_operands[0], operands[1])
+        compute: Callable[..., Any] = lambda value: round(value, operands[1])
+    else:
+        result = Formula(operation, *folded_operands)
+        compute = OPERATOR_FUNCTIONS[operation]
+    if all(is_constant(operand) for operand in folded_operands):
+        try:
+            result = constant(compute(*(operand.operands[0] for operand in folded_operands)))
+        except (ArithmeticError, TypeError):
+            pass
+    return result
+
+
+def fold(formula: Formula, values: dict[str, Any], folded: dict[Formula, Formula]) -> Formula:
+    """
+    Return a formula with the inputs in values replaced by constants, and the operations on
+    constants computed. Branches on a constant condition are replaced by the branch taken.
+    Operations raising, such as a division by zero in a branch that may not be taken, are
+    left for the evaluator so errors are raised when and as the methods would raise them.
+    Logged results are kept, and logged when evaluated with their folded value.
+    """
+    result = folded.get(formula)
+    if result is not None:
+        return result
+    operation, operands = formula.operation, formula.operands
+    if operation == "input":
+        result = constant(values[operands[0]]) if operands[0] in values else formula
+    elif operation in ("parameter", "constant"):
+        result = formula
+    elif operation == "required":
+        operand = fold(operands[0], values, folded)
+        is_value = is_constant(operand) and operand.operands[0] is not None
+        result = operand if is_value else required(operand)
+    elif operation in BRANCHES:
+        result = fold_branch(formula, values, folded)
+    elif operation == "log":
+        result = logged(fold(operands[0], values, folded), *operands[1:])
+    elif operation == "after":
+        first, then = (fold(operand, values, folded) for operand in operands)
+        result = then if is_constant(first) else after(first, then)
+    else:
+        result = fold_operation(formula, values, folded)
+    folded[formula] = result
+    return result
+
+
+class ScalarCodeGenerator:
+    """
+    Generates the Python source of a scalar evaluator. Formulas evaluated whatever the
+    branches taken are assigned to local variables once, in dependency order. Branches are
+    if statements assigning the formulas of the branch taken, so only those are evaluated
+    and logged.
+    """
+
+    def __init__(
+        self, outputs: Sequence[Formula], parameters: Sequence[str], single: bool = False
+    ) -> None:
+        self.outputs = outputs
+        self.parameters = parameters
+        self.single = single
+        self.constants: list[Any] = []
+        self.lines: list[str] = []
+        self.count = 0
+
+    def constant(self, value: Any) -> str:
+        """Return the source of a constant, inlined when its representation is exact"""
+        if value is None or type(value) in (int, bool):  # pylint: disable=unidiomatic-typecheck
+            return repr(value)
+        self.constants.append(value)
+        return f"c{len(self.constants) - 1}"
+
+    def emit(self, line: str, indent: int) -> None:
+        """Add a line to the body of the evaluator"""
+        self.lines.append(f"{'    ' * indent}{line}")
+
+    def assign(self, expression: str, indent: int) -> str:
+        """Assign an expression to a new local variable, returning its name"""
+        name = f"v{self.count}"
+        self.count += 1
+        self.emit(f"{name} = {expression}", indent)
+        return name
+
+    def value(self, formula: Formula, scope: dict[Formula, str], indent: int) -> str:
+        """
+        Return the source of the value of a formula: its local variable in scope, or
+        the new local variable of the statements added to compute it
+        """
+        operation, operands = formula.operation, formula.operands
+        if operation == "input":
+            return f"inputs.{operands[0]}"
+        if operation == "parameter":
+            return operands[0]
+        if operation == "constant":
+            return self.constant(operands[0])
+        name = scope.get(formula)
+        if name is None:
+            name = scope[formula] = self.statements(formula, scope, indent)
+        return name
+
+    def branch(self, formula: Formula, scope: dict[Formula, str], indent: int) -> str:
+        """Add an if statement computing the branch taken, in a scope of its own"""
+        operation, operands = formula.operation, formula.operands
+        condition = self.value(operands[0], scope, indent)
+        name = f"v{self.count}"
+        self.count += 1
+        self.emit(
+            f"if {condition}:" if operation == "if_truthy" else f"if {condition} is not None:",
+            indent,
+        )
+        self.emit(f"{name} = {self.value(operands[1], dict(scope), indent + 1)}", indent + 1)
+        self.emit("else:", indent)
+        self.emit(f"{name} = {self.value(operands[2], dict(scope), indent + 1)}", indent + 1)
+        return name
+
+    def statements(self, formula: Formula, scope: dict[Formula, str], indent: int) -> str:
+        """Add the statements computing a formula, returning the source of its value"""
+        operation, operands = formula.operation, formula.operands
+        if operation in BRANCHES:
+            return self.branch(formula, scope, indent)
+        values = [self.value(operand, scope, indent) for operand in operands_of(formula)]
+        if operation == "required":
+            name = values[0] if values[0] in scope.values() else self.assign(values[0], indent)
+            self.emit(f"if {name} is None: not_none(None)", indent)
+            return name
+        if operation == "log":
+            key, depth, value_format = operands[1:]
+            self.emit(
+                f"if logging: log_result({key!r}, {values[0]}, depth + {depth!r}, "
+                f"{value_format!r})",
+                indent,
+            )
+            return values[0]
+        if operation == "after":
+            return values[1]
+        if operation == "round":
+            return self.assign(f"round({values[0]}, {operands[1]!r})", indent)
+        return self.assign(f"{values[0]} {OPERATORS[operation]} {values[1]}", indent)
+
+    def generate(self) -> str:
+        """Return the source of a function making the evaluator from the constants"""
+        evaluated = unconditional(self.outputs)
+        formulas = list(walk(self.outputs))
+        if any(formula.operation == "log" for formula in formulas):
+            self.emit("logging = derivation_logging_enabled()", 0)
+        scope: dict[Formula, str] = {}
+        for formula in formulas:
+            if formula in evaluated:
+                self.value(formula, scope, 0)
+        results = [self.value(output, scope, 0) for output in self.outputs]
+        self.emit(f"return {results[0]}" if self.single else f"return ({', '.join(results)},)", 0)
+
+        arguments = ", ".join(("inputs", *self.parameters, "depth=0"))
+        body = "".join(f"        {line}\n" for line in self.lines)
+        constants = ", ".join(f"c{index}" for index in range(len(self.constants)))
+        return (
+            f"def make_evaluator({constants}):\n"
+            f"    def evaluate({arguments}):\n"
+            f"{body}"
+            f"    return evaluate\n"
+        )
+
+
+def compile_scalar(
+    outputs: Sequence[Formula], parameters: Sequence[str] = (), single: bool = False
+) -> Callable[..., Any]:
+    """
+    Compile formulas into a function of the resolved inputs of a model, read as attributes,
+    of the parameters and of the depth results are logged at, returning the value of each
+    output, or the value of the only output if single. The function computes in the type of
+    its inputs, Decimal or float, see numeric_backend.
+    """
+    generator = ScalarCodeGenerator(outputs, parameters, single)
+    source = generator.generate()
+    namespace: dict[str, Any] = {
+        "derivation_logging_enabled": derivation_logging_enabled,
+        "log_result": log_result,
+        "not_none": not_none,
+    }
+    exec(compile(source, "<formula>", "exec"), namespace)  # nosec - generated from formulas
+    return namespace["make_evaluator"](*generator.constants)
+
+
+def scalar_function(formula: Formula, parameters: Sequence[str] = ()) -> Callable[..., Any]:
+    """Compile a formula into a function returning its value, see compile_scalar"""
+    return compile_scalar((formula,), parameters, single=True)
+
+
+class NumpyCodeGenerator:
+    """
+    Generates the Python source of a NumPy kernel evaluating every formula over whole
+    columns, both branches included, with None as NaN
+    """
+
+    def __init__(self, outputs: Sequence[Formula], parameters: Sequence[str]) -> None:
+        self.outputs = outputs
+        self.parameters = parameters
+        self.constants: list[float] = []
+        self.locals: dict[Formula, str] = {}
+
+    def statement(self, formula: Formula) -> str:
+        """Return the source computing a formula from the local variables of its operands"""
+        operation, operands = formula.operation, formula.operands
+        if operation == "input":
+            return f"column(inputs[{operands[0]!r}])"
+        if operation == "parameter":
+            return f"column({operands[0]})"
+        if operation == "constant":
+            self.constants.append(numpy.nan if operands[0] is None else float(operands[0]))
+            return f"c{len(self.constants) - 1}"
+        names = [self.locals[operand] for operand in operands_of(formula)]
+        if operation in ("required", "log"):
+            return names[0]
+        if operation == "after":
+            return names[1]
+        if operation in OPERATORS:
+            return f"{names[0]} {OPERATORS[operation]} {names[1]}"
+        if operation == "round":
+            return f"numpy.round({names[0]}, {operands[1]!r})"
+        condition, then, otherwise = names
+        if operation == "if_truthy":
+            return (
+                f"numpy.where(({condition} != 0) & ~numpy.isnan({condition}), {then}, {otherwise})"
+            )
+        return f"numpy.where(~numpy.isnan({condition}), {then}, {otherwise})"
+
+    def generate(self) -> str:
+        """Return the source of a function making the kernel from the constants"""
+        lines = []
+        for formula in walk(self.outputs):
+            name = f"v{len(self.locals)}"
+            lines.append(f"{name} = {self.statement(formula)}")
+            self.locals[formula] = name
+        results = ", ".join(self.locals[output] for output in self.outputs)
+        lines.append(f"return tuple(numpy.broadcast_arrays({results}))")
+
+        arguments = ", ".join(("inputs", *self.parameters))
+        body = "".join(f"            {line}\n" for line in lines)
+        constants = ", ".join(f"c{index}" for index in range(len(self.constants)))
+        return (
+            f"def make_kernel({constants}):\n"
+            f"    def kernel({arguments}):\n"
+            f"        with numpy.errstate(divide='ignore', invalid='ignore'):\n"
+            f"{body}"
+            f"    return kernel\n"
+        )
+
+
+def column(values: Any) -> Any:
+    """Return values, a sequence or a single value, as a float64 array with None as NaN"""
+    return numpy.asarray(values, dtype=numpy.float64)
+
+
+def compile_numpy(
+    outputs: Sequence[Formula], parameters: Sequence[str] = ()
+) -> Callable[..., tuple]:
+    """
+    Compile formulas into a NumPy kernel of a mapping of input names to columns, or to
+    single values applying to every row such as defaults, and of parameters, returning a
+    float64 array per output. Rows where the methods of the model would raise for a
+    missing value are NaN.
+    """
+    generator = NumpyCodeGenerator(outputs, parameters)
+    source = generator.generate()
+    namespace: dict[str, Any] = {"numpy": numpy, "column": column}
+    exec(compile(source, "<formula>", "exec"), namespace)  # nosec - generated from formulas
+    return namespace["make_kernel"](*generator.constants)
+
+
+class Formulas:
+    """
+    The named results of a model as formulas, compiled on first use into a scalar
+    evaluator and a NumPy kernel taking the parameters in the given order
+    """
+
+    def __init__(self, outputs: dict[str, Formula], parameters: Sequence[str] = ()) -> None:
+        self.outputs = outputs
+        self.names = tuple(outputs)
+        self.parameters = tuple(parameters)
+        found = {
+            formula.operands[0]
+            for formula in walk(tuple(outputs.values()))
+            if formula.operation == "parameter"
+        }
+        if found != set(self.parameters):
+            raise Exception(f"Formulas have parameters {sorted(found)}, not {self.parameters}")
+        self.scalar_evaluator: Optional[Callable[..., tuple]] = None
+        self.numpy_kernel: Optional[Callable[..., tuple]] = None
+
+    def input_names(self) -> list[str]:
+        """Return the names of the model inputs the formulas read"""
+        return sorted(
+            formula.operands[0]
+            for formula in walk(tuple(self.outputs.values()))
+            if formula.operation == "input"
+        )
+
+    def scalar(self) -> Callable[..., tuple]:
+        """Return the scalar evaluator, see compile_scalar"""
+        if self.scalar_evaluator is None:
+            self.scalar_evaluator = compile_scalar(tuple(self.outputs.values()), self.parameters)
+        return self.scalar_evaluator
+
+    def numpy(self) -> Callable[..., tuple]:
+        """Return the NumPy kernel, see compile_numpy"""
+        if self.numpy_kernel is None:
+            self.numpy_kernel = compile_numpy(tuple(self.outputs.values()), self.parameters)
+        return self.numpy_kernel
+
+    def specialise(self, values: dict[str, Any]) -> "Formulas":
+        """Return the formulas with the given inputs fixed to their values, see fold"""
+        folded: dict[Formula, Formula] = {}
+        return Formulas(
+            {name: fold(output, values, folded) for name, output in self.outputs.items()},
+            self.parameters,
+        )
+
+    def evaluate_columns(self, inputs: dict[str, Any], *parameters: Any) -> dict[str, Any]:
+        """Evaluate the NumPy kernel, returning a column per output name"""
+        return dict(zip(self.names, self.numpy()(inputs, *parameters)))
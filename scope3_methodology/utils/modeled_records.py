@@ -0,0 +1,188 @@
+""" Modeled result records, and a container storing many of them column wise """
+import csv
+import json
+from dataclasses import dataclass, fields
+from enum import Enum
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Generic,
+    Iterable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
+
+import yaml
+from typing_extensions import dataclass_transform
+from yaml.events import (
+    DocumentEndEvent,
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+)
+from yaml.nodes import MappingNode
+
+from scope3_methodology.utils.derivation import json_default
+from scope3_methodology.utils.yaml_helpers import CustomDumper, configure_dumper
+
+MAPPING_TAG = "tag:yaml.org,2002:map"
+
+# Formats ModeledRecords.write writes, the first one by default
+OUTPUT_FORMATS = ("yaml", "json", "csv")
+
+R = TypeVar("R")
+
+
+def represent_modeled_record(dumper, data: Any):
+    """Dump a modeled record as a mapping of its fields, as a dataclass with a __dict__ was"""
+    return dumper.represent_mapping(
+        MAPPING_TAG,
+        [(name, getattr(data, name)) for name in sorted(data.__dataclass_fields__)],
+    )
+
+
+@dataclass_transform()
+def modeled_record(*, frozen: bool = False) -> Callable[[type[R]], type[R]]:
+    """
+    Declare a modeled result as a dataclass with slots instead of a __dict__, frozen unless
+    it is completed after it is modeled. The records still dump to yaml as mappings.
+    """
+
+    def decorate(cls: type[R]) -> type[R]:
+        record_class = dataclass(slots=True, frozen=frozen)(cls)
+        yaml.add_representer(record_class, represent_modeled_record)
+        return record_class
+
+    return decorate
+
+
+def column_value(value: Any) -> Any:
+    """Return a value of a column as written to CSV, enums by their value"""
+    return value.value if isinstance(value, Enum) else value
+
+
+def serialize_node(dumper: CustomDumper, node: Any) -> None:
+    """Emit the events of a node, then forget it, as the dumper would remember every node"""
+    dumper.anchor_node(node)
+    dumper.serialize_node(node, None, None)
+    dumper.represented_objects = {}
+    dumper.serialized_nodes = {}
+    dumper.anchors = {}
+
+
+class ModeledRecords(Generic[R]):
+    """
+    Many modeled records of one class, stored as one list per field instead of one object per
+    record. Records are built again on access, and the whole set is written to JSON, CSV or
+    yaml a row at a time, without building a record or a dictionary per row.
+    """
+
+    __slots__ = ("record_class", "names", "columns")
+
+    def __init__(self, record_class: type[R], records: Iterable[R] = ()) -> None:
+        self.record_class = record_class
+        record_fields = fields(record_class)  # type: ignore
+        self.names = tuple(record_field.name for record_field in record_fields)
+        self.columns: tuple[list[Any], ...] = tuple([] for _ in self.names)
+        self.extend(records)
+
+    @classmethod
+    def from_columns(
+        cls, record_class: type[R], columns: dict[str, list[Any]]
+    ) -> "ModeledRecords[R]":
+        """Build from one list of values per field of the record class, all of the same length"""
+        records = cls(record_class)
+        records.columns = tuple(list(columns[name]) for name in records.names)
+        if len({len(column) for column in records.columns}) > 1:
+            raise Exception("columns of modeled records must have the same length")
+        return records
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, row: int) -> R:
+        return self.record_class(*(column[row] for column in self.columns))
+
+    def __iter__(self) -> Iterator[R]:
+        record_class = self.record_class
+        for values in zip(*self.columns):
+            yield record_class(*values)
+
+    def append(self, record: R) -> None:
+        """Add a record as a new row"""
+        for column, name in zip(self.columns, self.names):
+            column.append(getattr(record, name))
+
+    def extend(self, records: Iterable[R]) -> None:
+        """Add records as new rows"""
+        for record in records:
+            self.append(record)
+
+    def column(self, name: str) -> list[Any]:
+        """Return the values of a field for every row"""
+        return self.columns[self.names.index(name)]
+
+    def write_json(self, stream: IO[str]) -> None:
+        """Write the rows as a JSON list of objects, with decimals as numbers"""
+        encode = json.JSONEncoder(default=json_default).encode
+        keys = [encode(name) + ": " for name in self.names]
+        stream.write("[")
+        for row, values in enumerate(zip(*self.columns)):
+            stream.write(", {" if row else "{")
+            stream.write(", ".join(key + encode(value) for key, value in zip(keys, values)))
+            stream.write("}")
+        stream.write("]\n")
+
+    def write_csv(self, stream: IO[str]) -> None:
+        """Write the rows as CSV with a header of the field names, None as an empty value"""
+        writer = csv.writer(stream)
+        writer.writerow(self.names)
+        for values in zip(*self.columns):
+            writer.writerow([column_value(value) for value in values])
+
+    def write_yaml(self, stream: IO[str], key: Optional[str] = None) -> None:
+        """
+        Write the rows as yaml_dump writes a list of the records, under key when given,
+        emitting the nodes of one row at a time
+        """
+        configure_dumper()
+        dumper = CustomDumper(stream, default_flow_style=False)
+        dumper.open()
+        dumper.emit(DocumentStartEvent())
+        if key is not None:
+            dumper.emit(MappingStartEvent(None, None, True))
+            serialize_node(dumper, dumper.represent_data(key))
+        dumper.emit(SequenceStartEvent(None, None, True))
+        order = sorted(range(len(self.names)), key=self.names.__getitem__)
+        name_nodes = [dumper.represent_data(self.names[index]) for index in order]
+        for values in zip(*self.columns):
+            node = MappingNode(
+                MAPPING_TAG,
+                [
+                    (name_node, dumper.represent_data(values[index]))
+                    for name_node, index in zip(name_nodes, order)
+                ],
+            )
+            serialize_node(dumper, node)
+        dumper.emit(SequenceEndEvent())
+        if key is not None:
+            dumper.emit(MappingEndEvent())
+        dumper.emit(DocumentEndEvent())
+        dumper.close()
+
+    def write(
+        self, stream: IO[str], output_format: str = "yaml", key: Optional[str] = None
+    ) -> None:
+        """Write the rows in one of OUTPUT_FORMATS, under key in yaml"""
+        if output_format == "yaml":
+            self.write_yaml(stream, key)
+        elif output_format == "json":
+            self.write_json(stream)
+        elif output_format == "csv":
+            self.write_csv(stream)
+        else:
+            raise Exception(f"unknown output format {output_format}")
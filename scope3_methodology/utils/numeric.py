@@ -0,0 +1,73 @@
+""" Numeric backends the emissions models compute in """
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, Callable, Iterator
+
+
+class NumericBackend:
+    """
+    The number type the models compute in. Inputs are converted to it when a model resolves
+    them, see CustomBaseModel.resolve, and the constants of the models are integers so they
+    combine exactly with either type. Integer inputs, as loaded from yaml, are converted too
+    so that dividing them by a constant never falls back to float division.
+    """
+
+    __slots__ = ("name", "number", "from_number")
+
+    def __init__(self, name: str, number: type, from_number: Callable[[Any], Any]) -> None:
+        self.name = name
+        self.number = number
+        self.from_number = from_number
+
+    def __repr__(self) -> str:
+        return f"NumericBackend({self.name})"
+
+    def convert(self, value: Any) -> Any:
+        """Convert a number, or the numbers of a dictionary, leaving anything else as is"""
+        if type(value) is self.number:  # pylint: disable=unidiomatic-typecheck
+            return value
+        if isinstance(value, (Decimal, int, float)) and not isinstance(value, bool):
+            return self.from_number(value)
+        if isinstance(value, dict):
+            return {key: self.convert(item) for key, item in value.items()}
+        return value
+
+
+def to_decimal(value: Any) -> Decimal:
+    """Convert an integer or a float to a Decimal, floats by their shortest representation"""
+    return Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+
+
+# Exact, the inputs are Decimals as loaded from yaml
+DECIMAL = NumericBackend("decimal", Decimal, to_decimal)
+# Several times faster, with a relative error in the order of 1e-15 per operation
+FLOAT64 = NumericBackend("float64", float, float)
+
+NUMERIC_BACKENDS = {backend.name: backend for backend in (DECIMAL, FLOAT64)}
+
+active_backend: ContextVar[NumericBackend] = ContextVar("active_backend", default=DECIMAL)
+
+
+def get_numeric_backend(name: str) -> NumericBackend:
+    """Return a numeric backend by name"""
+    if name not in NUMERIC_BACKENDS:
+        raise Exception(f"Unknown numeric backend {name}, expected one of {list(NUMERIC_BACKENDS)}")
+    return NUMERIC_BACKENDS[name]
+
+
+def to_number(value: Any) -> Any:
+    """Convert a value that is not a model input to the active numeric backend"""
+    return active_backend.get().convert(value)
+
+
+@contextmanager
+def numeric_backend(backend: NumericBackend | str) -> Iterator[NumericBackend]:
+    """Compute in a numeric backend within the with block, in the current context"""
+    if isinstance(backend, str):
+        backend = get_numeric_backend(backend)
+    token = active_backend.set(backend)
+    try:
+        yield backend
+    finally:
+        active_backend.reset(token)
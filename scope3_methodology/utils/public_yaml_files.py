@@ -1,9 +1,27 @@
 """ Util functions to get public yaml files """
 
+import hashlib
+import os
+import pickle  # nosec - the manifest is a local cache written by this module
 from glob import glob
-from typing import Optional
+from typing import IO, Any, Collection, Optional
 
-from scope3_methodology.utils.yaml_helpers import yaml_load
+from yaml.events import (
+    CollectionEndEvent,
+    CollectionStartEvent,
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+)
+from yaml.nodes import ScalarNode
+
+from scope3_methodology.utils.yaml_helpers import DEFAULT_LOADER
+
+PUBLIC_YAML_DIRECTORY = "data/companies"
+DEFAULT_MANIFEST_FILE = "data/.public-yaml-manifest.pickle"
+MANIFEST_VERSION = 1
+HEADER_KEYS = frozenset(["public_identifier", "type", "name", "template"])
 
 
 class PublicYamlInformation:
@@ -27,27 +45,155 @@ class PublicYamlInformation:
         return f"{self.public_identifier}-{self.file_type} ({self.file_path})"
 
 
-def get_all_public_yaml_files() -> dict[str, PublicYamlInformation]:
+def skip_node(loader, event) -> None:
+    """Consume the remaining events of the node started by event"""
+    if not isinstance(event, CollectionStartEvent):
+        return
+    depth = 1
+    while depth:
+        event = loader.get_event()
+        if isinstance(event, CollectionStartEvent):
+            depth += 1
+        elif isinstance(event, CollectionEndEvent):
+            depth -= 1
+
+
+def construct_scalar(loader, event) -> Any:
+    """Construct a scalar event exactly as yaml_load would, e.g. floats become Decimals"""
+    tag = event.tag
+    if tag is None or tag == "!":
+        tag = loader.resolve(ScalarNode, event.value, event.implicit)
+    return loader.construct_object(ScalarNode(tag, event.value, style=event.style))
+
+
+def read_header(stream: IO | str | bytes, keys: Collection[str] = HEADER_KEYS) -> dict[str, Any]:
+    """
+    Return the top level scalar values of keys in a yaml document.
+    Only the event stream is read, nested values are skipped without being constructed
+    and reading stops as soon as all keys have been found.
+    """
+    header: dict[str, Any] = {}
+    loader = DEFAULT_LOADER(stream)
+    try:
+        loader.get_event()
+        if not loader.check_event(DocumentStartEvent):
+            return header
+        loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            return header
+        loader.get_event()
+        while len(header) < len(keys) and not loader.check_event(MappingEndEvent):
+            key_event = loader.get_event()
+            if (
+                isinstance(key_event, ScalarEvent)
+                and key_event.value in keys
+                and loader.check_event(ScalarEvent)
+            ):
+                header[key_event.value] = construct_scalar(loader, loader.get_event())
+                continue
+            skip_node(loader, key_event)
+            skip_node(loader, loader.get_event())
+    finally:
+        loader.dispose()
+    return header
+
+
+class PublicYamlManifest:
+    """
+    Header of every public yaml file keyed by file path, modification time and content hash.
+    Unchanged files only cost a stat() and touched files with identical content only cost a hash.
+    """
+
+    def __init__(self, manifest_file: Optional[str] = None) -> None:
+        self.manifest_file = manifest_file
+        self.entries: dict[str, tuple[int, int, str, dict[str, Any]]] = {}
+        self.changed = False
+
+    @classmethod
+    def load(cls, manifest_file: str) -> "PublicYamlManifest":
+        """Load a manifest from disk, starting empty if it is missing, invalid or outdated"""
+        manifest = cls(manifest_file)
+        try:
+            with open(manifest_file, "rb") as stream:
+                stored = pickle.load(stream)  # nosec
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return manifest
+        if isinstance(stored, dict) and stored.get("version") == MANIFEST_VERSION:
+            manifest.entries = stored["entries"]
+        return manifest
+
+    def save(self) -> None:
+        """
+        Write the manifest to disk if anything changed.
+        A read only data directory is not an error, the manifest is just not persisted.
+        """
+        if not self.changed or not self.manifest_file:
+            return
+        tmp_file = f"{self.manifest_file}.tmp"
+        try:
+            with open(tmp_file, "wb") as write_stream:
+                pickle.dump(
+                    {"version": MANIFEST_VERSION, "entries": self.entries},
+                    write_stream,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_file, self.manifest_file)
+        except OSError:
+            return
+        self.changed = False
+
+    def get_header(self, file: str) -> dict[str, Any]:
+        """Return the header of a file, scanning it again only if it changed"""
+        stat = os.stat(file)
+        entry = self.entries.get(file)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[3]
+
+        with open(file, "rb") as stream:
+            content = stream.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+        header = entry[3] if entry and entry[2] == content_hash else read_header(content)
+        self.entries[file] = (stat.st_mtime_ns, stat.st_size, content_hash, header)
+        self.changed = True
+        return header
+
+    def prune(self, files: Collection[str]) -> None:
+        """Remove files that no longer exist from the manifest"""
+        removed_files = set(self.entries).difference(files)
+        for file in removed_files:
+            del self.entries[file]
+        if removed_files:
+            self.changed = True
+
+
+def get_all_public_yaml_files(
+    public_yaml_directory: str = PUBLIC_YAML_DIRECTORY,
+    manifest_file: Optional[str] = None,
+) -> dict[str, PublicYamlInformation]:
     """
     Return a dictionary of all public yaml files.
     Key: identifier
     Value: File Information
-    """
 
+    Only the top level scalars of each file are read, see read_header.
+    If a manifest file is provided, headers are cached in it across runs.
+    """
+    manifest = PublicYamlManifest.load(manifest_file) if manifest_file else PublicYamlManifest()
     public_file_info = {}
-    public_files = glob("data/companies/*/*.yaml")
+    public_files = glob(f"{public_yaml_directory}/*/*.yaml")
     for file in public_files:
-        with open(file, "r", encoding="UTF-8") as stream:
-            document = yaml_load(stream)
-            if "public_identifier" in document and "type" in document:
-                identifier = document["public_identifier"]
-                file_type = document["type"]
-                public_file_info[f"{identifier}{file_type}"] = PublicYamlInformation(
-                    public_identifier=identifier,
-                    file_type=file_type,
-                    name=document["name"] if "name" in document else None,
-                    file_path=file,
-                    template=document["template"] if "template" in document else None,
-                )
+        document = manifest.get_header(file)
+        if "public_identifier" in document and "type" in document:
+            identifier = document["public_identifier"]
+            file_type = document["type"]
+            public_file_info[f"{identifier}{file_type}"] = PublicYamlInformation(
+                public_identifier=identifier,
+                file_type=file_type,
+                name=document["name"] if "name" in document else None,
+                file_path=file,
+                template=document["template"] if "template" in document else None,
+            )
+    manifest.prune(public_files)
+    manifest.save()
 
     return public_file_info
@@ -0,0 +1,229 @@
+""" Sensitivity of model results to their inputs, by forward mode automatic differentiation """
+import json
+from contextlib import contextmanager
+from dataclasses import fields, replace
+from decimal import Decimal
+from typing import Any, Callable, Iterator, Optional
+
+from scope3_methodology.utils.custom_base_model import CustomBaseModel, input_seeding
+from scope3_methodology.utils.derivation import json_default
+from scope3_methodology.utils.numeric import to_number
+
+
+class Dual:
+    """
+    A number with its partial derivatives with respect to named inputs. Arithmetic with
+    other duals and with numbers applies the chain rule, so the methods of a model computing
+    with duals return the derivatives of their results along with the values, in a single
+    evaluation. Values and derivatives are numbers of the active numeric backend.
+    """
+
+    __slots__ = ("value", "partials")
+
+    def __init__(self, value: Any, partials: dict[str, Any]) -> None:
+        self.value = value
+        # never modified once built, so duals share them
+        self.partials = partials
+
+    def __repr__(self) -> str:
+        return f"Dual({self.value!r}, {self.partials!r})"
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self.value, format_spec)
+
+    def __bool__(self) -> bool:
+        return bool(self.value)
+
+    def __float__(self) -> float:
+        return float(self.value)
+
+    def __eq__(self, other: Any) -> bool:
+        return self.value == value_of(other)
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+    def __lt__(self, other: Any) -> bool:
+        return self.value < value_of(other)
+
+    def __le__(self, other: Any) -> bool:
+        return self.value <= value_of(other)
+
+    def __gt__(self, other: Any) -> bool:
+        return self.value > value_of(other)
+
+    def __ge__(self, other: Any) -> bool:
+        return self.value >= value_of(other)
+
+    def __round__(self, ndigits: Optional[int] = None) -> "Dual":
+        # the derivatives of the value before rounding, rounding only presents it
+        return Dual(round(self.value, ndigits), self.partials)
+
+    def __neg__(self) -> "Dual":
+        return Dual(-self.value, scaled(self.partials, -1))
+
+    def __add__(self, other: Any) -> "Dual":
+        if isinstance(other, Dual):
+            return Dual(self.value + other.value, added(self.partials, other.partials))
+        return Dual(self.value + other, self.partials)
+
+    def __radd__(self, other: Any) -> "Dual":
+        return Dual(other + self.value, self.partials)
+
+    def __sub__(self, other: Any) -> "Dual":
+        if isinstance(other, Dual):
+            return Dual(self.value - other.value, added(self.partials, scaled(other.partials, -1)))
+        return Dual(self.value - other, self.partials)
+
+    def __rsub__(self, other: Any) -> "Dual":
+        return Dual(other - self.value, scaled(self.partials, -1))
+
+    def __mul__(self, other: Any) -> "Dual":
+        if isinstance(other, Dual):
+            return Dual(
+                self.value * other.value,
+                added(scaled(self.partials, other.value), scaled(other.partials, self.value)),
+            )
+        return Dual(self.value * other, scaled(self.partials, other))
+
+    def __rmul__(self, other: Any) -> "Dual":
+        return Dual(other * self.value, scaled(self.partials, other))
+
+    def __truediv__(self, other: Any) -> "Dual":
+        if isinstance(other, Dual):
+            value = self.value / other.value
+            # (da - a / b * db) / b
+            partials = added(self.partials, scaled(other.partials, -value))
+            return Dual(value, divided(partials, other.value))
+        return Dual(self.value / other, divided(self.partials, other))
+
+    def __rtruediv__(self, other: Any) -> "Dual":
+        value = other / self.value
+        # -a / b * db / b
+        return Dual(value, divided(scaled(self.partials, -value), self.value))
+
+
+def value_of(number: Any) -> Any:
+    """Return the value of a dual, and any other number as is"""
+    return number.value if isinstance(number, Dual) else number
+
+
+def scaled(partials: dict[str, Any], factor: Any) -> dict[str, Any]:
+    """Return partial derivatives multiplied by a factor"""
+    return {name: derivative * factor for name, derivative in partials.items()}
+
+
+def divided(partials: dict[str, Any], divisor: Any) -> dict[str, Any]:
+    """Return partial derivatives divided by a divisor"""
+    return {name: derivative / divisor for name, derivative in partials.items()}
+
+
+def added(left: dict[str, Any], right: dict[str, Any]) -> dict[str, Any]:
+    """Return the sum of two sets of partial derivatives"""
+    if not right:
+        return left
+    if not left:
+        return right
+    partials = dict(left)
+    for name, derivative in right.items():
+        partials[name] = partials[name] + derivative if name in partials else derivative
+    return partials
+
+
+def is_number(value: Any) -> bool:
+    """Return whether a value is a number, booleans excluded"""
+    return isinstance(value, (Decimal, int, float)) and not isinstance(value, bool)
+
+
+@contextmanager
+def sensitivity(model: CustomBaseModel) -> Iterator[list[str]]:
+    """
+    Compute with the inputs eligible for default of a model as duals within the with block,
+    each with a derivative of one with respect to itself, whether it is provided or taken
+    from the defaults. Other models, such as the defaults or distribution partners, compute
+    with their plain values. Yields the names of the inputs seeded, as the model resolves
+    them. Inputs already computed from seeded inputs keep their derivatives within the block,
+    and their values after it.
+    """
+    inputs: list[str] = []
+    one = to_number(1)
+
+    def seed(name: str, value: Any) -> Any:
+        if isinstance(value, Dual):
+            if value.partials:
+                return value
+            value = value.value
+        elif not is_number(value):
+            return value
+        if name not in inputs:
+            inputs.append(name)
+        return Dual(value, {name: one})
+
+    model.clear_resolved()
+    token = input_seeding.set((model, seed))
+    try:
+        yield inputs
+    finally:
+        input_seeding.reset(token)
+        for model_field in fields(model):
+            value = object.__getattribute__(model, model_field.name)
+            if isinstance(value, Dual):
+                setattr(model, model_field.name, value.value)
+        model.clear_resolved()
+
+
+def sensitivity_report(result: Any, inputs: list[str]) -> Optional[dict[str, Any]]:
+    """
+    Return each number of a modeled object with its partial derivatives with respect to
+    each input, zero for inputs it does not depend on
+    """
+    if result is None:
+        return None
+    zero = to_number(0)
+    report = {}
+    for result_field in fields(result):
+        value = getattr(result, result_field.name)
+        if isinstance(value, Dual):
+            partials = value.partials
+            report[result_field.name] = {
+                "value": value.value,
+                "partials": {name: partials.get(name, zero) for name in inputs},
+            }
+        elif is_number(value):
+            report[result_field.name] = {
+                "value": value,
+                "partials": {name: zero for name in inputs},
+            }
+    return report
+
+
+def without_partials(result: Any) -> Any:
+    """Return a modeled object with the values of its duals"""
+    if result is None:
+        return None
+    return replace(
+        result,
+        **{
+            result_field.name: getattr(result, result_field.name).value
+            for result_field in fields(result)
+            if isinstance(getattr(result, result_field.name), Dual)
+        },
+    )
+
+
+def compute_sensitivity(
+    model: CustomBaseModel, compute: Callable[..., Any], **kwargs
+) -> tuple[Any, Optional[dict[str, Any]]]:
+    """
+    Call a method modeling a model with kwargs within sensitivity, returning its result and
+    the sensitivity of each of its numbers to the inputs of the model, see sensitivity_report
+    """
+    with sensitivity(model) as inputs:
+        result = compute(**kwargs)
+    return without_partials(result), sensitivity_report(result, inputs)
+
+
+def write_sensitivity_json(file_path: str, reports: list[dict[str, Any]]) -> None:
+    """Write sensitivity reports to a JSON file, with decimals as numbers"""
+    with open(file_path, "w", encoding="UTF-8") as stream:
+        json.dump(reports, stream, default=json_default, indent=2)
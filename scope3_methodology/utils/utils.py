@@ -1,11 +1,14 @@
 """ Util functions used across modules """
 
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
 from glob import glob
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Collection, Iterable, Iterator, Optional, Sequence
 
+from scope3_methodology.utils.derivation import active_trace
+from scope3_methodology.utils.fact_index import FactIndex
 from scope3_methodology.utils.yaml_helpers import yaml_load
 
 
@@ -44,15 +47,42 @@ def not_none(value: Optional[Decimal]) -> Decimal:
     raise Exception("Attempting operation with None value")
 
 
+def derivation_logging_enabled() -> bool:
+    """
+    Whether the derivation of results is logged or traced, see derivation_trace.
+    Check it before calling log_step or log_result so their arguments are not even built
+    when neither is on, as in the API outside of explain mode.
+    """
+    return active_trace.get() is not None or logging.root.isEnabledFor(logging.INFO)
+
+
 def log_step(key: str, value: str | Decimal | None, source: str, depth: int) -> None:
-    """Takes in a ke, value, and depth and logs the step"""
-    logging.info("%s%s = %s (%s)", "  " * depth, key, value, source)
+    """Takes in a ke, value, and depth and logs the step, source is empty for inputs"""
+    trace = active_trace.get()
+    if trace is not None:
+        trace.add(key, value, source or "input", depth)
+    if logging.root.isEnabledFor(logging.INFO):
+        logging.info("%s%s = %s (%s)", "  " * depth, key, value, source)
 
 
-def log_result(key: str, value: str | Decimal | None, depth: int) -> None:
-    """Takes in a ke, value, and depth and logs the result"""
-    logging.info("%s -------------------------------------------", ("  " * (depth - 1)))
-    logging.info("%s %s = %s (calculation)", ("  " * depth), key, value)
+def log_result(
+    key: str, value: str | Decimal | int | None, depth: int, value_format: str = ""
+) -> None:
+    """
+    Takes in a ke, value, and depth and logs the result.
+    The value is traced as is and logged with value_format, e.g. ".6f".
+    """
+    trace = active_trace.get()
+    if trace is not None:
+        trace.add(key, value, "calculation", depth)
+    if logging.root.isEnabledFor(logging.INFO):
+        logging.info("%s -------------------------------------------", ("  " * (depth - 1)))
+        logging.info(
+            "%s %s = %s (calculation)",
+            ("  " * depth),
+            key,
+            format(value, value_format) if value_format else value,
+        )
 
 
 def get_facts(facts: list[dict[str, Decimal]]) -> dict[str, Decimal | str]:
@@ -115,62 +145,160 @@ def populate_raw_facts(
 GENERAL_FACT = "GENERAL"
 
 
-def get_all_facts() -> dict[str, list[Fact]]:
-    """Extract all facts from all yaml files under data"""
+def get_document_facts(file: str, document) -> dict[str, list[Fact]]:
+    """Extract all facts from a parsed yaml document under data"""
     facts: dict[str, list[Fact]] = {}
-    files = glob("data/**/*.yaml", recursive=True)
-    for file in files:
-        with open(file, "r", encoding="UTF-8") as stream:
-            document = yaml_load(stream)
-            pth = Path(file)
-            if "company" in document and "sources" in document["company"]:
-                template = (
-                    document["company"]["template"]
-                    if "template" in document["company"]
-                    else GENERAL_FACT
-                )
-                channel = (
-                    document["company"]["channel"] if "channel" in document["company"] else None
-                )
-                populate_facts(
-                    facts,
-                    "/".join(pth.parts[-2:]),
-                    template,
-                    channel,
-                    document["company"]["sources"],
-                )
-            if "sources" in document:
-                template = document["template"] if "template" in document else GENERAL_FACT
-                channel = document["channel"] if "channel" in document else None
-                populate_facts(
-                    facts, "/".join(pth.parts[-2:]), template, channel, document["sources"]
-                )
-            if "facts" in document:
-                template = document["template"] if "template" in document else GENERAL_FACT
-                channel = document["channel"] if "channel" in document else None
+    company = "/".join(Path(file).parts[-2:])
+    if "company" in document and "sources" in document["company"]:
+        template = (
+            document["company"]["template"] if "template" in document["company"] else GENERAL_FACT
+        )
+        channel = document["company"]["channel"] if "channel" in document["company"] else None
+        populate_facts(facts, company, template, channel, document["company"]["sources"])
+    if "sources" in document:
+        template = document["template"] if "template" in document else GENERAL_FACT
+        channel = document["channel"] if "channel" in document else None
+        populate_facts(facts, company, template, channel, document["sources"])
+    if "facts" in document:
+        template = document["template"] if "template" in document else GENERAL_FACT
+        channel = document["channel"] if "channel" in document else None
+        populate_raw_facts(facts, company, template, channel, document["facts"])
+    if "products" in document:
+        for product in document["products"]:
+            if "facts" in product:
+                populate_raw_facts(facts, company, product["template"], None, product["facts"])
+    if "properties" in document:
+        for publisher_property in document["properties"]:
+            if "facts" in publisher_property:
                 populate_raw_facts(
-                    facts, "/".join(pth.parts[-2:]), template, channel, document["facts"]
+                    facts,
+                    company,
+                    publisher_property["template"],
+                    publisher_property["channel"] if "channel" in publisher_property else None,
+                    publisher_property["facts"],
                 )
-            if "products" in document:
-                for product in document["products"]:
-                    if "facts" in product:
-                        populate_raw_facts(
-                            facts,
-                            "/".join(pth.parts[-2:]),
-                            product["template"],
-                            None,
-                            product["facts"],
-                        )
-            if "properties" in document:
-                for publisher_property in document["properties"]:
-                    if "facts" in publisher_property:
-                        populate_raw_facts(
-                            facts,
-                            "/".join(pth.parts[-2:]),
-                            publisher_property["template"],
-                            publisher_property["channel"]
-                            if "channel" in publisher_property
-                            else None,
-                            publisher_property["facts"],
-                        )
     return facts
+
+
+def get_file_facts(file: str) -> dict[str, list[Fact]]:
+    """Extract all facts from a single yaml file under data"""
+    with open(file, "r", encoding="UTF-8") as stream:
+        return get_document_facts(file, yaml_load(stream))
+
+
+def get_content_facts(file: str, content: bytes) -> dict[str, list[Fact]]:
+    """Extract all facts from the already read content of a yaml file under data"""
+    return get_document_facts(file, yaml_load(content.decode("UTF-8")))
+
+
+# Below this many files a process pool costs more to start than it saves
+PARALLEL_MIN_FILES = 256
+
+
+def extract_file_facts(
+    extract: Callable[..., dict[str, list[Fact]]],
+    file_args: Sequence[tuple],
+    workers: int = 1,
+) -> list[dict[str, list[Fact]]]:
+    """
+    Run a per file fact extraction over many files, returning results in file order.
+    With more than one worker and at least PARALLEL_MIN_FILES files, the files are
+    sharded across a process pool, otherwise they are extracted serially.
+    """
+    if workers <= 1 or len(file_args) < PARALLEL_MIN_FILES:
+        return [extract(*args) for args in file_args]
+
+    chunksize = max(1, len(file_args) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(extract, *zip(*file_args), chunksize=chunksize))
+
+
+def merge_facts(file_facts: Iterable[dict[str, list[Fact]]]) -> dict[str, list[Fact]]:
+    """Merge per file facts in order, as if all files were extracted into one dictionary"""
+    facts: dict[str, list[Fact]] = {}
+    for single_file_facts in file_facts:
+        for key, key_facts in single_file_facts.items():
+            if key not in facts:
+                facts[key] = []
+            facts[key].extend(key_facts)
+    return facts
+
+
+def get_data_files() -> list[str]:
+    """Return all yaml files under data"""
+    return glob("data/**/*.yaml", recursive=True)
+
+
+def may_contain(content: bytes, values: Iterable[Optional[str]], implicit: set) -> bool:
+    """
+    Return False only if no fact in the file content can have one of the values. Values in
+    implicit can be assigned without appearing in the file, e.g. GENERAL_FACT or no channel.
+    """
+    return any(
+        value in implicit or (value is not None and value.encode("UTF-8") in content)
+        for value in values
+    )
+
+
+def iter_facts(
+    keys: Optional[Collection[str]] = None,
+    templates: Optional[Collection[str]] = None,
+    channels: Optional[Collection[Optional[str]]] = None,
+    files: Optional[Iterable[str]] = None,
+) -> Iterator[Fact]:
+    """
+    Yield facts from the yaml files under data as each file is parsed, only keeping facts
+    matching all of the provided keys, templates and channels (None is no channel).
+    Files whose content cannot contain a match are skipped without being parsed.
+    Facts of a key are yielded in the same order as get_all_facts lists them.
+    """
+    for file in files if files is not None else get_data_files():
+        with open(file, "rb") as stream:
+            content = stream.read()
+        if keys is not None and not may_contain(content, keys, set()):
+            continue
+        if templates is not None and not may_contain(content, templates, {GENERAL_FACT}):
+            continue
+        if channels is not None and not may_contain(content, channels, {None}):
+            continue
+
+        for key, key_facts in get_content_facts(file, content).items():
+            if keys is not None and key not in keys:
+                continue
+            for fact in key_facts:
+                if templates is not None and fact.template not in templates:
+                    continue
+                if channels is not None and fact.channel not in channels:
+                    continue
+                yield fact
+
+
+def get_all_file_facts(
+    index_file: Optional[str] = None, workers: int = 1
+) -> Iterable[dict[str, list[Fact]]]:
+    """
+    Extract the facts of each yaml file under data, in file order.
+    If an index file is provided only new or changed files are parsed, see FactIndex.
+    With more than one worker large trees are parsed across a process pool.
+    A serial run without an index is lazy, parsing each file as it is consumed.
+    """
+    files = get_data_files()
+    if index_file is None:
+        if workers <= 1:
+            return (get_file_facts(file) for file in files)
+        return extract_file_facts(get_file_facts, [(file,) for file in files], workers)
+
+    fact_index = FactIndex.load(index_file)
+    file_facts = fact_index.get_facts(
+        files, lambda file_contents: extract_file_facts(get_content_facts, file_contents, workers)
+    )
+    fact_index.save()
+    return file_facts
+
+
+def get_all_facts(index_file: Optional[str] = None, workers: int = 1) -> dict[str, list[Fact]]:
+    """
+    Extract all facts from all yaml files under data, see get_all_file_facts.
+    The merged facts keep the same order regardless of the index and worker count.
+    """
+    return merge_facts(get_all_file_facts(index_file, workers))
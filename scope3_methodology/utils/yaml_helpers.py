@@ -13,6 +13,11 @@ from yaml.resolver import BaseResolver
 from yaml.resolver import Resolver as DefaultResolver
 from yaml.scanner import Scanner
 
+try:
+    from yaml.cyaml import CParser  # type: ignore
+except ImportError:  # PyYAML was built without libyaml
+    CParser = None  # type: ignore
+
 
 class Resolver(BaseResolver):
     """Resolver is identical to the base resolver"""
@@ -51,6 +56,20 @@ class Loader(Reader, Scanner, Parser, Composer, SafeConstructor, Resolver):
         Resolver.__init__(self)
 
 
+if CParser is not None:
+
+    class CLoader(CParser, SafeConstructor, Resolver):
+        """Yaml Loader backed by libyaml, resolving and constructing exactly like Loader"""
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+else:
+    CLoader = None  # type: ignore
+
+
 def decimal_constructor(loader, node):
     """
     Custom constuctore for reading Decimal values
@@ -68,12 +87,17 @@ def represent_decimal(self, data: Decimal):
 
 
 yaml.add_constructor("!decimal", decimal_constructor, Loader)
+if CLoader is not None:
+    yaml.add_constructor("!decimal", decimal_constructor, CLoader)
 yaml.add_representer(Decimal, represent_decimal)
 
+# Prefer the libyaml loader when available, falling back to the pure python loader
+DEFAULT_LOADER = CLoader if CLoader is not None else Loader
+
 
 def yaml_load(stream, **kwargs):
     """Custom yaml load to correctly read Decimal fields"""
-    return yaml.load(stream, Loader, **kwargs)  # type: ignore
+    return yaml.load(stream, DEFAULT_LOADER, **kwargs)  # type: ignore
 
 
 class CustomDumper(yaml.Dumper):
@@ -83,10 +107,15 @@ class CustomDumper(yaml.Dumper):
         return super().increase_indent(flow=flow, indentless=False)
 
 
-def yaml_dump(obj: object):
-    """Custom yaml dump to correctly write Decimal fields"""
+def configure_dumper() -> None:
+    """Configure CustomDumper to write plain yaml, see yaml_dump"""
     # Do not print tags, produces invalid yaml
     yaml.emitter.Emitter.process_tag = lambda *args: False  # type: ignore
     # Print all values without pointers and aliases
     CustomDumper.ignore_aliases = lambda *args: True  # type: ignore
+
+
+def yaml_dump(obj: object):
+    """Custom yaml dump to correctly write Decimal fields"""
+    configure_dumper()
     return yaml.dump(obj, default_flow_style=False, Dumper=CustomDumper)